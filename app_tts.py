@@ -1,8 +1,17 @@
 # app_tts.py
+"""
+Per-host resident TTS server. Coqui models stay warm in services/tts_resident
+(keyed by model name, one owner thread each, concurrent lines batched); every other
+process on the host reaches them through services.tts_resident.speak / TTSClient.
+"""
 from fastapi import FastAPI, HTTPException
+from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from pathlib import Path
+from typing import List
+from concurrent.futures import Future
 import os
+from services import tts_resident, tts_cache
 
 OUT_DIR = Path("static/outputs")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -26,51 +35,101 @@ except Exception as e:
 class TTSReq(BaseModel):
     text: str
     filename: str | None = None
+    model_name: str | None = None
+    speaker: str | None = None
+    language: str | None = None
 
-app = FastAPI(title="Visora TTS Server")
+class TTSBatchReq(BaseModel):
+    items: List[TTSReq]
 
-# Lazy-load Coqui model when first request comes
-_coqui_model = None
-_coqui_model_name = "tts_models/en/ljspeech/tacotron2-DDC"  # safe default (changeable)
+app = FastAPI(title="Visora TTS Server")
+# clients on other hosts download results from here
+app.mount("/static/outputs", StaticFiles(directory=str(OUT_DIR)), name="tts_outputs")
 
-def get_coqui_model():
-    global _coqui_model
-    if _coqui_model is None:
-        print("Loading Coqui model:", _coqui_model_name)
-        _coqui_model = TTS(_coqui_model_name)
-    return _coqui_model
+@app.on_event("startup")
+def warm_models():
+    # TTS_WARM_MODELS="name1,name2" loads models before the first request
+    if not _HAS_COQUI:
+        return
+    for name in [m for m in os.getenv("TTS_WARM_MODELS", "").split(",") if m.strip()]:
+        try:
+            tts_resident.warm(name.strip())
+        except Exception as e:
+            print("Warm-up failed for", name, e)
 
 @app.get("/")
 def home():
     return {"status": "Visora TTS Server running"}
 
+@app.get("/tts/status")
+def status():
+    return {"ok": True, "models": tts_resident.status()}
+
+def _out_path(req: TTSReq, text: str) -> Path:
+    # stable digest (hash() is salted per process, so restarts re-synthesized everything)
+    out_name = req.filename or f"tts_{tts_resident.cache_key(text, req.model_name, req.speaker, req.language)[:16]}.mp3"
+    return OUT_DIR / out_name
+
 @app.post("/tts/speak")
 def speak(req: TTSReq):
     text = req.text.strip()
     if not text:
         raise HTTPException(status_code=400, detail="Empty text")
 
-    out_name = req.filename or f"tts_{abs(hash(text))%10_000_000}.mp3"
-    out_path = OUT_DIR / out_name
+    out_path = _out_path(req, text)
 
-    # Try Coqui first
+    # Try Coqui first (resident model; concurrent requests are batched per model)
     if _HAS_COQUI:
         try:
-            model = get_coqui_model()
-            # coqui saves file as given path (wav/mp3 depending on model)
-            model.tts_to_file(text=text, file_path=str(out_path))
-            return {"ok": True, "file": str(out_path)}
+            tts_resident.synthesize_local(text, str(out_path), req.model_name, req.speaker, req.language)
+            return {"ok": True, "file": str(out_path), "abs_path": str(out_path.resolve()),
+                    "cache_key": tts_resident.cache_key(text, req.model_name, req.speaker, req.language)}
         except Exception as e:
             print("Coqui TTS error, falling back:", e)
 
     # Fallback: gTTS
     if _HAS_GTTS:
         try:
-            tts = gTTS(text=text, lang="en")
             out_path = out_path.with_suffix(".mp3")
-            tts.save(str(out_path))
-            return {"ok": True, "file": str(out_path)}
+            key = tts_cache.make_key("gtts", text, lang="en")
+            def synth():
+                gTTS(text=text, lang="en").save(str(out_path))
+                return str(out_path)
+            tts_cache.cached(key, str(out_path), synth)
+            return {"ok": True, "file": str(out_path), "abs_path": str(out_path.resolve()), "cache_key": key}
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"gTTS failed: {e}")
 
     raise HTTPException(status_code=500, detail="No TTS backend available. Install TTS or gTTS.")
+
+@app.post("/tts/speak_batch")
+def speak_batch(req: TTSBatchReq):
+    """Many lines in one call: all are queued on the resident models first, then collected."""
+    pending = []
+    for it in req.items:
+        text = it.text.strip()
+        fut, key = None, None
+        if _HAS_COQUI and text:
+            out_path = _out_path(it, text)
+            key = tts_resident.cache_key(text, it.model_name, it.speaker, it.language)
+            if tts_cache.fetch(key, str(out_path)):
+                fut = Future(); fut.set_result(str(out_path))
+            else:
+                fut = tts_resident.get_slot(it.model_name).submit(
+                    {"text": text, "out_path": str(out_path), "speaker": it.speaker, "language": it.language})
+        pending.append((it, fut, key))
+    results = []
+    for it, fut, key in pending:
+        try:
+            if fut is None:
+                raise RuntimeError("not queued")
+            path = Path(fut.result(timeout=600))
+            tts_cache.store(key, str(path))
+            results.append({"ok": True, "file": str(path), "abs_path": str(path.resolve()), "cache_key": key})
+        except Exception:
+            # same fallback chain as a single request (gTTS / error)
+            try:
+                results.append(speak(it))
+            except HTTPException as e:
+                results.append({"ok": False, "error": e.detail})
+    return {"ok": all(r.get("ok") for r in results), "results": results}
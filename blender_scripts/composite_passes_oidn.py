@@ -3,15 +3,28 @@
 Same as composite_passes.py but picks best denoiser:
 - If GPU and OptiX available -> use Cycles/OptiX denoiser on render
 - Else fallback to OpenImageDenoise node in compositor for EXR layers
-Usage: blender --background --python composite_passes_oidn.py -- job.json out_dir
+Usage: blender --background --python composite_passes_oidn.py -- job.json out_dir [--serve SOCKET]
+
+Frame selection (first match wins):
+- FRAMES env: chunk spec "1-24,30,40-42"
+- FRAME env: single frame (legacy per-frame tasks)
+- job start_frame..end_frame
+--serve SOCKET keeps the scene loaded and renders frame chunks sent over a unix socket
+(see services/blender_worker.py): request {"frames":[...]} -> one {"frame","ok",...} line per
+frame, then {"done":true}; {"cmd":"quit"} exits.
 """
-import sys, json
+import sys, json, time
 from pathlib import Path
 argv = sys.argv
 if "--" in argv:
     argv = argv[argv.index("--")+1:]
 else:
     argv = []
+SERVE_SOCK = None
+if "--serve" in argv:
+    i = argv.index("--serve")
+    SERVE_SOCK = argv[i+1] if i+1 < len(argv) else None
+    argv = argv[:i] + argv[i+2:]
 if len(argv) < 2:
     print("job.json outdir required"); sys.exit(1)
 job = json.loads(Path(argv[0]).read_text())
@@ -76,8 +89,25 @@ if not use_optix:
 start = job.get("start_frame",1); end = job.get("end_frame",start)
 inp = job.get("input_passes",{}).get("beauty") or job.get("input_passes",{}).get("beauty_exr") or ""
 pattern = inp
+out_template = job.get("output", {}).get("path","static/compositor/out_%04d.png")
+
+def parse_frames(spec: str):
+    # "1-24,30,40-42" -> [1..24, 30, 40, 41, 42]
+    frames = []
+    for part in str(spec).replace(" ", "").split(","):
+        if not part: continue
+        a, sep, b = part.partition("-")
+        frames.extend(range(int(a), int(b)+1) if sep else [int(a)])
+    return frames
 
-for frame in range(start, end+1):
+def frames_to_render():
+    if os.environ.get("FRAMES"):
+        return parse_frames(os.environ["FRAMES"])
+    if os.environ.get("FRAME"):
+        return [int(os.environ["FRAME"])]
+    return list(range(start, end+1))
+
+def render_frame(frame):
     if pattern:
         num_hash = pattern.count("#")
         if num_hash:
@@ -89,12 +119,21 @@ for frame in range(start, end+1):
                 fname = pattern
         try:
             img = bpy.data.images.load(fname, check_existing=True)
+            prev = img_node.image
             img_node.image = img
+            # drop the previous frame's pixels so a long-lived worker doesn't accumulate images
+            if prev is not None and prev != img and prev.users == 0:
+                bpy.data.images.remove(prev)
         except Exception as e:
             print("Warning: load failed", fname, e)
     # set render write path
-    out_template = job.get("output", {}).get("path","static/compositor/out_%04d.png")
-    out_frame = out_template.replace("####", str(frame).zfill(4)) if "####" in out_template else (out_template % frame if ("%d" in out_template) else out_template)
+    if "####" in out_template:
+        out_frame = out_template.replace("####", str(frame).zfill(4))
+    elif "%" in out_template:
+        out_frame = out_template % frame
+    else:
+        out_frame = out_template
+    scene.frame_current = frame
     scene.render.filepath = str(out_frame)
     scene.render.image_settings.file_format = 'OPEN_EXR' if out_frame.lower().endswith(".exr") else 'PNG'
     # For OptiX: render using cycles to apply OptiX denoiser
@@ -106,5 +145,43 @@ for frame in range(start, end+1):
         # composite node will process image and write still
         bpy.ops.render.render(write_still=True)
     print("Wrote frame:", out_frame)
+    return out_frame
 
-print("OIDN/OptiX compositing done.")
+def serve(sock_path):
+    import socket
+    sp = Path(sock_path)
+    if sp.exists():
+        sp.unlink()
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(str(sp)); srv.listen(1)
+    print("Blender worker listening on", sp)
+    running = True
+    while running:
+        conn, _ = srv.accept()
+        with conn, conn.makefile("rwb") as f:
+            for line in f:
+                req = json.loads(line.decode() or "{}")
+                if req.get("cmd") == "quit":
+                    running = False
+                    break
+                for frame in req.get("frames", []):
+                    t0 = time.time()
+                    try:
+                        out = render_frame(int(frame))
+                        msg = {"frame": frame, "ok": True, "path": out, "secs": round(time.time()-t0, 3)}
+                    except Exception as e:
+                        msg = {"frame": frame, "ok": False, "error": str(e)}
+                    f.write((json.dumps(msg) + "\n").encode()); f.flush()
+                f.write(b'{"done": true}\n'); f.flush()
+    srv.close()
+    try:
+        sp.unlink()
+    except OSError:
+        pass
+
+if SERVE_SOCK:
+    serve(SERVE_SOCK)
+else:
+    for frame in frames_to_render():
+        render_frame(frame)
+    print("OIDN/OptiX compositing done.")
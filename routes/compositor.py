@@ -36,3 +36,12 @@ def ffgrade(req: LUTReq):
     if not res.get("ok"):
         raise HTTPException(status_code=500, detail=res)
     return res
+
+@router.get("/progress/{job_id}")
+def progress(job_id: str):
+    # orchestrated (chord) comp jobs: progress comes from the result backend, no worker waits
+    from tasks.composite_orchestrator import get_comp_progress
+    res = get_comp_progress(job_id)
+    if not res.get("ok"):
+        raise HTTPException(status_code=404, detail=res)
+    return res
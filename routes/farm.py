@@ -4,7 +4,7 @@ from pydantic import BaseModel
 from pathlib import Path
 from typing import Dict, Any, List
 
-from services.farm_manager import create_job, get_job_status, TASKS_DIR
+from services.farm_manager import create_job, get_job_status, pending_count, list_pending as list_pending_tasks
 from services.node_monitor import heartbeat, list_nodes
 
 router = APIRouter()
@@ -49,21 +49,13 @@ def status(job_id: str):
 
 
 @router.get("/list_pending")
-def list_pending():
+def list_pending(limit: int = 100):
     """
-    Return a list of pending task JSONs from TASKS_DIR.
+    Return the pending count plus the next `limit` queued tasks in dispatch order.
     """
     try:
-        tasks: List[str] = []
-        # TASKS_DIR expected to be a pathlib.Path
-        for tfile in Path(TASKS_DIR).glob("*.json"):
-            try:
-                t = tfile.read_text()
-                tasks.append(t)
-            except Exception:
-                # ignore unreadable files
-                continue
-        return {"ok": True, "pending_count": len(tasks), "tasks": tasks}
+        tasks: List[Dict[str, Any]] = list_pending_tasks(limit=limit)
+        return {"ok": True, "pending_count": pending_count(), "tasks": tasks}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,6 +1,6 @@
 # routes/mocap.py
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from services.mocap import save_upload, run_mocap_pipeline, OUTDIR
+from services.mocap import save_upload, run_mocap_pipeline, normalize_roi, OUTDIR
 from pathlib import Path
 from pydantic import BaseModel
 import shutil
@@ -21,13 +21,22 @@ class MocapReq(BaseModel):
     smooth_window: int | None = 5
     lift_method: str | None = "simple"
     out_name: str | None = None
+    stride: int | None = 1  # pose every Nth frame (static shots)
+    roi: tuple[float, float, float, float] | None = None  # normalized x, y, w, h
 
 @router.post("/start")
 def start_mocap(req: MocapReq):
     # Basic sanity
     if not Path(req.video_path).exists():
         raise HTTPException(status_code=404, detail="video not found")
-    res = run_mocap_pipeline(req.video_path, mode=req.mode or "mediapipe", smooth_w=req.smooth_window or 5, lift_method=req.lift_method or "simple", out_name=req.out_name)
+    try:
+        roi = normalize_roi(req.roi)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail={"error": "invalid_roi", "msg": str(e)})
+    res = run_mocap_pipeline(req.video_path, mode=req.mode or "mediapipe", smooth_w=req.smooth_window or 5, lift_method=req.lift_method or "simple", out_name=req.out_name,
+                             stride=req.stride or 1, roi=roi)
+    if res.get("error") == "invalid_roi":
+        raise HTTPException(status_code=422, detail=res)
     if not res.get("ok"):
         raise HTTPException(status_code=500, detail=res)
     return res
@@ -1,7 +1,7 @@
 # routes/sound.py
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from services.sound_engine import mix_voice_and_music, apply_reverb, apply_echo, overlay_sfx, change_pitch
+from services.sound_engine import mix_voice_and_music, apply_reverb, apply_echo, overlay_sfx, change_pitch, load_audio, save_audio
 from pathlib import Path
 
 router = APIRouter()
@@ -10,12 +10,14 @@ tts_service = TTSService()
 class TTSRequest(BaseModel):
     text: str
     filename: str | None = None  # optional filename
+    speaker: str | None = None
+    model_name: str | None = None
 
 @router.post("/speak")
 def speak(req: TTSRequest):
     try:
         out_name = req.filename or None
-        out_path = tts_service.synthesize(req.text, out_filename=out_name)
+        out_path = tts_service.synthesize(req.text, out_filename=out_name, speaker=req.speaker, model_name=req.model_name)
         # return path info and a direct URL (relative)
         return {"ok": True, "file": out_path}
     except ValueError as e:
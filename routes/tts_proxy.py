@@ -1,5 +1,6 @@
 # routes/tts_proxy.py
 from fastapi import APIRouter, HTTPException
+import httpx
 from pydantic import BaseModel
 from services.tts_client import TTSClient
 
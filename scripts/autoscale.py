@@ -1,7 +1,7 @@
 # scripts/autoscale.py
 """
 Autoscaler (AWS EC2 example)
-- Reads queue length (via DB or TASKS_DIR) and decides to spin up worker instances (EC2) with a given launch-template.
+- Reads queue length (via DB or the farm task store) and decides to spin up worker instances (EC2) with a given launch-template.
 - Uses IAM roles (recommended). Keep this as helper and adapt to your infra.
 """
 import os, boto3, time, math
@@ -17,11 +17,9 @@ QUEUE_THRESH_DOWN = int(os.getenv("QUEUE_DOWN", "10"))
 ec2 = boto3.client("ec2", region_name=AWS_REGION)
 
 def get_pending_tasks_count():
-    # Example: look at TASKS_DIR length — switch to DB count if using Postgres
-    TASKS_DIR = Path("jobs/farm/tasks")
-    if TASKS_DIR.exists():
-        return len(list(TASKS_DIR.glob("*.json")))
-    return 0
+    # read the farm store's aggregate counters — switch to DB count if using Postgres
+    from services.farm_manager import pending_count
+    return pending_count()
 
 def get_worker_instances():
     resp = ec2.describe_instances(Filters=[{"Name":"tag:Role","Values":["farm-worker"]}, {"Name":"instance-state-name","Values":["running","pending"]}])
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# scripts/bench_bvh.py
+"""
+Round-trip check + timing for the BVH writers (services/advanced_bvh, mocap, voice2anim).
+- legacy: advanced_bvh.write_bvh as it was (children found by scanning every joint, whole file
+  built as a list of per-value f-strings), embedded below
+- new: advanced_bvh.write_bvh (children index, array rows, streamed chunks)
+Checks the two files are byte-identical, reads the new one back with read_bvh (hierarchy, offsets,
+motion within 1e-6), and round-trips the mocap / voice2anim exporters; exits non-zero on mismatch.
+Usage: python scripts/bench_bvh.py [--joints 400] [--frames 20000] [--roots 1]
+"""
+import sys, time, random, argparse, tempfile, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def legacy_write_bvh(frames3d, joint_names, parents, out_path, frame_time=1/30.0):
+    lines = []
+    lines.append("HIERARCHY")
+    def write_joint(name, indent=0):
+        pad = "\t"*indent
+        if parents.get(name) is None:
+            lines.append(f"{pad}ROOT {name}")
+        else:
+            lines.append(f"{pad}JOINT {name}")
+        lines.append(pad + "{")
+        parent = parents.get(name)
+        if parent is None:
+            off = frames3d[0]['joints'][name]
+            lines.append(pad + f"\tOFFSET {off[0]:.6f} {off[1]:.6f} {off[2]:.6f}")
+            lines.append(pad + "\tCHANNELS 6 Xposition Yposition Zposition Zrotation Yrotation Xrotation")
+        else:
+            ppos = frames3d[0]['joints'][parent]
+            pos = frames3d[0]['joints'][name]
+            offset = (pos[0]-ppos[0], pos[1]-ppos[1], pos[2]-ppos[2])
+            lines.append(pad + f"\tOFFSET {offset[0]:.6f} {offset[1]:.6f} {offset[2]:.6f}")
+            lines.append(pad + "\tCHANNELS 3 Zrotation Yrotation Xrotation")
+        children = [j for j,p in parents.items() if p==name]
+        if not children:
+            lines.append(pad + "\tEnd Site")
+            lines.append(pad + "\t{")
+            lines.append(pad + "\t\tOFFSET 0.00 0.00 0.00")
+            lines.append(pad + "\t}")
+        else:
+            for c in children:
+                write_joint(c, indent+1)
+        lines.append(pad + "}")
+    roots = [n for n in joint_names if parents.get(n) is None]
+    for r in roots:
+        write_joint(r, 0)
+    lines.append("MOTION")
+    lines.append(f"Frames: {len(frames3d)}")
+    lines.append(f"Frame Time: {frame_time:.6f}")
+    for f in frames3d:
+        vals = []
+        for name in joint_names:
+            parent = parents.get(name)
+            p = f['joints'][name]
+            if parent is None:
+                vals += [f"{p[0]:.6f}", f"{p[1]:.6f}", f"{p[2]:.6f}", "0.0","0.0","0.0"]
+            else:
+                vals += ["0.0","0.0","0.0"]
+        lines.append(" ".join(vals))
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w") as fh:
+        fh.write("\n".join(lines))
+    return {"ok": True, "out": out_path}
+
+
+def skeleton(n_joints, n_roots, rng):
+    """Random tree in depth-first name order (what joint_names lists look like in practice)."""
+    names, parents = [], {}
+    for r in range(n_roots):
+        root = f"root{r}"
+        names.append(root)
+        parents[root] = None
+        stack = [root]
+        for i in range(n_joints // n_roots - 1):
+            while len(stack) > 1 and rng.random() < 0.3:
+                stack.pop()
+            j = f"j{r}_{i}"
+            names.append(j)
+            parents[j] = stack[-1]
+            stack.append(j)
+    return names, parents
+
+
+def timed(fn, *a):
+    tracemalloc.start()
+    t0 = time.time()
+    fn(*a)
+    dt = time.time() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dt, peak / 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--joints", type=int, default=400)
+    ap.add_argument("--frames", type=int, default=20000)
+    ap.add_argument("--roots", type=int, default=1)
+    args = ap.parse_args()
+
+    import numpy as np
+    from services import advanced_bvh, mocap, voice2anim
+
+    rng = random.Random(3)
+    tmp = Path(tempfile.mkdtemp(prefix="bvh_bench_"))
+    names, parents = skeleton(args.joints, args.roots, rng)
+    pos = np.random.default_rng(3).normal(0, 10, (args.frames, len(names), 3))
+    frames3d = [{"joints": dict(zip(names, f))} for f in pos.tolist()]
+    ok = True
+
+    t_old, m_old = timed(legacy_write_bvh, frames3d, names, parents, tmp / "legacy.bvh")
+    t_new, m_new = timed(advanced_bvh.write_bvh, frames3d, names, parents, str(tmp / "new.bvh"))
+    t_arr, m_arr = timed(advanced_bvh.write_bvh, pos, names, parents, str(tmp / "array.bvh"))
+    same = (tmp / "legacy.bvh").read_bytes() == (tmp / "new.bvh").read_bytes() == (tmp / "array.bvh").read_bytes()
+    ok &= same
+    print(f"{len(names)} joints, {args.frames} frames, {(tmp / 'new.bvh').stat().st_size / 1e6:.1f} MB, identical: {same}")
+    print(f"legacy      : {t_old:6.2f}s  peak {m_old:7.1f} MB")
+    print(f"new (dicts) : {t_new:6.2f}s  peak {m_new:7.1f} MB")
+    print(f"new (array) : {t_arr:6.2f}s  peak {m_arr:7.1f} MB")
+
+    t0 = time.time()
+    bvh = advanced_bvh.read_bvh(tmp / "new.bvh")
+    t_read = time.time() - t0
+    roots = [n for n in bvh["joints"] if bvh["parents"][n] is None]
+    motion_ok = bvh["motion"].shape == (args.frames, 6 * len(roots) + 3 * (len(names) - len(roots)))
+    root_cols = [i for i, n in enumerate(bvh["joints"]) if bvh["parents"][n] is None]
+    ch_start = np.cumsum([0] + [len(bvh["channels"][n]) for n in bvh["joints"]])
+    for i in root_cols:
+        motion_ok &= bool(np.abs(bvh["motion"][:, ch_start[i]:ch_start[i] + 3] - pos[:, names.index(bvh["joints"][i])]).max() <= 1e-6)
+    tree_ok = bvh["parents"] == {n: parents[n] for n in bvh["joints"]} and sorted(bvh["joints"]) == sorted(names)
+    off_ok = all(np.allclose(bvh["offsets"][n], pos[0, names.index(n)] - (pos[0, names.index(parents[n])] if parents[n] else 0), atol=1e-6)
+                 for n in names)
+    ok &= motion_ok and tree_ok and off_ok
+    print(f"read_bvh    : {t_read:6.2f}s  hierarchy {tree_ok}, offsets {off_ok}, motion {motion_ok}")
+
+    # the simple exporters round-trip too
+    k3 = np.random.default_rng(4).normal(0, 1, (500, 33, 3)).astype(np.float32)
+    mocap.export_bvh_from_3d(k3, str(tmp / "mocap.bvh"), fps=30)
+    m = advanced_bvh.read_bvh(tmp / "mocap.bvh")
+    mocap_ok = m["motion"].shape == (500, 6) and np.abs(m["motion"][:, :3] - k3[:, 0]).max() <= 1e-6
+    motion = [{"hip_y": float(i % 7), "spine_bend": 0.1 * i, "neck_tilt": -0.2, "head_nod": 0.5} for i in range(300)]
+    voice2anim.export_bvh_simple(motion, str(tmp / "v2a.bvh"))
+    v = advanced_bvh.read_bvh(tmp / "v2a.bvh")
+    v2a_ok = v["parents"] == {"Hips": None, "Spine": "Hips", "Neck": "Spine"} and v["motion"].shape == (300, 12) \
+        and np.allclose(v["motion"][:, [1, 6, 7, 8]], [[m[k] for k in ("hip_y", "spine_bend", "neck_tilt", "head_nod")] for m in motion])
+    ok &= bool(mocap_ok and v2a_ok)
+    print(f"mocap / voice2anim round trip: {bool(mocap_ok)} / {bool(v2a_ok)}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# scripts/bench_concat.py
+"""
+Benchmark scene assembly for a multi-character scene (default 50 lines).
+- builds N still+audio line clips with VideoService.make_simple_video (the scene clip profile)
+- times concat_clips in stream-copy mode against the forced re-encode fallback
+  (and moviepy's concatenate_videoclips with --moviepy, the old path)
+Usage: python scripts/bench_concat.py [--lines 50] [--secs 2.5] [--landscape] [--moviepy]
+Needs ffmpeg/ffprobe on PATH.
+"""
+import os, sys, time, tempfile, argparse, subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=50)
+    ap.add_argument("--secs", type=float, default=2.5, help="audio length per line")
+    ap.add_argument("--landscape", action="store_true")
+    ap.add_argument("--moviepy", action="store_true")
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="concat_bench_"))
+    os.chdir(tmp)  # video_engine writes under static/outputs relative to cwd
+    from services.video_engine import VideoService, concat_clips
+    vs = VideoService()
+    vertical = not args.landscape
+
+    imgs, auds = [], []
+    for c in range(3):  # three characters
+        imgs.append(tmp / f"char{c}.png")
+        subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"testsrc=size=768x768:rate=1",
+                        "-frames:v", "1", str(imgs[-1])], check=True)
+    for i in range(args.lines):
+        auds.append(tmp / f"line{i}.mp3")
+        subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i",
+                        f"sine=frequency={200 + 10 * i}:duration={args.secs}", str(auds[-1])], check=True)
+
+    t0 = time.perf_counter()
+    clips = [vs.make_simple_video(str(imgs[i % 3]), str(auds[i]), out_filename=f"clip_{i}.mp4", vertical=vertical)
+             for i in range(args.lines)]
+    print(f"{args.lines} line clips encoded in {time.perf_counter() - t0:.2f}s (not part of assembly)")
+
+    t0 = time.perf_counter()
+    res = concat_clips(clips, str(tmp / "scene_copy.mp4"), vertical=vertical)
+    copy_t = time.perf_counter() - t0
+    assert res["ok"] and res["mode"] == "copy", res
+
+    t0 = time.perf_counter()
+    res = concat_clips(clips, str(tmp / "scene_reencode.mp4"), vertical=vertical, force_reencode=True)
+    enc_t = time.perf_counter() - t0
+    assert res["ok"], res
+
+    print(f"assembly of {args.lines} lines ({args.lines * args.secs:.0f}s of video):")
+    print(f"  stream copy (concat demuxer): {copy_t:8.2f}s")
+    print(f"  re-encode fallback:           {enc_t:8.2f}s   x{enc_t / copy_t:.0f}")
+    if args.moviepy:
+        from moviepy.editor import VideoFileClip, concatenate_videoclips
+        t0 = time.perf_counter()
+        objs = [VideoFileClip(c) for c in clips]
+        final = concatenate_videoclips(objs, method="compose")
+        final.write_videofile(str(tmp / "scene_moviepy.mp4"), fps=24, codec="libx264", audio_codec="aac", logger=None)
+        for o in objs:
+            o.close()
+        mp_t = time.perf_counter() - t0
+        print(f"  moviepy concatenate (old):    {mp_t:8.2f}s   x{mp_t / copy_t:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# scripts/bench_eleven.py
+"""
+Benchmark ElevenLabs segment synthesis against the local mock (scripts/mock_eleven_server.py).
+- serial: one request at a time on a fresh connection each (the old per-segment loop)
+- async: services/elevenlabs_async with a shared pool, bounded concurrency and retries
+The mock sheds load past --max-concurrent / --rate with 429s, so the async run also shows how
+many retries the limits cost. The TTS cache is disabled for both runs.
+Usage: python scripts/bench_eleven.py [--lines 60] [--latency-ms 300] [--concurrency 6] [--max-concurrent 5]
+"""
+import os, sys, time, tempfile, argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["TTS_CACHE"] = "0"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=60)
+    ap.add_argument("--latency-ms", type=float, default=300)
+    ap.add_argument("--concurrency", type=int, default=6, help="client-side in-flight limit")
+    ap.add_argument("--rate", type=float, default=0.0, help="client-side starts per second")
+    ap.add_argument("--max-concurrent", type=int, default=5, help="mock server limit before 429")
+    ap.add_argument("--server-rate", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.02)
+    args = ap.parse_args()
+
+    import httpx
+    import mock_eleven_server
+    from services import elevenlabs_async
+
+    server, url, state = mock_eleven_server.start(latency_ms=args.latency_ms, max_concurrent=args.max_concurrent,
+                                                  rate=args.server_rate, error_rate=args.error_rate)
+    out = Path(tempfile.mkdtemp(prefix="eleven_bench_"))
+    texts = [f"Line {i}: the quick brown fox jumps over the lazy dog." for i in range(args.lines)]
+
+    t0 = time.time()
+    ok = 0
+    for i, text in enumerate(texts):
+        for _ in range(6):
+            with httpx.Client(base_url=url, timeout=60) as c:
+                r = c.post("/v1/text-to-speech/alloy", json={"text": text})
+            if r.status_code == 200:
+                (out / f"serial_{i}.mp3").write_bytes(r.content)
+                ok += 1
+                break
+            time.sleep(0.2)
+    serial = time.time() - t0
+    print(f"serial : {serial:7.2f}s  {ok}/{len(texts)} ok")
+
+    items = [{"text": t, "output_name": f"async_{i}.mp3", "out_dir": str(out)} for i, t in enumerate(texts)]
+    t0 = time.time()
+
+    async def run():
+        async with elevenlabs_async.ElevenAsyncClient(base_url=url, concurrency=args.concurrency,
+                                                      rate_per_sec=args.rate) as client:
+            res = await client.synthesize_many(items)
+            return res, client.stats
+
+    import asyncio
+    res, stats = asyncio.run(run())
+    fast = time.time() - t0
+    in_order = all(r.get("path", "").endswith(f"async_{i}.mp3") for i, r in enumerate(res) if r.get("ok"))
+    print(f"async  : {fast:7.2f}s  {sum(r['ok'] for r in res)}/{len(texts)} ok  retries={stats['retries']}"
+          f"  in_order={in_order}")
+    print(f"speedup: {serial / fast:.1f}x   server: {state.stats}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# scripts/bench_farm_status.py
+"""
+Benchmark farm status lookups against job size.
+- builds a throwaway store per size, times get_job_status / pending_count
+- --legacy also times the old glob+parse over per-task JSON files (slow, skip for 100k)
+Usage: python scripts/bench_farm_status.py [--sizes 1000,10000,100000] [--repeat 50] [--legacy]
+"""
+import os, sys, json, time, tempfile, argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def _legacy_status(tasks_dir, job_id):
+    stats = {}
+    for tfile in Path(tasks_dir).glob("*"):
+        t = json.loads(tfile.read_text())
+        if t.get("job_id") != job_id: continue
+        stats[t.get("status")] = stats.get(t.get("status"), 0) + 1
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000")
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--legacy", action="store_true")
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="farm_bench_"))
+    os.chdir(tmp)  # farm_manager keeps jobs/ relative to cwd
+    os.environ["FARM_STORE_PATH"] = str(tmp / "farm.db")
+    from services import farm_manager
+
+    print(f"{'tasks':>8} {'submit_s':>9} {'status_ms':>10} {'pending_ms':>11} {'legacy_ms':>10}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        t0 = time.perf_counter()
+        res = farm_manager.create_job({"type": "render", "job_name": f"bench_{n}", "start_frame": 1, "end_frame": n, "chunk_size": 1})
+        submit = time.perf_counter() - t0
+        jid = res["job_id"]
+        # finish a third of the frames so counters cover several statuses
+        for t in farm_manager.farm_store.list_tasks(job_id=jid, limit=n // 3):
+            farm_manager.mark_task_status(t["task_id"], "done")
+        status_ms = _time(lambda: farm_manager.get_job_status(jid), args.repeat)
+        pending_ms = _time(farm_manager.pending_count, args.repeat)
+        legacy_ms = "-"
+        if args.legacy and n <= 10000:
+            ldir = tmp / f"legacy_{n}"; ldir.mkdir()
+            for t in farm_manager.split_frames({"job_id": jid, "start_frame": 1, "end_frame": n}):
+                (ldir / f"{t['task_id']}.json").write_text(json.dumps(t, indent=2))
+            legacy_ms = f"{_time(lambda: _legacy_status(ldir, jid), 1):.1f}"
+        print(f"{n:>8} {submit:>9.2f} {status_ms:>10.3f} {pending_ms:>11.3f} {legacy_ms:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# scripts/bench_lipsync.py
+"""
+Benchmark lip-sync dispatch for a multi-character scene on the CPU stub backend.
+- cold: a fresh worker process per line (what spawning inference.py per clip costs)
+- warm: one resident worker, faces reused across lines (detected once per character)
+Stub costs come from LIPSYNC_STUB_LOAD_MS / _DETECT_MS / _FRAME_MS; encoding is skipped
+unless --encode (needs ffmpeg).
+Usage: python scripts/bench_lipsync.py [--lines 24] [--chars 3] [--secs 2.0] [--encode]
+"""
+import os, sys, time, wave, struct, tempfile, argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _write_wav(path, secs, rate=16000):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1); w.setsampwidth(2); w.setframerate(rate)
+        w.writeframes(struct.pack("<h", 0) * int(secs * rate))
+
+
+def _write_ppm(path, color, size=64):
+    Path(path).write_bytes(f"P6 {size} {size} 255\n".encode() + bytes(color) * (size * size))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=24)
+    ap.add_argument("--chars", type=int, default=3)
+    ap.add_argument("--secs", type=float, default=2.0, help="audio length per line")
+    ap.add_argument("--encode", action="store_true")
+    args = ap.parse_args()
+
+    os.environ["LIPSYNC_BACKEND"] = "stub"
+    os.environ.setdefault("LIPSYNC_STUB_ENCODE", "1" if args.encode else "0")
+    from services import lipsync_worker
+
+    tmp = Path(tempfile.mkdtemp(prefix="lipsync_bench_"))
+    faces = []
+    for c in range(args.chars):
+        faces.append(tmp / f"char{c}.ppm")
+        _write_ppm(faces[-1], (40 * c % 256, 120, 200))
+    audio = tmp / "line.wav"
+    _write_wav(audio, args.secs)
+    jobs = [{"face": str(faces[i % args.chars]), "audio": str(audio), "outfile": str(tmp / f"line_{i}.mp4"), "fps": 25}
+            for i in range(args.lines)]
+
+    t0 = time.perf_counter()
+    for job in jobs:
+        w = lipsync_worker.LipSyncWorker(backend="stub")
+        res = w.run([job])[0]
+        w.close()
+        assert res["ok"], res
+    cold = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    results = lipsync_worker.lipsync_many(jobs, backend="stub")
+    warm = time.perf_counter() - t0
+    assert all(r["ok"] for r in results), results
+    hits = sum(1 for r in results if r.get("face_cached"))
+    lipsync_worker.shutdown_all()
+
+    print(f"{args.lines} lines / {args.chars} characters / {args.secs}s audio each")
+    print(f"  cold (process per line): {cold:8.2f}s  {cold / args.lines * 1000:8.1f} ms/line")
+    print(f"  warm (resident worker):  {warm:8.2f}s  {warm / args.lines * 1000:8.1f} ms/line  face cache hits {hits}/{args.lines}")
+    print(f"  speedup x{cold / warm:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# scripts/bench_sound_engine.py
+"""
+Benchmark services/sound_engine effects on synthetic tracks (mono 16-bit, --rate Hz).
+- legacy auto_duck (200 ms chunks appended with += onto one AudioSegment) on short tracks only,
+  to show the quadratic growth; it is skipped past --legacy-max-min minutes
+- auto_duck / apply_reverb / apply_echo (vectorized, one pass) on every length up to --minutes
+- a level check: music is ducked by ~duck dB under the voice and untouched away from it
+Usage: python scripts/bench_sound_engine.py [--minutes 1 5 15 60] [--rate 44100] [--legacy-max-min 5]
+"""
+import sys, time, argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def legacy_auto_duck(music, voice, duck_amount_db=12.0):
+    from pydub import AudioSegment
+    voice = voice.set_frame_rate(music.frame_rate).set_channels(1)
+    music = music.set_channels(1)
+    chunk_ms = 200
+    music_chunks = [music[i:i + chunk_ms] for i in range(0, len(music), chunk_ms)]
+    voice_chunks = [voice[i:i + chunk_ms] for i in range(0, len(voice), chunk_ms)]
+    out = AudioSegment.silent(duration=0)
+    for idx, mchunk in enumerate(music_chunks):
+        vchunk = voice_chunks[idx] if idx < len(voice_chunks) else AudioSegment.silent(duration=chunk_ms)
+        if vchunk.rms > 500:
+            mchunk = mchunk - duck_amount_db
+        out += mchunk
+    final_length = max(len(out), len(voice))
+    out = out + AudioSegment.silent(duration=max(0, final_length - len(out)))
+    voice_pad = voice + AudioSegment.silent(duration=max(0, final_length - len(voice)))
+    return out.overlay(voice_pad)
+
+
+def tracks(minutes: float, rate: int):
+    """Music: 220 Hz at -12 dBFS. Voice: 1 kHz at -12 dBFS, 4 s on / 6 s off."""
+    import numpy as np
+    from services import sound_engine
+    n = int(minutes * 60 * rate)
+    t = np.arange(n, dtype=np.float64) / rate
+    music = (0.25 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)[:, None]
+    voice = (0.25 * np.sin(2 * np.pi * 1000 * t)).astype(np.float32)
+    voice[(t % 10.0) >= 4.0] = 0.0
+    del t
+    return sound_engine.from_array(music, rate), sound_engine.from_array(voice[:, None], rate)
+
+
+def timed(fn, *a, **kw):
+    t0 = time.time()
+    out = fn(*a, **kw)
+    return time.time() - t0, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--minutes", type=float, nargs="+", default=[1, 5, 15, 60])
+    ap.add_argument("--rate", type=int, default=44100)
+    ap.add_argument("--legacy-max-min", type=float, default=5)
+    args = ap.parse_args()
+
+    import numpy as np
+    from services import sound_engine
+
+    print(f"{'minutes':>8} {'legacy duck':>12} {'duck':>8} {'reverb':>8} {'echo':>8}")
+    for minutes in args.minutes:
+        music, voice = tracks(minutes, args.rate)
+        legacy = "-"
+        if minutes <= args.legacy_max_min:
+            legacy = f"{timed(legacy_auto_duck, music, voice)[0]:.2f}s"
+        t_duck, ducked = timed(sound_engine.auto_duck, music, voice)
+        assert abs(len(ducked) - len(music)) <= 1, (len(ducked), len(music))
+        if minutes == args.minutes[0]:
+            # 2 s into a voice window vs 3 s into a gap (past padding + release): level of the 220 Hz bed
+            x = sound_engine.to_array(ducked)[:, 0]
+            w = args.rate // 10
+            def bed_db(sec):
+                seg = x[int(sec * args.rate):int(sec * args.rate) + w]
+                ref = np.sin(2 * np.pi * 220 * np.arange(int(sec * args.rate), int(sec * args.rate) + w) / args.rate)
+                return 20 * np.log10(abs(2 * np.mean(seg * ref)) / 0.25 + 1e-12)
+            print(f"music level: {bed_db(2.0):.1f} dB under voice, {bed_db(8.0):.1f} dB in gaps")
+        del ducked
+        t_rev = timed(sound_engine.apply_reverb, music, 0.4)[0]
+        t_echo = timed(sound_engine.apply_echo, music)[0]
+        print(f"{minutes:8g} {legacy:>12} {t_duck:7.2f}s {t_rev:7.2f}s {t_echo:7.2f}s")
+        del music, voice
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# scripts/bench_soundfx_mix.py
+"""
+Golden check + timing for SoundFXEngine.mix_tracks (numpy) against mix_tracks_reference (pydub).
+Builds a synthetic scene (dialogue lines, every SFX event keyword, ambience and music loops),
+renders it with both mixers from the same random seed, decodes both MP3s and reports the level
+difference; exits non-zero if the numpy mix drifts past --max-db from the reference.
+Usage: python scripts/bench_soundfx_mix.py [--lines 40] [--line-secs 2.5] [--max-db -30]
+"""
+import os, sys, time, random, tempfile, argparse, subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def tone(path, freq, secs, rate=44100, channels=1, vol=0.3):
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"sine=f={freq}:d={secs}:sample_rate={rate}",
+                    "-af", f"volume={vol}", "-ac", str(channels), str(path)], check=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=40)
+    ap.add_argument("--line-secs", type=float, default=2.5)
+    ap.add_argument("--max-db", type=float, default=-30.0, help="allowed residual (dB relative to the reference)")
+    args = ap.parse_args()
+
+    import numpy as np
+    from services import soundfx_engine, audio_mix
+
+    tmp = Path(tempfile.mkdtemp(prefix="sfx_bench_"))
+    for d in ("sfx", "ambience", "music", "lines"):
+        (tmp / d).mkdir()
+    for i, name in enumerate(["tiger_roar", "footstep", "door", "wind", "rain", "crowd", "impact", "scream", "engine"]):
+        tone(tmp / "sfx" / f"{name}.wav", 300 + 40 * i, 1.2)
+    tone(tmp / "ambience" / "rain_loop.wav", 90, 3.0, channels=2, vol=0.2)
+    tone(tmp / "music" / "calm_theme.mp3", 440, 7.0, channels=2, vol=0.5)
+    tracks, t = [], 0.5
+    for i in range(args.lines):
+        p = tmp / "lines" / f"l{i}.wav"
+        tone(p, 180 + (i % 7) * 30, args.line_secs, rate=22050)
+        tracks.append({"audio": str(p), "start": t, "end": t + args.line_secs})
+        t += args.line_secs + 0.3
+    script = "A tiger roars while people walk; the door slams, wind and rain, the crowd cheers, a punch, a scream, the car engine."
+
+    eng = soundfx_engine.SoundFXEngine(str(tmp / "sfx"), str(tmp / "ambience"), str(tmp / "music"))
+    soundfx_engine.OUT_DIR = tmp
+    runs = {}
+    for name, fn in (("pydub", eng.mix_tracks_reference), ("numpy", eng.mix_tracks)):
+        random.seed(7)
+        t0 = time.time()
+        res = fn(tracks, script, mood="rain", music_intensity="calm")
+        # same seed -> same output name; keep each mixer's file
+        kept = tmp / f"{name}_{Path(res['final_audio']).name}"
+        os.replace(res["final_audio"], kept)
+        res["final_audio"] = str(kept)
+        runs[name] = (time.time() - t0, res)
+
+    ref_res, new_res = runs["pydub"][1], runs["numpy"][1]
+    rate = 44100
+    a = audio_mix.decode(ref_res["final_audio"], rate, 2)
+    b = audio_mix.decode(new_res["final_audio"], rate, 2)
+    n = min(len(a), len(b))
+    resid = 10 * np.log10(np.mean((a[:n] - b[:n]) ** 2) / max(np.mean(a[:n] ** 2), 1e-12) + 1e-12)
+    same_choice = ref_res["details"] == new_res["details"]
+    print(f"timeline {t:.1f}s, {args.lines} lines, {len(new_res['details']['sfx'])} sfx")
+    print(f"pydub : {runs['pydub'][0]:6.2f}s")
+    print(f"numpy : {runs['numpy'][0]:6.2f}s  ({runs['pydub'][0] / runs['numpy'][0]:.1f}x)")
+    print(f"length: {len(a)} vs {len(b)} frames, same placements: {same_choice}, residual {resid:.1f} dB")
+    return 0 if resid <= args.max_db and same_choice else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# scripts/bench_tts_client.py
+"""
+Benchmark services/tts_client against a local stub TTS server (same routes as app_tts.py).
+- legacy: what TTSClient used to do per line: asyncio.run + a fresh AsyncClient for the POST and
+  another for the download (called from --threads scene threads)
+- pooled: TTSClient.synthesize from the same threads (shared background loop + pool)
+- batch:  TTSClient.synthesize_many for all lines in one call (/tts/speak_batch)
+The stub answers after --latency-ms and serves --kb KB files; the TTS cache is off.
+Usage: python scripts/bench_tts_client.py [--lines 64] [--threads 4] [--latency-ms 20] [--kb 64]
+"""
+import os, sys, json, time, asyncio, tempfile, argparse, threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["TTS_CACHE"] = "0"
+
+
+def stub_server(latency: float, size: int):
+    audio = os.urandom(size)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body: bytes, ctype="application/json"):
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _line(self, item):
+            # no abs_path: the client has to download, as from a TTS server on another host
+            name = item.get("filename") or f"tts_{abs(hash(item['text'])) % 10**12}.mp3"
+            return {"ok": True, "file": f"static/outputs/{name}"}
+
+        def do_POST(self):
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            time.sleep(latency)
+            if self.path == "/tts/speak":
+                return self._send(200, json.dumps(self._line(req)).encode())
+            if self.path == "/tts/speak_batch":
+                return self._send(200, json.dumps({"ok": True, "results": [self._line(i) for i in req["items"]]}).encode())
+            self._send(404, b"{}")
+
+        def do_GET(self):
+            if self.path.startswith("/static/outputs/"):
+                return self._send(200, audio, "audio/mpeg")
+            self._send(404, b"{}")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def legacy_synthesize(base_url, text, filename, out_dir: Path):
+    import httpx
+
+    async def run():
+        async with httpx.AsyncClient(timeout=60) as client:
+            r = await client.post(f"{base_url}/tts/speak", json={"text": text, "filename": filename})
+            r.raise_for_status()
+            resp = r.json()
+        name = Path(resp["file"]).name
+        async with httpx.AsyncClient(timeout=60) as client:
+            dr = await client.get(f"{base_url}/static/outputs/{name}")
+            dr.raise_for_status()
+            (out_dir / name).write_bytes(dr.content)
+        return str(out_dir / name)
+    return asyncio.run(run())
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=64)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=20)
+    ap.add_argument("--kb", type=int, default=64)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="tts_client_bench_"))
+    os.chdir(tmp)  # TTSClient writes to ./static/outputs
+    from services import tts_client
+    server, url = stub_server(args.latency_ms / 1000.0, args.kb * 1024)
+    texts = [(f"Line {i} of the scene.", f"line_{i}.mp3") for i in range(args.lines)]
+
+    legacy_dir = tmp / "legacy"
+    legacy_dir.mkdir()
+    t0 = time.time()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(lambda t: legacy_synthesize(url, t[0], t[1], legacy_dir), texts))
+    legacy = time.time() - t0
+
+    client = tts_client.TTSClient(base_url=url)
+    t0 = time.time()
+    with ThreadPoolExecutor(args.threads) as pool:
+        res = list(pool.map(lambda t: client.synthesize(t[0], filename=t[1]), texts))
+    pooled = time.time() - t0
+    assert all(r.get("downloaded") for r in res), res[:2]
+
+    t0 = time.time()
+    res = client.synthesize_many([{"text": t, "filename": f"b_{f}"} for t, f in texts])
+    batch = time.time() - t0
+    assert all(r.get("downloaded", "").endswith(f"b_line_{i}.mp3") for i, r in enumerate(res)), res[:2]
+
+    print(f"lines={args.lines} threads={args.threads} latency={args.latency_ms}ms file={args.kb}KB")
+    print(f"legacy : {legacy:6.2f}s  ({legacy / args.lines * 1000:.1f} ms/line)")
+    print(f"pooled : {pooled:6.2f}s  ({pooled / args.lines * 1000:.1f} ms/line)  {legacy / pooled:.1f}x")
+    print(f"batch  : {batch:6.2f}s  ({batch / args.lines * 1000:.1f} ms/line)  {legacy / batch:.1f}x")
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# scripts/mock_eleven_server.py
+"""
+Local stand-in for the ElevenLabs text-to-speech endpoint, for offline throughput tests.
+- POST /v1/text-to-speech/<voice_id> sleeps --latency-ms (+ --per-char-ms per character) and
+  returns a fake MP3 body sized to the text
+- more than --max-concurrent requests in flight, or more than --rate starts per second, get a 429
+  with Retry-After, the way the real API sheds load
+- --error-rate returns a random share of 503s
+- GET /stats returns counters (requests, ok, 429, 503, peak concurrency)
+Usage: python scripts/mock_eleven_server.py [--port 8765] [--latency-ms 300] [--max-concurrent 5] [--rate 10]
+then ELEVEN_API_URL=http://127.0.0.1:8765 for the client.
+"""
+import sys, json, time, random, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockState:
+    def __init__(self, latency_ms=300, per_char_ms=0.0, max_concurrent=5, rate=0.0, error_rate=0.0):
+        self.latency = latency_ms / 1000.0
+        self.per_char = per_char_ms / 1000.0
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.starts = []  # recent request start times for the rate window
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "503": 0, "peak_concurrency": 0}
+
+    def admit(self):
+        """None if admitted, else seconds the client should wait."""
+        now = time.monotonic()
+        with self.lock:
+            self.stats["requests"] += 1
+            self.starts = [t for t in self.starts if now - t < 1.0]
+            if self.max_concurrent and self.inflight >= self.max_concurrent:
+                self.stats["429"] += 1
+                return max(0.05, self.latency / 2)
+            if self.rate and len(self.starts) >= self.rate:
+                self.stats["429"] += 1
+                return max(0.05, 1.0 - (now - self.starts[0]))
+            self.starts.append(now)
+            self.inflight += 1
+            self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self.inflight)
+            return None
+
+    def release(self, ok):
+        with self.lock:
+            self.inflight -= 1
+            self.stats["ok" if ok else "503"] += 1
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body: bytes, ctype="application/json", headers=None):
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with state.lock:
+                    return self._send(200, json.dumps(state.stats).encode())
+            self._send(404, b'{"detail":"not found"}')
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not self.path.startswith("/v1/text-to-speech/"):
+                return self._send(404, b'{"detail":"not found"}')
+            wait = state.admit()
+            if wait is not None:
+                return self._send(429, b'{"detail":"too_many_concurrent_requests"}',
+                                  headers={"Retry-After": f"{wait:.2f}"})
+            ok = random.random() >= state.error_rate
+            try:
+                text = json.loads(body or b"{}").get("text", "")
+                time.sleep(state.latency + state.per_char * len(text))
+                if not ok:
+                    return self._send(503, b'{"detail":"overloaded"}')
+                audio = b"ID3\x04\x00\x00\x00\x00\x00\x00" + bytes(random.getrandbits(8) for _ in range(64)) * (8 + len(text))
+                self._send(200, audio, ctype="audio/mpeg")
+            finally:
+                state.release(ok)
+
+    return Handler
+
+
+def start(port: int = 0, **opts):
+    """Run the mock in a background thread; returns (server, base_url, state)."""
+    state = MockState(**opts)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="mock-eleven").start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", state
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=300)
+    ap.add_argument("--per-char-ms", type=float, default=0.0)
+    ap.add_argument("--max-concurrent", type=int, default=5)
+    ap.add_argument("--rate", type=float, default=0.0, help="request starts per second (0 = unlimited)")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    server, url, _ = start(args.port, latency_ms=args.latency_ms, per_char_ms=args.per_char_ms,
+                           max_concurrent=args.max_concurrent, rate=args.rate, error_rate=args.error_rate)
+    print("mock ElevenLabs on", url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,69 +3,146 @@
 Create a more realistic BVH exporter using a full joint hierarchy.
 This script expects a mapping 'skeleton_joints' as list of joints with parent-child structure.
 We will write a BVH file with joint offsets and rotation channels.
+- the hierarchy is walked once from a parent -> children index (linear in joint count)
+- motion is a numeric (frames, channels) array formatted one row per % operation and streamed to
+  disk BVH_CHUNK_FRAMES rows at a time, so long takes never sit in memory as text
+- read_bvh parses a file back into the hierarchy + a (frames, channels) array (round trips)
 """
 from pathlib import Path
-import math, json
+import os, math, json, itertools
+import numpy as np
+
+CHUNK_FRAMES = int(os.getenv("BVH_CHUNK_FRAMES", "2048"))
+
+
+def children_index(joint_names, parents) -> dict:
+    """name -> [children] in the order they appear in `parents`, built in one pass."""
+    children = {}
+    for j, p in parents.items():
+        if p is not None:
+            children.setdefault(p, []).append(j)
+    return children
+
+
+def write_bvh_file(out_path, hierarchy_lines, motion, frame_time, row_format=None, chunk_frames=CHUNK_FRAMES):
+    """
+    Stream a BVH: hierarchy_lines (HIERARCHY ... closing brace), then MOTION rows from the
+    (frames, columns) array. row_format is one %-format string per row (default "%.6f" per column);
+    constant channels can be written as literals in it (e.g. "%.6f %.6f %.6f 0.0 0.0 0.0").
+    """
+    motion = np.asarray(motion, np.float64)
+    motion = motion.reshape(len(motion), -1)
+    row_format = row_format or " ".join(["%.6f"] * motion.shape[1])
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w") as fh:
+        fh.write("\n".join(list(hierarchy_lines) + ["MOTION", f"Frames: {len(motion)}", f"Frame Time: {frame_time:.6f}"]))
+        for a in range(0, len(motion), max(1, chunk_frames)):
+            rows = motion[a:a + chunk_frames].tolist()
+            fh.write("\n" + "\n".join([row_format % tuple(r) for r in rows]))
+    return {"ok": True, "out": out_path}
+
+
+def read_bvh(path) -> dict:
+    """
+    Parse a BVH -> {"joints": [names in channel order], "parents": {name: parent}, "offsets": {name: (x,y,z)},
+                    "channels": {name: [...]}, "frame_time": float, "motion": (frames, channels) float64}
+    MOTION headers are matched by key ("Frames:", "Frame Time:", any order, blank lines allowed).
+    """
+    joints, parents, offsets, channels, stack, last = [], {}, {}, {}, [], None
+    header, first_row = {}, None
+    with open(path) as fh:
+        for raw in fh:
+            tok = raw.split()
+            if not tok:
+                continue
+            if tok[0] == "MOTION":
+                break
+            if tok[0] in ("ROOT", "JOINT"):
+                last = tok[1]
+                joints.append(last)
+                parents[last] = stack[-1] if stack else None
+            elif tok[0] == "End":
+                last = None  # End Site: its OFFSET / braces belong to no joint
+            elif tok[0] == "{":
+                stack.append(last)
+            elif tok[0] == "}":
+                stack.pop()
+            elif tok[0] == "OFFSET" and last is not None:
+                offsets[last] = tuple(float(v) for v in tok[1:4])
+            elif tok[0] == "CHANNELS" and last is not None:
+                channels[last] = tok[2:2 + int(tok[1])]
+        for raw in fh:
+            key, sep, val = raw.partition(":")
+            if not raw.strip():
+                continue
+            if not sep:
+                first_row = raw  # first motion row
+                break
+            header[" ".join(key.split()).lower()] = val.strip()
+        if "frames" not in header or "frame time" not in header:
+            raise ValueError(f"{path}: MOTION section lacks Frames: / Frame Time:")
+        n_frames, frame_time = int(header["frames"]), float(header["frame time"])
+        n_ch = sum(len(c) for c in channels.values())
+        data = np.zeros((0, n_ch))
+        if n_frames and first_row is not None:
+            # numpy's C tokenizer straight off the file, one row per line
+            data = np.loadtxt(itertools.chain([first_row], fh), dtype=np.float64, ndmin=2)
+    if data.shape != (n_frames, n_ch):
+        raise ValueError(f"{path}: motion is {data.shape}, header says ({n_frames}, {n_ch})")
+    return {"joints": joints, "parents": parents, "offsets": offsets, "channels": channels,
+            "frame_time": frame_time, "motion": data}
+
 
 def write_bvh(frames3d, joint_names, parents, out_path, frame_time=1/30.0):
     """
-    frames3d: list of dicts each with 'joints': {name:[x,y,z], ...}
+    frames3d: list of dicts each with 'joints': {name:[x,y,z], ...}, or a (frames, joints, 3) array
+              in joint_names order
     joint_names: ordered list of joint names (root first)
     parents: dict name->parent_name (root parent = None)
+    Motion channels follow the hierarchy order (depth first from each root).
     """
-    lines = []
-    lines.append("HIERARCHY")
-    def write_joint(name, indent=0):
+    if isinstance(frames3d, np.ndarray):
+        col = {n: i for i, n in enumerate(joint_names)}
+        first = {n: frames3d[0, col[n]].tolist() for n in joint_names}
+    else:
+        first = frames3d[0]['joints']
+    children = children_index(joint_names, parents)
+    lines = ["HIERARCHY"]
+    order = []
+    # iterative depth-first walk: ("open", name, indent) emits the joint, ("close", pad) its brace
+    roots = [n for n in joint_names if parents.get(n) is None]
+    stack = [("open", r, 0) for r in reversed(roots)]
+    while stack:
+        item = stack.pop()
+        if item[0] == "close":
+            lines.append(item[1] + "}")
+            continue
+        _, name, indent = item
         pad = "\t"*indent
-        if parents.get(name) is None:
-            lines.append(f"{pad}ROOT {name}")
-        else:
-            lines.append(f"{pad}JOINT {name}")
+        parent = parents.get(name)
+        order.append(name)
+        lines.append(f"{pad}ROOT {name}" if parent is None else f"{pad}JOINT {name}")
         lines.append(pad + "{")
         # find offset from parent using first frame
-        parent = parents.get(name)
         if parent is None:
-            off = frames3d[0]['joints'][name]
+            off = first[name]
             lines.append(pad + f"\tOFFSET {off[0]:.6f} {off[1]:.6f} {off[2]:.6f}")
             lines.append(pad + "\tCHANNELS 6 Xposition Yposition Zposition Zrotation Yrotation Xrotation")
         else:
-            ppos = frames3d[0]['joints'][parent]
-            pos = frames3d[0]['joints'][name]
-            offset = (pos[0]-ppos[0], pos[1]-ppos[1], pos[2]-ppos[2])
-            lines.append(pad + f"\tOFFSET {offset[0]:.6f} {offset[1]:.6f} {offset[2]:.6f}")
+            ppos, pos = first[parent], first[name]
+            lines.append(pad + f"\tOFFSET {pos[0]-ppos[0]:.6f} {pos[1]-ppos[1]:.6f} {pos[2]-ppos[2]:.6f}")
             lines.append(pad + "\tCHANNELS 3 Zrotation Yrotation Xrotation")
-        # children
-        children = [j for j,p in parents.items() if p==name]
-        if not children:
-            lines.append(pad + "\tEnd Site")
-            lines.append(pad + "\t{")
-            lines.append(pad + "\t\tOFFSET 0.00 0.00 0.00")
-            lines.append(pad + "\t}")
+        kids = children.get(name, [])
+        if not kids:
+            lines += [pad + "\tEnd Site", pad + "\t{", pad + "\t\tOFFSET 0.00 0.00 0.00", pad + "\t}", pad + "}"]
         else:
-            for c in children:
-                write_joint(c, indent+1)
-        lines.append(pad + "}")
-    # write full hierarchy starting from root(s)
-    roots = [n for n in joint_names if parents.get(n) is None]
-    for r in roots:
-        write_joint(r, 0)
-    # Motion
-    lines.append("MOTION")
-    lines.append(f"Frames: {len(frames3d)}")
-    lines.append(f"Frame Time: {frame_time:.6f}")
-    # frame data
-    for f in frames3d:
-        vals = []
-        for name in joint_names:
-            parent = parents.get(name)
-            p = f['joints'][name]
-            if parent is None:
-                vals += [f"{p[0]:.6f}", f"{p[1]:.6f}", f"{p[2]:.6f}", "0.0","0.0","0.0"]
-            else:
-                # rotations unknown here; placeholder zeros
-                vals += ["0.0","0.0","0.0"]
-        lines.append(" ".join(vals))
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    with open(out_path, "w") as fh:
-        fh.write("\n".join(lines))
-    return {"ok": True, "out": out_path}
+            stack.append(("close", pad))
+            stack.extend(("open", c, indent + 1) for c in reversed(kids))
+    # root translations are the only varying channels; rotations unknown here, written as 0.0
+    order_roots = [n for n in order if parents.get(n) is None]
+    if isinstance(frames3d, np.ndarray):
+        motion = frames3d[:, [col[r] for r in order_roots]]
+    else:
+        motion = np.array([[f['joints'][r] for r in order_roots] for f in frames3d], np.float64)
+    row_format = " ".join("%.6f %.6f %.6f 0.0 0.0 0.0" if parents.get(n) is None else "0.0 0.0 0.0" for n in order)
+    return write_bvh_file(out_path, lines, motion.reshape(len(motion), -1), frame_time, row_format)
@@ -0,0 +1,274 @@
+# services/asr_resident.py
+"""
+Process-wide Whisper ASR shared by every caller (asr_whisper, asr_service, localization tasks).
+- models stay loaded, keyed by (size, language); one worker thread per loaded model owns it,
+  so access is serialised without a lock around every caller (whisper's decoder hooks are not
+  safe to run concurrently on one model)
+- ASR_REPLICAS > 1 keeps that many copies of a model so chunks really run side by side
+- transcribe(paths) takes several files or in-memory chunks per call: each file is decoded once
+  to 16 kHz mono, long media is split on quiet (VAD) boundaries near ASR_CHUNK_SECS, and all chunks
+  from all files go to the model queues at once; segments are shifted back to file time and merged
+- language is detected once per file (first 30 s) so chunks of one file never disagree
+- CPU path for tests: ASR_MODEL=tiny ASR_DEVICE=cpu (fp32), or ASR_BACKEND=stub which returns
+  placeholder segments from the VAD alone and needs no model at all
+"""
+import os, time, queue, threading, subprocess
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+DEFAULT_MODEL = os.getenv("ASR_MODEL", "small")
+DEVICE = os.getenv("ASR_DEVICE", "")  # cuda | cpu | "" = auto
+BACKEND = os.getenv("ASR_BACKEND", "whisper")  # whisper | stub
+REPLICAS = int(os.getenv("ASR_REPLICAS", "1"))
+# *.en checkpoints are smaller/faster for English; only used when asked for
+ENGLISH_MODELS = os.getenv("ASR_ENGLISH_MODELS", "0") == "1"
+CHUNK_SECS = float(os.getenv("ASR_CHUNK_SECS", "120"))
+VAD_DB = float(os.getenv("ASR_VAD_DB", "-40"))
+VAD_MIN_SILENCE = float(os.getenv("ASR_VAD_MIN_SILENCE_MS", "300")) / 1000.0
+VAD_FRAME = 0.03
+
+
+def _device() -> str:
+    if DEVICE:
+        return DEVICE
+    try:
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except Exception:
+        return "cpu"
+
+
+def model_name(size: str | None = None, lang: str | None = None) -> str:
+    size = size or DEFAULT_MODEL
+    if ENGLISH_MODELS and lang == "en" and size in ("tiny", "base", "small", "medium"):
+        return size + ".en"
+    return size
+
+
+# ---------- audio + VAD ----------
+
+def load_audio(path: str) -> np.ndarray:
+    """Decode any media file to float32 mono 16 kHz (same as whisper.audio.load_audio)."""
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-threads", "0", "-i", str(path),
+           "-vn", "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+    p = subprocess.run(cmd, capture_output=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"ffmpeg decode failed: {p.stderr.decode(errors='ignore')[-300:]}")
+    return np.frombuffer(p.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def _frame_db(audio: np.ndarray) -> np.ndarray:
+    hop = int(SAMPLE_RATE * VAD_FRAME)
+    n = len(audio) // hop
+    if n == 0:
+        return np.zeros(0, np.float32)
+    frames = audio[:n * hop].reshape(n, hop)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-6))
+
+
+def split_points(audio: np.ndarray, chunk_secs: float = CHUNK_SECS) -> list:
+    """
+    Cut points (seconds) for audio longer than ~1.5 chunks: the middle of the silent run closest
+    to every chunk_secs mark, or the quietest frame around it when nobody pauses.
+    """
+    total = len(audio) / SAMPLE_RATE
+    if chunk_secs <= 0 or total <= chunk_secs * 1.5:
+        return []
+    db = _frame_db(audio)
+    quiet = db < VAD_DB
+    # silent runs as (start_frame, end_frame)
+    runs, i, n = [], 0, len(quiet)
+    min_frames = max(1, int(VAD_MIN_SILENCE / VAD_FRAME))
+    while i < n:
+        if quiet[i]:
+            j = i
+            while j < n and quiet[j]:
+                j += 1
+            if j - i >= min_frames:
+                runs.append(((i + j) / 2.0) * VAD_FRAME)
+            i = j
+        else:
+            i += 1
+    cuts, start = [], 0.0
+    while total - start > chunk_secs * 1.5:
+        target, lo, hi = start + chunk_secs, start + chunk_secs * 0.5, start + chunk_secs * 1.5
+        near = [t for t in runs if lo <= t <= hi]
+        if near:
+            cut = min(near, key=lambda t: abs(t - target))
+        else:
+            a, b = int(lo / VAD_FRAME), int(hi / VAD_FRAME)
+            cut = (a + int(np.argmin(db[a:b]))) * VAD_FRAME if b > a else target
+        cuts.append(round(cut, 3))
+        start = cut
+    return cuts
+
+
+# ---------- resident models ----------
+
+class _ModelSlot:
+    """One warm model copy + the thread that owns it."""
+
+    def __init__(self, name: str, replica: int = 0):
+        self.name = name
+        self.model = None
+        self.q = queue.Queue()
+        self.loaded_at = None
+        self.served = 0
+        self.audio_secs = 0.0
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"asr-{name}-{replica}")
+        self.thread.start()
+
+    def _load(self):
+        if self.model is None and BACKEND != "stub":
+            import whisper
+            print("Loading Whisper model:", self.name, "on", _device())
+            self.model = whisper.load_model(self.name, device=_device())
+        if self.loaded_at is None:
+            self.loaded_at = time.time()
+        return self.model
+
+    def _run(self):
+        while True:
+            job, fut = self.q.get()
+            if fut.set_running_or_notify_cancel():
+                try:
+                    fut.set_result(self._handle(job))
+                except Exception as e:
+                    fut.set_exception(e)
+
+    def _handle(self, job: dict):
+        model = self._load()
+        if job.get("warm_only"):
+            return None
+        audio = job["audio"]
+        if job.get("detect"):
+            return self._detect(model, audio)
+        self.audio_secs += len(audio) / SAMPLE_RATE
+        self.served += 1
+        if model is None:
+            return _stub_result(audio, job.get("language"))
+        opts = {"language": job.get("language"), "fp16": _device() == "cuda",
+                "word_timestamps": bool(job.get("word_timestamps"))}
+        res = model.transcribe(audio, **opts)
+        return {"text": res.get("text", ""), "language": res.get("language"),
+                "segments": [{"start": s["start"], "end": s["end"], "text": s["text"],
+                              **({"words": s["words"]} if "words" in s else {})}
+                             for s in res.get("segments", [])]}
+
+    def _detect(self, model, audio):
+        if model is None:
+            return "en"
+        import whisper
+        clip = whisper.pad_or_trim(audio)
+        mel = whisper.log_mel_spectrogram(clip, n_mels=model.dims.n_mels).to(model.device)
+        _, probs = model.detect_language(mel)
+        return max(probs, key=probs.get)
+
+    def submit(self, job: dict) -> Future:
+        fut = Future()
+        self.q.put((job, fut))
+        return fut
+
+
+def _stub_result(audio: np.ndarray, language):
+    """No model: one placeholder segment per voiced stretch, so chunking/merging can be exercised."""
+    db = _frame_db(audio)
+    segs, i, n = [], 0, len(db)
+    while i < n:
+        if db[i] >= VAD_DB:
+            j = i
+            while j < n and db[j] >= VAD_DB:
+                j += 1
+            segs.append({"start": round(i * VAD_FRAME, 3), "end": round(j * VAD_FRAME, 3),
+                         "text": f" [speech {(j - i) * VAD_FRAME:.1f}s]"})
+            i = j
+        else:
+            i += 1
+    return {"text": "".join(s["text"] for s in segs), "language": language or "en", "segments": segs}
+
+
+_slots = {}
+_slots_lock = threading.Lock()
+
+
+def get_slots(size: str | None = None, lang: str | None = None) -> list:
+    name = model_name(size, lang)
+    with _slots_lock:
+        slots = _slots.get(name)
+        if slots is None:
+            slots = _slots[name] = [_ModelSlot(name, r) for r in range(max(1, REPLICAS))]
+        return slots
+
+
+def _pick(slots: list) -> _ModelSlot:
+    return min(slots, key=lambda s: s.q.qsize())
+
+
+def warm(size: str | None = None, lang: str | None = None):
+    """Load a model ahead of the first request (worker startup)."""
+    for s in get_slots(size, lang):
+        s.submit({"warm_only": True}).result()
+
+
+def status():
+    return {name: [{"loaded": s.loaded_at is not None, "loaded_at": s.loaded_at, "served": s.served,
+                    "audio_secs": round(s.audio_secs, 1), "queued": s.q.qsize()} for s in slots]
+            for name, slots in _slots.items()}
+
+
+# ---------- public API ----------
+
+def transcribe(items: list, lang: str | None = None, model: str | None = None, word_timestamps: bool = False,
+               chunk_secs: float | None = None, timeout: float | None = 3600) -> list:
+    """
+    items: file paths, or {"path"} / {"audio": float32 16 kHz array, "offset"?} dicts (pre-cut chunks).
+    Returns one {"ok", "text", "segments", "lang", "chunks", "secs"} dict per item, in order.
+    """
+    t0 = time.time()
+    slots = get_slots(model, lang)
+    chunk_secs = CHUNK_SECS if chunk_secs is None else chunk_secs
+    plans = []
+    for it in items:
+        it = it if isinstance(it, dict) else {"path": it}
+        try:
+            audio = it["audio"] if it.get("audio") is not None else load_audio(it["path"])
+            cuts = split_points(audio, chunk_secs)
+            bounds = [0.0] + cuts + [len(audio) / SAMPLE_RATE]
+            chunks = [(a, audio[int(a * SAMPLE_RATE):int(b * SAMPLE_RATE)]) for a, b in zip(bounds, bounds[1:])]
+            language = lang
+            if language is None and len(chunks) > 1:
+                language = _pick(slots).submit({"detect": True, "audio": audio[:30 * SAMPLE_RATE]}).result(timeout)
+            futs = [(float(it.get("offset", 0.0)) + a, _pick(slots).submit(
+                {"audio": c, "language": language, "word_timestamps": word_timestamps})) for a, c in chunks]
+            plans.append({"futs": futs})
+        except Exception as e:
+            plans.append({"error": str(e)})
+    out = []
+    for plan in plans:
+        if "error" in plan:
+            out.append({"ok": False, "error": plan["error"]})
+            continue
+        try:
+            segments, texts, language = [], [], None
+            for offset, fut in plan["futs"]:
+                res = fut.result(timeout=timeout)
+                language = language or res.get("language")
+                texts.append(res["text"].strip())
+                for s in res["segments"]:
+                    seg = dict(s, start=round(s["start"] + offset, 3), end=round(s["end"] + offset, 3))
+                    if "words" in s:
+                        seg["words"] = [dict(w, start=w["start"] + offset, end=w["end"] + offset) for w in s["words"]]
+                    segments.append(seg)
+            out.append({"ok": True, "text": " ".join(t for t in texts if t), "segments": segments,
+                        "lang": language, "chunks": len(plan["futs"]), "secs": round(time.time() - t0, 3)})
+        except Exception as e:
+            out.append({"ok": False, "error": str(e)})
+    return out
+
+
+def transcribe_one(path: str, lang: str | None = None, model: str | None = None, **kw) -> dict:
+    return transcribe([path], lang=lang, model=model, **kw)[0]
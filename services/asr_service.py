@@ -1,6 +1,7 @@
 # services/asr_service.py
 """
-Simple ASR wrapper. Prefers OpenAI/whisper if available locally;
+Simple ASR wrapper. Prefers OpenAI/whisper if available locally (resident models from
+services/asr_resident, so the model is loaded once per process, not per file);
 falls back to Vosk offline model if installed.
 Produces: {"text": "...", "segments": [{"start":0.0,"end":1.2,"text":"..."}], "lang": "en"}
 """
@@ -8,16 +9,23 @@ import os, json, subprocess
 from pathlib import Path
 
 def transcribe_with_whisper(audio_path, lang=None, model="small"):
+    return transcribe_many_with_whisper([audio_path], lang=lang, model=model)[0]
+
+
+def transcribe_many_with_whisper(audio_paths, lang=None, model="small"):
+    """Several files in one call: all their chunks share the warm model queue. One result per file."""
     try:
-        import whisper
-        m = whisper.load_model(model)
-        res = m.transcribe(str(audio_path), language=lang, word_timestamps=True)
-        segments = []
-        for s in res.get("segments", []):
-            segments.append({"start": s["start"], "end": s["end"], "text": s["text"].strip()})
-        return {"ok": True, "text": res["text"].strip(), "segments": segments, "lang": res.get("language")}
+        from services.asr_resident import transcribe
+        out = []
+        for res in transcribe([str(p) for p in audio_paths], lang=lang, model=model, word_timestamps=True):
+            if not res.get("ok"):
+                out.append({"ok": False, "error": res.get("error")})
+                continue
+            segments = [{"start": s["start"], "end": s["end"], "text": s["text"].strip()} for s in res["segments"]]
+            out.append({"ok": True, "text": res["text"].strip(), "segments": segments, "lang": res.get("lang")})
+        return out
     except Exception as e:
-        return {"ok": False, "error": str(e)}
+        return [{"ok": False, "error": str(e)} for _ in audio_paths]
 
 def transcribe_with_vosk(audio_path, model_dir="models/vosk-model-small"):
     try:
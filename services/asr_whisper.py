@@ -1,7 +1,8 @@
 # services/asr_whisper.py
 """
 ASR wrapper: tries (in order)
-  1) openai-whisper (python package) if installed and model files available
+  1) openai-whisper (python package) if installed and model files available, through the
+     process-wide resident models in services/asr_resident (no reload per file)
   2) whisper.cpp CLI (if installed at WHISPER_CPP_BIN env)
   3) fallback: returns error
 
@@ -20,17 +21,18 @@ def _run(cmd, timeout=1800):
     return {"ok": p.returncode==0, "stdout": p.stdout, "stderr": p.stderr, "rc": p.returncode}
 
 def transcribe_file(filepath: str, lang: str | None = None, output_format: str = "srt", model: str | None = None):
-    # try python whisper (if installed)
+    # try python whisper (resident model, loaded once per process)
     try:
-        import whisper
-        m = model or "small"
-        w = whisper.load_model(m)
-        result = w.transcribe(filepath, language=lang) if lang else w.transcribe(filepath)
+        from services.asr_resident import transcribe_one
+        result = transcribe_one(filepath, lang=lang, model=model)
+        if not result.get("ok"):
+            raise RuntimeError(result.get("error"))
         text = result.get("text","")
         base = OUT / (Path(filepath).stem + "_whisper")
         base_txt = str(base) + ".txt"
         base_srt = str(base) + ".srt"
         open(base_txt, "w", encoding="utf-8").write(text)
+        raw = {"text": text, "segments": result["segments"], "language": result.get("lang")}
         # produce simple SRT using segments if requested
         if output_format == "srt":
             segs = result.get("segments", [])
@@ -41,8 +43,8 @@ def transcribe_file(filepath: str, lang: str | None = None, output_format: str =
                         h = int(t//3600); m = int((t%3600)//60); s2 = int(t%60); ms = int((t - int(t))*1000)
                         return f"{h:02d}:{m:02d}:{s2:02d},{ms:03d}"
                     fh.write(f"{i}\n{fmt(start)} --> {fmt(end)}\n{segtext}\n\n")
-            return {"ok": True, "text": base_txt, "srt": base_srt, "raw": result}
-        return {"ok": True, "text": base_txt, "raw": result}
+            return {"ok": True, "text": base_txt, "srt": base_srt, "raw": raw}
+        return {"ok": True, "text": base_txt, "raw": raw}
     except Exception as e:
         # try whisper.cpp CLI if set
         bin_path = os.getenv("WHISPER_CPP_BIN")
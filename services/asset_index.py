@@ -0,0 +1,246 @@
+# services/asset_index.py
+"""
+In-memory index of an asset directory (SFX, ambience, music, props), so lookups do no file I/O.
+- built once per directory and persisted to cache/assets/<dir-hash>.json; later processes reload it
+  and only re-read directories whose mtime changed (files added / removed / renamed)
+- refresh is throttled to one directory mtime sweep per ASSET_INDEX_TTL seconds; refresh(full=True)
+  also re-stats every file (catches files rewritten in place)
+- audio entries carry tags (filename + subfolder words), duration, sample rate and channels (header
+  probes); loudness (mean / peak dBFS, an ffmpeg volumedetect decode) is measured lazily by
+  loudness(name), outside the index lock, or up front by the CLI below, never on a plain lookup
+- best(patterns) answers "which file for cue X" from memory with the old glob scan's rule (first
+  top-level file whose name contains a pattern, else a random top-level file); subfolders are only
+  candidates with recursive=True; results are memoised per pattern set
+
+CLI (build / refresh the persisted index out of band, e.g. at deploy):
+  python -m services.asset_index build <dir> [--loudness]
+"""
+import os, re, json, time, random, hashlib, threading, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from services import media_probe
+
+INDEX_DIR = Path(os.getenv("ASSET_INDEX_DIR", "cache/assets"))
+TTL = float(os.getenv("ASSET_INDEX_TTL", "2"))
+WORKERS = int(os.getenv("ASSET_INDEX_WORKERS", "4"))
+AUDIO_EXTS = (".wav", ".mp3", ".ogg", ".flac", ".m4a", ".aac", ".aif", ".aiff", ".opus")
+
+
+def _tags(rel: Path) -> list:
+    words = re.split(r"[^a-z]+", " ".join(rel.with_suffix("").parts).lower())
+    return sorted({w for w in words if len(w) > 1})
+
+
+def _loudness(path: str) -> dict:
+    p = subprocess.run(["ffmpeg", "-nostdin", "-v", "info", "-i", str(path), "-vn", "-af", "volumedetect",
+                        "-f", "null", "-"], capture_output=True, text=True)
+    out = {}
+    for key, name in (("mean_volume", "loudness_db"), ("max_volume", "peak_db")):
+        m = re.search(key + r":\s*(-?[\d.]+|-inf) dB", p.stderr)
+        if m:
+            out[name] = float(m.group(1)) if m.group(1) != "-inf" else -120.0
+    return out
+
+
+class AssetIndex:
+    def __init__(self, root, exts=AUDIO_EXTS, audio: bool = True):
+        self.root = Path(root)
+        self.exts = tuple(e.lower() for e in exts)
+        self.audio = audio
+        self.lock = threading.RLock()
+        self.dirs = {}     # rel dir -> mtime_ns
+        self.files = {}    # rel path -> entry
+        self.generation = 0
+        self._best = {}
+        self._checked = 0.0
+        self._store = INDEX_DIR / (hashlib.sha1(str(self.root.resolve()).encode()).hexdigest()[:12] + ".json")
+        self._load()
+
+    # ---------- persistence ----------
+
+    def _load(self):
+        try:
+            data = json.loads(self._store.read_text())
+            if data.get("root") == str(self.root.resolve()) and data.get("exts") == list(self.exts):
+                self.dirs, self.files = data["dirs"], data["files"]
+        except Exception:
+            pass
+
+    def _save(self):
+        try:
+            INDEX_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = self._store.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"root": str(self.root.resolve()), "exts": list(self.exts),
+                                       "dirs": self.dirs, "files": self.files}))
+            tmp.replace(self._store)
+        except OSError as e:
+            print("asset index not saved:", e)
+
+    # ---------- refresh ----------
+
+    def _describe(self, rel: str, st) -> dict:
+        path = self.root / rel
+        entry = {"path": str(path), "name": path.name, "tags": _tags(Path(rel)),
+                 "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        if self.audio:
+            try:
+                info = media_probe.probe(path)
+                entry.update(duration=round(info.get("duration") or 0.0, 3),
+                             sample_rate=info.get("sample_rate"), channels=info.get("channels"))
+            except Exception:
+                pass
+        return entry
+
+    def refresh(self, full: bool = False, force: bool = False):
+        """Re-list directories whose mtime changed (every file's stat too when full)."""
+        with self.lock:
+            now = time.time()
+            if not (full or force) and now - self._checked < TTL:
+                return self
+            self._checked = now
+            if not self.root.exists():
+                changed = bool(self.files)
+                self.dirs, self.files = {}, {}
+                if changed:
+                    self._bump()
+                return self
+            seen_dirs, todo, changed = {}, [], False
+            stack = [self.root]
+            while stack:
+                d = stack.pop()
+                rel_d = str(d.relative_to(self.root))
+                try:
+                    mt = d.stat().st_mtime_ns
+                except OSError:
+                    continue
+                seen_dirs[rel_d] = mt
+                relist = full or self.dirs.get(rel_d) != mt
+                present = set()
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.is_dir(follow_symlinks=False):
+                            stack.append(Path(e.path))
+                        elif relist and e.is_file() and e.name.lower().endswith(self.exts):
+                            rel = str(Path(e.path).relative_to(self.root))
+                            present.add(rel)
+                            st = e.stat()
+                            old = self.files.get(rel)
+                            if not old or old["size"] != st.st_size or old["mtime_ns"] != st.st_mtime_ns:
+                                todo.append((rel, st))
+                if relist:
+                    # drop files that disappeared from this directory
+                    for r in [r for r in self.files if str(Path(r).parent) == rel_d and r not in present]:
+                        self.files.pop(r, None)
+                        changed = True
+            # and everything under directories that are gone
+            for r in [r for r in self.files if str(Path(r).parent) not in seen_dirs]:
+                self.files.pop(r, None)
+                changed = True
+            if todo:
+                with ThreadPoolExecutor(max_workers=max(1, WORKERS)) as pool:
+                    for (rel, _), entry in zip(todo, pool.map(lambda t: self._describe(*t), todo)):
+                        self.files[rel] = entry
+                changed = True
+            if changed or seen_dirs != self.dirs:
+                self.dirs = seen_dirs
+                self._bump()
+                self._save()
+            return self
+
+    def _bump(self):
+        self.generation += 1
+        self._best.clear()
+
+    # ---------- queries ----------
+
+    def entries(self) -> list:
+        self.refresh()
+        with self.lock:
+            return [self.files[k] for k in sorted(self.files)]
+
+    def get(self, name_or_rel: str):
+        self.refresh()
+        with self.lock:
+            e = self.files.get(name_or_rel)
+            if e is None:
+                e = next((v for v in self.files.values() if v["name"] == name_or_rel), None)
+            return e
+
+    def exists(self, rel: str) -> bool:
+        self.refresh()
+        with self.lock:
+            return str(Path(rel)) in self.files
+
+    def find(self, tags=(), min_secs: float = 0.0, max_secs: float | None = None) -> list:
+        """Entries carrying every tag (and within the duration bounds), in name order."""
+        want = set(t.lower() for t in tags)
+        return [e for e in self.entries() if want <= set(e["tags"])
+                and (e.get("duration") or 0) >= min_secs and (max_secs is None or (e.get("duration") or 0) <= max_secs)]
+
+    def best(self, patterns, rng=random, recursive: bool = False) -> str | None:
+        """
+        First file (name order) whose name contains any pattern; if none, a random file.
+        Like SoundFXEngine's old dirpath.glob("*") scan, only files directly in the root are
+        candidates (recursive=True also considers subfolders). Differences from that scan:
+        candidates are limited to this index's extensions (the glob also returned subdirectories
+        and non-audio files, which the mixer cannot load), and ties go to name order rather than
+        directory-listing order.
+        """
+        self.refresh()
+        key = (tuple(p.lower() for p in patterns), recursive)
+        with self.lock:
+            if key not in self._best:
+                names = sorted(r for r in self.files if recursive or len(Path(r).parts) == 1)
+                self._best[key] = next((r for r in names if any(p in self.files[r]["name"].lower() for p in key[0])), None), names
+            hit, names = self._best[key]
+            rel = hit or (rng.choice(names) if names else None)
+            return self.files[rel]["path"] if rel else None
+
+    def loudness(self, name_or_rel: str) -> dict:
+        """{"loudness_db", "peak_db"} for one file; measured on first request (lock not held), then kept."""
+        e = self.get(name_or_rel)
+        if e is None:
+            return {}
+        if "loudness_db" not in e:
+            measured = _loudness(e["path"])
+            with self.lock:
+                e.update(measured)
+                self._save()
+        return {k: e[k] for k in ("loudness_db", "peak_db") if k in e}
+
+    def measure_loudness(self) -> int:
+        """Fill in loudness for every entry still missing it (WORKERS in parallel); returns how many."""
+        self.refresh()
+        with self.lock:
+            todo = [e for e in self.files.values() if "loudness_db" not in e]
+        if todo:
+            with ThreadPoolExecutor(max_workers=max(1, WORKERS)) as pool:
+                measured = list(pool.map(lambda e: _loudness(e["path"]), todo))
+            with self.lock:
+                for e, m in zip(todo, measured):
+                    e.update(m)
+                self._save()
+        return len(todo)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root, exts=AUDIO_EXTS, audio: bool = True) -> AssetIndex:
+    key = (str(Path(root).resolve()), tuple(exts), audio)
+    with _indexes_lock:
+        idx = _indexes.get(key)
+        if idx is None:
+            idx = _indexes[key] = AssetIndex(root, exts, audio)
+        return idx
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 3 and sys.argv[1] == "build":
+        idx = get_index(sys.argv[2]).refresh(full=True)
+        measured = idx.measure_loudness() if "--loudness" in sys.argv[3:] else 0
+        print(json.dumps({"root": str(idx.root), "files": len(idx.files), "loudness_measured": measured}))
+    else:
+        print("usage: python -m services.asset_index build <dir> [--loudness]")
@@ -0,0 +1,231 @@
+# services/audio_mix.py
+"""
+Numpy mixing core for timeline audio (SoundFX mixes, dialogue beds).
+- Mix(duration, rate, channels) preallocates one float32 buffer; add() sums a clip in place at its
+  offset (with an optional per-sample gain vector), so each event costs O(clip) not O(timeline)
+- gain / ducking envelopes are plain vectors: duck_envelope(windows, db) builds one in a single pass
+- Assets decodes each file once per mix (ffmpeg -> float32 at the mix rate/channels, 16-bit WAVs
+  at the mix rate read directly), in parallel via preload(), and hands the same array to every
+  event that uses it
+- warm(paths) keeps decoded library assets (SFX, beds, music) in a process-wide LRU of
+  AUDIO_WARM_MB, so the next mix that uses them skips decoding entirely
+- nothing is encoded until export(), which pipes 16-bit PCM to ffmpeg once
+Levels follow pydub (dB gains, normalize to -0.1 dBFS peak, int16 full scale = 1.0), so the pydub
+code paths stay usable as the reference output.
+"""
+import os, wave, threading, subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from services import media_probe
+
+WARM_BYTES = int(float(os.getenv("AUDIO_WARM_MB", "256")) * 1024 * 1024)
+_hot = OrderedDict()  # (path, mtime_ns, rate, channels) -> samples
+_hot_bytes = 0
+_hot_lock = threading.Lock()
+
+
+def db_to_gain(db: float) -> float:
+    return float(10.0 ** (db / 20.0))
+
+
+def to_pcm16(samples: np.ndarray) -> bytes:
+    """float32 (frames, channels) -> interleaved little-endian int16 (clipped, pydub full scale)."""
+    return (np.clip(samples, -1.0, 32767 / 32768.0) * 32768.0).round().astype("<i2").tobytes()
+
+
+def from_pcm16(data: bytes, channels: int) -> np.ndarray:
+    return np.frombuffer(data, "<i2").reshape(-1, channels).astype(np.float32) / 32768.0
+
+
+def _read_wav16(path: str, rate: int):
+    """16-bit PCM WAV already at the mix rate: read directly, no ffmpeg process."""
+    try:
+        with wave.open(str(path), "rb") as w:
+            if w.getsampwidth() != 2 or w.getframerate() != rate or w.getcomptype() != "NONE":
+                return None
+            ch = w.getnchannels()
+            data = w.readframes(w.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    return from_pcm16(data, ch)
+
+
+def decode(path: str, rate: int, channels: int) -> np.ndarray:
+    """Any audio file -> float32 array (frames, channels) at rate."""
+    out = _read_wav16(path, rate) if str(path).lower().endswith(".wav") else None
+    if out is not None and out.shape[1] in (1, channels):
+        return np.repeat(out, channels, axis=1) if out.shape[1] != channels else out
+    try:
+        src_ch = int(media_probe.probe(path).get("channels") or 0)
+    except Exception:
+        src_ch = 0
+    # mono is duplicated here, not by ffmpeg (its upmix puts the centre 3 dB down on each side)
+    ch = 1 if src_ch == 1 else channels
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", str(path), "-vn", "-f", "f32le",
+           "-ac", str(ch), "-ar", str(rate), "-"]
+    p = subprocess.run(cmd, capture_output=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"decode failed for {path}: {p.stderr.decode(errors='ignore')[-300:]}")
+    out = np.frombuffer(p.stdout, np.float32).reshape(-1, ch)
+    return np.repeat(out, channels, axis=1) if ch != channels else out
+
+
+def _hot_key(path, rate, channels):
+    try:
+        return (str(Path(path).resolve()), Path(path).stat().st_mtime_ns, rate, channels)
+    except OSError:
+        return None
+
+
+def hot_get(path, rate: int, channels: int):
+    key = _hot_key(path, rate, channels)
+    with _hot_lock:
+        arr = _hot.get(key)
+        if arr is not None:
+            _hot.move_to_end(key)
+        return arr
+
+
+def warm(paths, rate: int, channels: int, workers: int = 4):
+    """Decode paths into the process-wide hot cache (least recently used dropped past AUDIO_WARM_MB)."""
+    global _hot_bytes
+    todo = [p for p in dict.fromkeys(p for p in paths if p and Path(p).exists()) if hot_get(p, rate, channels) is None]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        decoded = list(pool.map(lambda x: decode(x, rate, channels), todo))
+    with _hot_lock:
+        for p, arr in zip(todo, decoded):
+            key = _hot_key(p, rate, channels)
+            if key is None or arr.nbytes > WARM_BYTES:
+                continue
+            _hot[key] = arr
+            _hot_bytes += arr.nbytes
+        while _hot_bytes > WARM_BYTES and _hot:
+            _, old = _hot.popitem(last=False)
+            _hot_bytes -= old.nbytes
+
+
+class Assets:
+    """Per-mix decode cache: path -> samples at the mix format."""
+
+    def __init__(self, rate: int, channels: int):
+        self.rate = rate
+        self.channels = channels
+        self._cache = {}
+
+    def get(self, path: str) -> np.ndarray | None:
+        if not path or not Path(path).exists():
+            return None
+        key = str(Path(path).resolve())
+        if key not in self._cache:
+            arr = hot_get(path, self.rate, self.channels)
+            self._cache[key] = arr if arr is not None else decode(path, self.rate, self.channels)
+        return self._cache[key]
+
+    def preload(self, paths, workers: int = 4):
+        """Decode distinct files in parallel (each decode is its own ffmpeg process)."""
+        todo = {str(Path(p).resolve()): p for p in paths if p and Path(p).exists()}
+        for k, p in list(todo.items()):
+            arr = hot_get(p, self.rate, self.channels)
+            if arr is not None:
+                self._cache[k] = arr
+        todo = [p for k, p in todo.items() if k not in self._cache]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for p, arr in zip(todo, pool.map(lambda x: decode(x, self.rate, self.channels), todo)):
+                self._cache[str(Path(p).resolve())] = arr
+        return self
+
+    def secs(self, path: str) -> float:
+        a = self.get(path)
+        return 0.0 if a is None else len(a) / float(self.rate)
+
+
+def mix_format(paths, default_rate: int = 44100, default_channels: int = 2):
+    """Highest sample rate / channel count among the inputs (what pydub's overlay ends up with)."""
+    rate, ch = 0, 0
+    for p in paths:
+        if not p or not Path(p).exists():
+            continue
+        try:
+            info = media_probe.probe(p)
+        except Exception:
+            continue
+        rate = max(rate, int(info.get("sample_rate") or 0))
+        ch = max(ch, int(info.get("channels") or 0))
+    return rate or default_rate, min(ch, 2) or default_channels
+
+
+def loop_to(samples: np.ndarray, frames: int) -> np.ndarray:
+    if len(samples) == 0:
+        return np.zeros((frames, samples.shape[1]), np.float32)
+    reps = -(-frames // len(samples))
+    return np.tile(samples, (reps, 1))[:frames]
+
+
+def peak_normalize_gain(samples: np.ndarray, headroom_db: float = 0.1) -> float:
+    """Gain that brings the peak to -headroom dBFS (pydub effects.normalize)."""
+    peak = float(np.max(np.abs(samples))) if samples.size else 0.0
+    return db_to_gain(-headroom_db) / peak if peak > 0 else 1.0
+
+
+def duck_envelope(frames: int, rate: int, windows, duck_db: float, ramp_ms: float = 0.0) -> np.ndarray:
+    """
+    Gain vector: 1.0 outside windows, db_to_gain(-|duck_db|) inside [start, end) seconds.
+    ramp_ms > 0 smooths the edges (linear in gain) instead of hard steps.
+    """
+    low = db_to_gain(-abs(duck_db))
+    inside = np.zeros(frames + 1, np.float32)
+    for start, end in windows:
+        a, b = max(0, int(round(start * rate))), min(frames, int(round(end * rate)))
+        if b > a:
+            inside[a] += 1
+            inside[b] -= 1
+    mask = np.cumsum(inside[:frames]) > 0
+    env = np.where(mask, low, 1.0).astype(np.float32)
+    ramp = int(rate * ramp_ms / 1000.0)
+    if ramp > 1:
+        kernel = np.ones(ramp, np.float32) / ramp
+        env = np.convolve(np.pad(env, (ramp // 2, ramp - 1 - ramp // 2), mode="edge"), kernel, mode="valid")
+    return env
+
+
+class Mix:
+    def __init__(self, duration: float, rate: int = 44100, channels: int = 2):
+        self.rate = rate
+        self.channels = channels
+        self.frames = int(round(duration * rate))
+        self.buf = np.zeros((self.frames, channels), np.float32)
+
+    def add(self, samples: np.ndarray | None, at: float = 0.0, gain_db: float = 0.0, envelope: np.ndarray | None = None):
+        """Sum samples into the buffer from `at` seconds (truncated at the end), in place."""
+        if samples is None or len(samples) == 0:
+            return
+        start = max(0, int(round(at * self.rate)))
+        n = min(len(samples), self.frames - start)
+        if n <= 0:
+            return
+        src = samples[:n]
+        if envelope is not None:
+            src = src * envelope[:n, None]
+        if gain_db:
+            src = src * db_to_gain(gain_db)
+        self.buf[start:start + n] += src
+
+    def normalize(self, headroom_db: float = 0.1):
+        self.buf *= peak_normalize_gain(self.buf, headroom_db)
+        return self
+
+    def pcm16(self) -> bytes:
+        return to_pcm16(self.buf)
+
+    def export(self, out_path: str, fmt: str = "mp3", bitrate: str = "192k") -> str:
+        """Encode once: 16-bit PCM piped to ffmpeg."""
+        cmd = ["ffmpeg", "-y", "-v", "error", "-f", "s16le", "-ar", str(self.rate), "-ac", str(self.channels),
+               "-i", "-", "-f", fmt]
+        if bitrate:
+            cmd += ["-b:a", bitrate]
+        p = subprocess.run(cmd + [str(out_path)], input=self.pcm16(), capture_output=True)
+        if p.returncode != 0:
+            raise RuntimeError(f"encode failed: {p.stderr.decode(errors='ignore')[-300:]}")
+        return str(out_path)
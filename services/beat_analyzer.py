@@ -1,28 +1,143 @@
 # services/beat_analyzer.py
 # Simple beat analyzer: prefers librosa if installed, else falls back to naive onset detection.
-import os, json
+"""
+- results (tempo, beats, downbeats, onsets, onset envelope) are stored under cache/beats/ keyed by the
+  sha256 of the audio bytes + the analysis parameters, so every consumer (beat UI, music pipeline,
+  choreography variants) reuses one analysis per track; renamed / re-uploaded copies hit too
+- tracks longer than BEAT_WINDOW_SECS get their onset envelope (the expensive STFT + mel part) computed
+  in overlapping windows on BEAT_WORKERS threads; each window keeps only its core frames, and beat
+  tracking then runs once over the stitched envelope, so beats never break at window boundaries
+- the log-mel spectrogram is built here against a fixed ref (1.0) with no top_db floor (onset_strength's
+  own power_to_db floors at 80 dB under the input's peak, which differs per window), so the windowed
+  envelope matches a single pass up to float rounding; short tracks use the same path
+- downbeats: the beats_per_bar phase whose beats carry the most onset energy
+"""
+import os, json, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def analyze_beats(audio_path, use_librosa=True, sr=22050):
+CACHE_DIR = Path(os.getenv("BEAT_CACHE_DIR", "cache/beats"))
+WINDOW_SECS = float(os.getenv("BEAT_WINDOW_SECS", "120"))
+OVERLAP_SECS = float(os.getenv("BEAT_WINDOW_OVERLAP", "6"))
+WORKERS = int(os.getenv("BEAT_WORKERS", "4"))
+VERSION = 2  # bump when the analysis itself changes
+
+_digests = {}  # (path, size, mtime_ns) -> sha256
+_digests_lock = threading.Lock()
+
+
+def content_digest(path) -> str:
+    """sha256 of the file bytes (memoised per path/size/mtime for this process)."""
+    st = os.stat(path)
+    memo = (str(Path(path).resolve()), st.st_size, st.st_mtime_ns)
+    with _digests_lock:
+        if memo in _digests:
+            return _digests[memo]
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    with _digests_lock:
+        _digests[memo] = h.hexdigest()
+    return _digests[memo]
+
+
+def _sidecar(digest: str, params: dict) -> Path:
+    pkey = hashlib.sha256(json.dumps({**params, "v": VERSION}, sort_keys=True).encode()).hexdigest()[:10]
+    return CACHE_DIR / f"{digest[:32]}_{pkey}.json"
+
+
+def _onset_strength(y, sr, hop_length):
+    """onset_strength on a log-mel with a fixed dB reference, so every frame depends only on nearby samples."""
+    import librosa
+    S = librosa.power_to_db(librosa.feature.melspectrogram(y=y, sr=sr, hop_length=hop_length), ref=1.0, top_db=None)
+    return librosa.onset.onset_strength(S=S, sr=sr, hop_length=hop_length)
+
+
+def _onset_envelope(y, sr, hop_length, workers=WORKERS):
+    """librosa onset strength, in parallel overlapping windows for long signals."""
+    import numpy as np
+    core = int(WINDOW_SECS * sr) // hop_length * hop_length
+    pad = int(OVERLAP_SECS * sr) // hop_length * hop_length
+    if core <= 0 or len(y) <= core + pad:
+        return _onset_strength(y, sr, hop_length)
+    n_frames = 1 + len(y) // hop_length
+    starts = list(range(0, len(y), core))
+
+    def window(s):
+        a, b = max(0, s - pad), min(len(y), s + core + pad)
+        env = _onset_strength(y[a:b], sr, hop_length)
+        # keep frames [s, s + core) of this window (global frame = a / hop + local frame)
+        lo = (s - a) // hop_length
+        return env[lo:lo + core // hop_length]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        parts = list(pool.map(window, starts))
+    return np.concatenate(parts)[:n_frames]
+
+
+def _downbeat_phase(beat_frames, env, beats_per_bar: int) -> int:
+    if beats_per_bar <= 1 or len(beat_frames) < beats_per_bar:
+        return 0
+    strength = [float(env[beat_frames[p::beats_per_bar]].sum()) for p in range(beats_per_bar)]
+    return max(range(beats_per_bar), key=strength.__getitem__)
+
+
+def _analyze(audio_path, sr, hop_length, beats_per_bar):
+    import numpy as np
+    import librosa
+    y, _ = librosa.load(audio_path, sr=sr, mono=True)
+    env = _onset_envelope(y, sr, hop_length)
+    # tempo and beat frames, over the whole envelope
+    tempo, beat_frames = librosa.beat.beat_track(onset_envelope=env, sr=sr, hop_length=hop_length)
+    beat_frames = np.asarray(beat_frames, int)
+    onset_frames = librosa.onset.onset_detect(onset_envelope=env, sr=sr, hop_length=hop_length)
+    phase = _downbeat_phase(beat_frames, env, beats_per_bar)
+    to_time = lambda f: [round(float(t), 4) for t in librosa.frames_to_time(f, sr=sr, hop_length=hop_length)]
+    result = {"ok": True, "bpm": float(round(float(np.atleast_1d(tempo)[0]), 2)), "beats": to_time(beat_frames),
+              "downbeats": to_time(beat_frames[phase::max(1, beats_per_bar)]), "onsets": to_time(onset_frames),
+              "duration": round(len(y) / float(sr), 3), "sr": sr, "hop_length": hop_length}
+    return result, env.astype(np.float32)
+
+
+def analyze_beats(audio_path, use_librosa=True, sr=22050, hop_length=512, beats_per_bar=4,
+                  with_envelope=False, refresh=False):
     """
-    Returns: {"bpm": float, "beats": [seconds,...], "onsets_frames": [int,...]}
+    Returns: {"bpm": float, "beats": [seconds,...], "downbeats": [seconds,...], "onsets": [seconds,...],
+              "duration", "cached": bool, "onset_env": [...] (with_envelope, one value per hop_length)}
     Requires librosa for best results. If librosa not available, asks for manual bpm param fallback.
     """
     try:
         if use_librosa:
-            import librosa
-            y, _ = librosa.load(audio_path, sr=sr, mono=True)
-            # tempo and beat frames
-            tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
-            beat_times = librosa.frames_to_time(beat_frames, sr=sr).tolist()
-            return {"ok": True, "bpm": float(round(tempo,2)), "beats": beat_times}
+            import numpy as np
+            params = {"sr": sr, "hop_length": hop_length, "beats_per_bar": beats_per_bar,
+                      "window": WINDOW_SECS, "overlap": OVERLAP_SECS}
+            side = _sidecar(content_digest(audio_path), params)
+            env_path = side.with_suffix(".onset.npy")
+            if not refresh and side.exists() and env_path.exists():
+                result = {**json.loads(side.read_text()), "cached": True}
+                env = np.load(env_path) if with_envelope else None
+            else:
+                result, env = _analyze(audio_path, sr, hop_length, beats_per_bar)
+                CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                tmp = env_path.with_name(env_path.name + ".tmp")
+                with open(tmp, "wb") as fh:
+                    np.save(fh, env)
+                tmp.replace(env_path)
+                tmp = side.with_suffix(".tmp")
+                tmp.write_text(json.dumps(result))
+                tmp.replace(side)
+                result = {**result, "cached": False}
+            if with_envelope:
+                result["onset_env"] = [round(float(v), 4) for v in env]
+            return result
     except Exception as e:
-        # fallback naive detection (very rough)
-        from pydub import AudioSegment
-        try:
-            seg = AudioSegment.from_file(audio_path)
-            dur_s = seg.duration_seconds
-            # fallback: ask caller for bpm or assume 120
-            return {"ok": False, "error": "librosa_missing_or_fail", "suggested_bpm": 120, "duration": dur_s}
-        except Exception as e2:
-            return {"ok": False, "error": str(e2)}
+        pass
+    # fallback naive detection (very rough)
+    from services import media_probe
+    try:
+        dur_s = media_probe.probe(audio_path)["duration"]
+        # fallback: ask caller for bpm or assume 120
+        return {"ok": False, "error": "librosa_missing_or_fail", "suggested_bpm": 120, "duration": dur_s}
+    except Exception as e2:
+        return {"ok": False, "error": str(e2)}
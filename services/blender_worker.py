@@ -0,0 +1,146 @@
+# services/blender_worker.py
+"""
+Long-lived headless Blender for farm renders.
+- BlenderWorker starts `blender --background --python <script> -- job.json outdir --serve <sock>`
+  once, then streams frame chunks over the unix socket; scene load, BVH build and shader
+  compile are paid once per worker instead of once per frame
+- get_worker(jobfile, outdir) keeps one warm worker per (script, jobfile, outdir) inside the
+  calling process (a Celery worker), replacing it when it dies; idle ones are closed after
+  BLENDER_WORKER_IDLE secs
+"""
+import os, json, time, socket, subprocess, threading, tempfile, uuid, atexit
+from pathlib import Path
+
+ROOT = Path(".").resolve()
+BLENDER_BIN = os.getenv("BLENDER_BIN", "blender")
+DEFAULT_SCRIPT = str(ROOT / "blender_scripts" / "composite_passes_oidn.py")
+START_TIMEOUT = float(os.getenv("BLENDER_WORKER_START_SECS", "120"))
+IDLE_SECS = float(os.getenv("BLENDER_WORKER_IDLE", "600"))
+FRAME_TIMEOUT = float(os.getenv("BLENDER_WORKER_FRAME_SECS", "1800"))
+
+
+class BlenderWorker:
+    def __init__(self, jobfile: str, outdir: str, script: str = DEFAULT_SCRIPT):
+        self.jobfile, self.outdir, self.script = str(jobfile), str(outdir), str(script)
+        self.sock_path = str(Path(tempfile.gettempdir()) / f"blender_{uuid.uuid4().hex[:8]}.sock")
+        self.log_path = self.sock_path[:-5] + ".log"
+        self.proc = None
+        self.conn = None
+        self.rfile = None
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+
+    def start(self):
+        cmd = [BLENDER_BIN, "--background", "--python", self.script, "--",
+               self.jobfile, self.outdir, "--serve", self.sock_path]
+        with open(self.log_path, "ab") as log:
+            self.proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.time() + START_TIMEOUT
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                err = Path(self.log_path).read_text(errors="ignore")[-2000:]
+                self.proc = None
+                raise RuntimeError(f"blender exited during startup: {err}")
+            if os.path.exists(self.sock_path):
+                try:
+                    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    s.connect(self.sock_path)
+                    s.settimeout(FRAME_TIMEOUT)
+                    self.conn, self.rfile = s, s.makefile("rb")
+                    return self
+                except OSError:
+                    s.close()
+            time.sleep(0.2)
+        self.close()
+        raise TimeoutError("blender worker did not open its socket in time")
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None and self.conn is not None
+
+    def render(self, frames, on_frame=None):
+        """
+        Render a chunk of frames in the resident scene.
+        on_frame(result_dict) is called as each frame completes. Returns all per-frame results.
+        """
+        frames = [int(f) for f in frames]
+        results = []
+        with self.lock:
+            if not self.alive():
+                self.start()
+            try:
+                self.conn.sendall((json.dumps({"frames": frames}) + "\n").encode())
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        raise RuntimeError("blender worker closed the connection")
+                    msg = json.loads(line.decode())
+                    if msg.get("done"):
+                        break
+                    results.append(msg)
+                    if on_frame:
+                        on_frame(msg)
+            except BaseException:
+                # timeout / bad line / callback error: unread replies may still be queued on the
+                # socket, so drop this worker; the next chunk starts a fresh one
+                self.close()
+                raise
+            self.last_used = time.time()
+        return results
+
+    def close(self):
+        try:
+            if self.conn is not None:
+                self.conn.sendall(b'{"cmd": "quit"}\n')
+        except OSError:
+            pass
+        for h in (self.rfile, self.conn):
+            try:
+                if h is not None: h.close()
+            except OSError:
+                pass
+        self.conn = self.rfile = None
+        if self.proc is not None and self.proc.poll() is None:
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_worker(jobfile: str, outdir: str, script: str = DEFAULT_SCRIPT) -> BlenderWorker:
+    key = (str(script), str(jobfile), str(outdir))
+    with _workers_lock:
+        reap_idle()
+        w = _workers.get(key)
+        if w is None or (w.proc is not None and not w.alive()):
+            if w is not None:
+                w.close()
+            w = _workers[key] = BlenderWorker(jobfile, outdir, script)
+        return w
+
+
+def reap_idle(idle_secs: float = IDLE_SECS):
+    now = time.time()
+    for key, w in list(_workers.items()):
+        if now - w.last_used > idle_secs and not w.lock.locked():
+            w.close()
+            _workers.pop(key, None)
+
+
+def shutdown_all():
+    with _workers_lock:
+        for w in _workers.values():
+            w.close()
+        _workers.clear()
+
+
+atexit.register(shutdown_all)
+
+
+def render_frames(jobfile: str, outdir: str, frames, on_frame=None, script: str = DEFAULT_SCRIPT):
+    """Convenience wrapper: render frames on the warm worker for this job."""
+    return get_worker(jobfile, outdir, script).render(frames, on_frame=on_frame)
@@ -19,19 +19,23 @@ MOVE_BANK = {
     "body_wave":{"frames":14,"clip":"body_wave"}
 }
 
-def build_choreography_from_beats(beats, bpm=None, length_sec=None, dancers=["DancerA","DancerB"], style="pop"):
+def build_choreography_from_beats(beats, bpm=None, length_sec=None, dancers=["DancerA","DancerB"], style="pop", downbeats=None):
     """
     beats: list of beat times (seconds) OR None (if fallback, use bpm)
+    downbeats: optional bar starts (from beat_analyzer); strong beats fall on them instead of every 4th beat
     returns job json with per-beat moves for dancers
     """
     job_id = f"music_{_tid()}"
     timeline = []
-    # simple patterns: alternate on even/odd beats, include occasional spin/jump on strong beats
+    bars = set(round(t, 3) for t in downbeats or [])
+    # simple patterns: alternate on even/odd beats, spin/jump on strong beats alternating per bar
+    bar = -1  # bars started so far (downbeats can be irregular, so count them rather than use i)
     for i, t in enumerate(beats or []):
-        strong = (i % 4 == 0)
+        strong = (round(t, 3) in bars) if bars else (i % 4 == 0)
         dancer = dancers[i % len(dancers)]
         if strong:
-            move = "spin" if (i % 8 == 0) else "jump"
+            bar += 1
+            move = "spin" if (bar % 2 == 0) else "jump"
         else:
             move = "step_left" if (i % 2==0) else "step_right"
         clip = MOVE_BANK.get(move, {}).get("clip", move)
@@ -48,3 +52,16 @@ def build_choreography_from_beats(beats, bpm=None, length_sec=None, dancers=["Da
     }
     Path(job['output_path']).write_text(json.dumps(job, indent=2))
     return job
+
+def build_choreography_for_track(audio_path, dancers=["DancerA","DancerB"], style="pop"):
+    """
+    Choreography straight from a music file. The beat analysis is cached per track content
+    (services/beat_analyzer), so every variant / dancer set for the same song reuses it.
+    """
+    from services.beat_analyzer import analyze_beats
+    ba = analyze_beats(audio_path, use_librosa=True)
+    if not ba.get("ok"):
+        return {"ok": False, "error": "beat_analysis_failed", "detail": ba}
+    job = build_choreography_from_beats(ba["beats"], ba["bpm"], length_sec=ba.get("duration"), dancers=dancers,
+                                        style=style, downbeats=ba.get("downbeats"))
+    return {"ok": True, "job": job, "analysis_cached": ba.get("cached", False)}
@@ -0,0 +1,168 @@
+# services/dub_bake.py
+"""
+Dub baking with one ffmpeg pass: the source video stream is copied untouched, only audio is built.
+- tracks: {lang: [{"start", "tts_path" (or "file")}, ...]}; each line is delayed to its start and
+  mixed (amix, no normalisation) into one track per language, padded/trimmed to the video length
+- duck=True keeps the original audio under the dub, compressed by a sidechain on the dub itself
+  (DUB_ORIGINAL_GAIN sets how loud it stays); original_gain=0 replaces the audio entirely
+- bake_dub writes every language as its own audio track in one file (language-tagged, first is
+  default); bake_dub_split writes one file per language, still from a single decode of the inputs
+- very long scripts are premixed per language in groups of DUB_MAX_INPUTS lines (audio only),
+  so the pass never opens more files than the process allows
+"""
+import os, time, uuid, shutil, tempfile, subprocess
+from pathlib import Path
+from services import media_probe
+
+AUDIO_RATE = 48000
+AUDIO_BITRATE = os.getenv("DUB_AUDIO_BITRATE", "160k")
+ORIGINAL_GAIN = float(os.getenv("DUB_ORIGINAL_GAIN", "0.35"))
+MAX_INPUTS = int(os.getenv("DUB_MAX_INPUTS", "256"))
+DUCK_FILTER = os.getenv("DUB_DUCK_FILTER", "sidechaincompress=threshold=0.02:ratio=10:attack=15:release=250")
+
+# ISO 639-2 tags for the audio track language metadata
+ISO3 = {"hi": "hin", "en": "eng", "bn": "ben", "ta": "tam", "te": "tel", "mr": "mar", "gu": "guj",
+        "pa": "pan", "kn": "kan", "ml": "mal", "or": "ori", "as": "asm", "sd": "snd", "sa": "san",
+        "bh": "bho", "mai": "mai", "raj": "raj", "es": "spa", "fr": "fra", "de": "deu", "ja": "jpn"}
+
+_FMT = f"aformat=sample_rates={AUDIO_RATE}:channel_layouts=stereo"
+
+
+def _lines(segments):
+    out = []
+    for s in segments or []:
+        path = s.get("tts_path") or s.get("file")
+        if path and Path(path).exists():
+            out.append((max(0.0, float(s.get("start") or 0.0)), str(path)))
+    return out
+
+
+def _mix_graph(lines, first_input: int, label: str):
+    """Filter chains delaying each line to its start and mixing them into [label]."""
+    parts, names = [], []
+    for j, (start, _) in enumerate(lines):
+        ms = int(round(start * 1000))
+        parts.append(f"[{first_input + j}:a]{_FMT},adelay=delays={ms}:all=1[{label}_{j}]")
+        names.append(f"[{label}_{j}]")
+    parts.append(f"{''.join(names)}amix=inputs={len(names)}:normalize=0:dropout_transition=0[{label}]")
+    return parts
+
+
+def _run(cmd):
+    p = subprocess.run(cmd, capture_output=True, text=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {p.stderr[-800:]}")
+
+
+def _premix(lines, tmpdir: Path, tag: str):
+    """Mix lines into WAVs of at most MAX_INPUTS inputs each; returns [(0.0, wav)] lines to mix instead."""
+    while len(lines) > MAX_INPUTS:
+        groups = [lines[i:i + MAX_INPUTS] for i in range(0, len(lines), MAX_INPUTS)]
+        lines = []
+        for g in groups:
+            out = tmpdir / f"{tag}_{uuid.uuid4().hex[:8]}.wav"
+            cmd = ["ffmpeg", "-y", "-v", "error"]
+            for _, path in g:
+                cmd += ["-i", path]
+            cmd += ["-filter_complex", ";".join(_mix_graph(g, 0, "m")), "-map", "[m]",
+                    "-c:a", "pcm_s16le", str(out)]
+            _run(cmd)
+            lines.append((0.0, str(out)))
+    return lines
+
+
+def _bake(video: str, tracks: dict, outputs: list, duck: bool = True, original_gain: float | None = None,
+          keep_original: bool = False, timeout: float | None = None) -> dict:
+    """outputs: [(out_path, [langs])]. One ffmpeg run; video is stream-copied into every output."""
+    t0 = time.time()
+    if not Path(video).exists():
+        return {"ok": False, "error": "video_missing"}
+    info = media_probe.probe(video)
+    dur = float(info.get("duration") or 0.0)
+    has_orig = bool(info.get("codec"))
+    gain = ORIGINAL_GAIN if original_gain is None else float(original_gain)
+    use_orig = has_orig and gain > 0
+    uses = {}
+    for _, langs in outputs:
+        for tl in langs:
+            uses[tl] = uses.get(tl, 0) + 1
+    tmpdir = Path(tempfile.mkdtemp(prefix="dub_"))
+    try:
+        per_lang = {}
+        for tl in uses:
+            lines = _lines(tracks.get(tl))
+            if not lines:
+                return {"ok": False, "error": f"no_tts_segments: {tl}"}
+            per_lang[tl] = _premix(lines, tmpdir, tl)
+        cmd = ["ffmpeg", "-y", "-v", "error", "-i", str(video)]
+        graph, nxt = [], 1
+        end = f"apad,atrim=0:{dur:.3f}" if dur > 0 else "anull"
+        for k, (tl, lines) in enumerate(per_lang.items()):
+            if use_orig:
+                # the original audio is opened once per language: an asplit of 0:a shared by several
+                # ducked mixes stalls ffmpeg's input scheduling (and decoding AAC twice is cheap)
+                cmd += ["-vn", "-i", str(video)]
+                graph.append(f"[{nxt}:a]{_FMT}[o{k}]")
+                nxt += 1
+            for _, path in lines:
+                cmd += ["-i", path]
+            graph += _mix_graph(lines, nxt, f"d{k}")
+            nxt += len(lines)
+            outs = "".join(f"[a{k}_{u}]" for u in range(uses[tl]))
+            if use_orig:
+                # dub feeds both the mix and the sidechain that pushes the original down
+                graph.append(f"[d{k}]asplit=2[dm{k}][ds{k}]")
+                src = f"[o{k}]"
+                if duck:
+                    graph.append(f"[o{k}][ds{k}]{DUCK_FILTER}[od{k}]")
+                    src = f"[od{k}]"
+                else:
+                    graph.append(f"[ds{k}]anullsink")
+                graph.append(f"{src}volume={gain}[ob{k}]")
+                graph.append(f"[ob{k}][dm{k}]amix=inputs=2:duration=longest:normalize=0,{end},"
+                             f"asplit={uses[tl]}{outs}")
+            else:
+                graph.append(f"[d{k}]{end},asplit={uses[tl]}{outs}")
+        cmd += ["-filter_complex", ";".join(graph)]
+        taken = {tl: 0 for tl in uses}
+        index = {tl: k for k, tl in enumerate(per_lang)}
+        for out_path, langs in outputs:
+            Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+            cmd += ["-map", "0:v?"]
+            for tl in langs:
+                cmd += ["-map", f"[a{index[tl]}_{taken[tl]}]"]
+                taken[tl] += 1
+            if keep_original and has_orig:
+                cmd += ["-map", "0:a:0"]
+            cmd += ["-c:v", "copy", "-c:a", "aac", "-b:a", AUDIO_BITRATE]
+            for i, tl in enumerate(langs):
+                cmd += [f"-metadata:s:a:{i}", f"language={ISO3.get(tl, tl)}",
+                        f"-disposition:a:{i}", "default" if i == 0 else "0"]
+            if keep_original and has_orig:
+                cmd += [f"-c:a:{len(langs)}", "copy", f"-metadata:s:a:{len(langs)}", "title=original",
+                        f"-disposition:a:{len(langs)}", "0"]
+            cmd += ["-movflags", "+faststart", str(out_path)]
+        p = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        if p.returncode != 0:
+            return {"ok": False, "error": "ffmpeg_failed", "detail": p.stderr[-1200:]}
+        return {"ok": True, "outputs": {str(o): list(l) for o, l in outputs}, "secs": round(time.time() - t0, 3)}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def bake_dub(video: str, tracks: dict, out_path: str, **kw) -> dict:
+    """All languages as separate audio tracks of one output file (first language is the default track)."""
+    res = _bake(video, tracks, [(str(out_path), list(tracks))], **kw)
+    if res.get("ok"):
+        res["out"] = str(out_path)
+    return res
+
+
+def bake_dub_split(video: str, tracks: dict, out_paths: dict, **kw) -> dict:
+    """out_paths: {lang: path}; one output per language, all written by the same ffmpeg run."""
+    res = _bake(video, tracks, [(str(p), [tl]) for tl, p in out_paths.items()], **kw)
+    if res.get("ok"):
+        res["results"] = {tl: str(p) for tl, p in out_paths.items()}
+    return res
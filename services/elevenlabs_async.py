@@ -0,0 +1,177 @@
+# services/elevenlabs_async.py
+"""
+Async ElevenLabs synthesis for many segments at once (dubbing, localization).
+- one httpx.AsyncClient per client (per batch): pooled keep-alive connections instead of a new TLS
+  handshake per line
+- ELEVEN_CONCURRENCY requests in flight at most, ELEVEN_RATE_PER_SEC request starts per second
+  (token bucket, 0 = unlimited) so a long script stays under the account's limits
+- 429 / 5xx / connection errors are retried with exponential backoff + jitter (Retry-After wins),
+  up to ELEVEN_MAX_RETRIES
+- responses are streamed to disk; results come back in input order whatever order they finish in
+- same services/tts_cache keys as elevenlabs_service.tts_generate, so both paths share hits;
+  repeated lines within one batch are requested once
+ELEVEN_API_URL points the client elsewhere (scripts/mock_eleven_server.py for offline tests).
+"""
+import os, time, random, asyncio
+from pathlib import Path
+from services import tts_cache
+
+API_URL = os.getenv("ELEVEN_API_URL", "https://api.elevenlabs.io")
+CONCURRENCY = int(os.getenv("ELEVEN_CONCURRENCY", "4"))
+RATE_PER_SEC = float(os.getenv("ELEVEN_RATE_PER_SEC", "0"))
+RATE_BURST = int(os.getenv("ELEVEN_RATE_BURST", "1"))
+MAX_RETRIES = int(os.getenv("ELEVEN_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.getenv("ELEVEN_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("ELEVEN_BACKOFF_MAX", "20"))
+TIMEOUT = float(os.getenv("ELEVEN_TIMEOUT", "60"))
+DEFAULT_VOICE = "alloy"
+DEFAULT_MODEL = "eleven_multilingual_v1"
+OUT = Path("assets/elevenlabs")
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def cache_key(text, voice_id=None, model=DEFAULT_MODEL, stability=None, similarity_boost=None):
+    return tts_cache.make_key("elevenlabs", text, model=model, voice=voice_id or DEFAULT_VOICE,
+                              stability=stability, similarity_boost=similarity_boost)
+
+
+class _RateLimiter:
+    """Token bucket: at most `rate` starts per second, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ElevenAsyncClient:
+    def __init__(self, api_key: str | None = None, base_url: str | None = None, concurrency: int | None = None,
+                 rate_per_sec: float | None = None, max_retries: int | None = None):
+        import httpx
+        self.api_key = api_key or os.getenv("ELEVENLABS_API_KEY")
+        self.concurrency = concurrency or CONCURRENCY
+        self.max_retries = MAX_RETRIES if max_retries is None else max_retries
+        self.http = httpx.AsyncClient(base_url=base_url or API_URL, timeout=TIMEOUT,
+                                      limits=httpx.Limits(max_connections=self.concurrency,
+                                                          max_keepalive_connections=self.concurrency))
+        self.sem = asyncio.Semaphore(self.concurrency)
+        self.limiter = _RateLimiter(RATE_PER_SEC if rate_per_sec is None else rate_per_sec, burst=RATE_BURST)
+        self._inflight = {}  # cache key -> task, so duplicate lines in one batch hit the API once
+        self.stats = {"requests": 0, "retries": 0, "cached": 0, "failed": 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    def _delay(self, attempt: int, retry_after: str | None) -> float:
+        if retry_after:
+            try:
+                return min(BACKOFF_MAX, float(retry_after))
+            except ValueError:
+                pass
+        return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    async def _post(self, voice_id, payload, outfile: Path):
+        import httpx
+        headers = {"xi-api-key": self.api_key or "", "Content-Type": "application/json", "Accept": "audio/mpeg"}
+        attempt = 0
+        while True:
+            await self.limiter.acquire()
+            self.stats["requests"] += 1
+            retry_after, err = None, None
+            try:
+                async with self.http.stream("POST", f"/v1/text-to-speech/{voice_id}", json=payload,
+                                            headers=headers) as r:
+                    if r.status_code == 200:
+                        tmp = outfile.with_suffix(outfile.suffix + ".part")
+                        with open(tmp, "wb") as fh:
+                            async for chunk in r.aiter_bytes(65536):
+                                fh.write(chunk)
+                        tmp.replace(outfile)
+                        return {"ok": True, "path": str(outfile)}
+                    body = (await r.aread()).decode(errors="ignore")[:300]
+                    err = f"{r.status_code} {body}"
+                    if r.status_code not in RETRY_STATUS:
+                        return {"ok": False, "error": err}
+                    retry_after = r.headers.get("retry-after")
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                err = f"{type(e).__name__}: {e}"
+            if attempt >= self.max_retries:
+                return {"ok": False, "error": err, "attempts": attempt + 1}
+            self.stats["retries"] += 1
+            await asyncio.sleep(self._delay(attempt, retry_after))
+            attempt += 1
+
+    async def synthesize(self, text, voice_id=None, model=DEFAULT_MODEL, output_name=None,
+                         stability=None, similarity_boost=None, out_dir=None) -> dict:
+        key = cache_key(text, voice_id, model, stability, similarity_boost)
+        out_dir = Path(out_dir or OUT)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        outfile = out_dir / (output_name or f"eleven_{key[:16]}.mp3")
+        hit = tts_cache.fetch(key, str(outfile))
+        if hit:
+            self.stats["cached"] += 1
+            return {"ok": True, "path": hit, "cached": True}
+        task = self._inflight.get(key)
+        if task is not None:
+            res = dict(await asyncio.shield(task))
+            if res.get("ok") and res["path"] != str(outfile):
+                outfile.write_bytes(Path(res["path"]).read_bytes())
+                res["path"] = str(outfile)
+            return res
+        payload = {"text": text, "model_id": model}
+        settings = {k: v for k, v in (("stability", stability), ("similarity_boost", similarity_boost)) if v is not None}
+        if settings:
+            payload["voice_settings"] = settings
+        task = self._inflight[key] = asyncio.ensure_future(self._request(voice_id or DEFAULT_VOICE, payload, outfile))
+        try:
+            res = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+        if res.get("ok"):
+            tts_cache.store(key, res["path"])
+        else:
+            self.stats["failed"] += 1
+        return res
+
+    async def _request(self, voice_id, payload, outfile):
+        async with self.sem:
+            return await self._post(voice_id, payload, outfile)
+
+    async def synthesize_many(self, items: list) -> list:
+        """items: [{"text", "voice_id"?, "model"?, ...synthesize kwargs}] -> results in the same order."""
+        async def one(it):
+            try:
+                return await self.synthesize(**it)
+            except Exception as e:
+                return {"ok": False, "error": str(e)}
+        return await asyncio.gather(*(one(it) for it in items))
+
+
+def synthesize_many(items: list, **client_kw) -> list:
+    """Blocking wrapper for sync callers (Celery tasks): one client and pool for the whole batch."""
+    async def run():
+        async with ElevenAsyncClient(**client_kw) as client:
+            return await client.synthesize_many(items)
+    return asyncio.run(run())
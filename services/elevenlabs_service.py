@@ -1,6 +1,7 @@
 # services/elevenlabs_service.py
 import os, uuid, time
 from pathlib import Path
+from services import tts_cache
 
 ELEVEN_KEY = os.getenv("ELEVENLABS_API_KEY", None)
 OUT = Path("assets/elevenlabs")
@@ -20,8 +21,20 @@ def tts_generate(text, voice_id=None, model="eleven_multilingual_v1", output_nam
     - voice_id: use an existing voice id (from your account) OR None to use default.
     - model: ElevenLabs model (default multilingual)
     Returns: {"ok":True,"path":...} or {"ok":False,"error":...}
+    Identical (text, voice, model, settings) requests are served from services/tts_cache.
     """
-    outfile = OUT / (output_name or f"eleven_{int(time.time())}_{uuid.uuid4().hex[:6]}.mp3")
+    key = tts_cache.make_key("elevenlabs", text, model=model, voice=voice_id or "alloy",
+                             stability=stability, similarity_boost=similarity_boost)
+    outfile = OUT / (output_name or f"eleven_{key[:16]}.mp3")
+    hit = tts_cache.fetch(key, str(outfile))
+    if hit:
+        return {"ok": True, "path": hit, "cached": True}
+    res = _tts_generate_uncached(text, voice_id, model, outfile, stability, similarity_boost)
+    if res.get("ok"):
+        tts_cache.store(key, res["path"])
+    return res
+
+def _tts_generate_uncached(text, voice_id, model, outfile, stability, similarity_boost):
     if _client_available():
         try:
             from elevenlabs import set_api_key, generate, save
@@ -54,3 +67,15 @@ def tts_generate(text, voice_id=None, model="eleven_multilingual_v1", output_nam
             return {"ok": True, "path": str(outfile)}
         except Exception as e:
             return {"ok": False, "error": str(e)}
+
+def eleven_tts(text, voice_id=None, model="eleven_multilingual_v1", **kw):
+    """Single line (routes, dub tasks); same cache and result shape as tts_generate."""
+    return tts_generate(text, voice_id=voice_id, model=model, **kw)
+
+def eleven_tts_many(items, **client_kw):
+    """
+    Many lines at once: items [{"text", "voice_id"?, "model"?, ...}] -> results in input order.
+    Runs on the pooled, rate-limited async client (services/elevenlabs_async).
+    """
+    from services.elevenlabs_async import synthesize_many
+    return synthesize_many([dict(it, out_dir=it.get("out_dir") or OUT) for it in items], **client_kw)
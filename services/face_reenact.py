@@ -4,7 +4,7 @@ Face Reenactment Engine wrapper
 - Supports multiple backends: Wav2Lip (audio->lip), SadTalker (audio->full-face), FirstOrder (video->motion)
 - Exposes functions:
     - save_target_file(file_bytes, filename) -> saved_path
-    - run_wav2lip(target_img_or_video, audio_path, out_path, options) -> runs Wav2Lip CLI/Python
+    - run_wav2lip(target_img_or_video, audio_path, out_path, options) -> runs on the resident lip-sync worker
     - run_sadtalker(target_img, audio_path, out_path, options) -> runs SadTalker script
     - run_firstorder(source_image, driving_video, out_path, options) -> runs First-Order Motion Model
 - The wrapper calls external repos via subprocess. Adjust paths via env vars.
@@ -15,6 +15,7 @@ import shutil
 import subprocess
 from pathlib import Path
 from typing import Dict, Optional
+from services import lipsync_worker
 
 ROOT = Path(".").resolve()
 UPLOADS = ROOT / "uploads" / "face"
@@ -47,8 +48,13 @@ def run_wav2lip(target, audio, out_name: Optional[str] = None, fps: int = 25, ex
     """
     out_name = out_name or f"wav2lip_{_task_id()}.mp4"
     out_path = OUTDIR / out_name
+    ckpt = os.getenv("WAV2LIP_CKPT", str(Path(WAV2LIP_PATH) / "checkpoints" / "wav2lip_gan.pth"))
+    if not extra_args:
+        # warm worker (model + detector resident); extra inference.py flags still need the CLI
+        res = lipsync_worker.lipsync(target, audio, str(out_path), fps=fps, repo=WAV2LIP_PATH, checkpoint=ckpt)
+        return {"ok": res.get("ok", False), "stdout": "", "stderr": res.get("error") or "",
+                "out": res.get("out"), "secs": res.get("secs"), "face_cached": res.get("face_cached")}
     try:
-        ckpt = os.getenv("WAV2LIP_CKPT", str(Path(WAV2LIP_PATH) / "checkpoints" / "wav2lip_gan.pth"))
         cmd = ["python", str(Path(WAV2LIP_PATH) / "inference.py"),
                "--checkpoint_path", ckpt,
                "--face", str(target),
@@ -1,12 +1,9 @@
 import os
 from pathlib import Path
+from services import tts_resident, tts_cache
 
-# Try to import Coqui TTS (TTS package). If not available, we'll fallback to gTTS.
-try:
-    from TTS.api import TTS  # coqui TTS
-    _HAS_COQUI = True
-except Exception:
-    _HAS_COQUI = False
+# Coqui itself lives in the host's resident TTS server (app_tts.py / services/tts_resident.py);
+# this class only talks to it, so importing routes/tts.py no longer loads a model.
 
 try:
     from gtts import gTTS
@@ -18,27 +15,12 @@ OUT_DIR = Path("static/outputs")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 class TTSService:
-    def __init__(self):
-        self.mode = None
-        self.coqui = None
-        if _HAS_COQUI:
-            try:
-                # NOTE: change model_name if you want a specific Falcon-like TTS model.
-                # This loads a default TTS model available in coqui. On first run it will download weights.
-                model_name = "tts_models/en/ljspeech/tacotron2-DDC"  # safe default
-                self.coqui = TTS(model_name)
-                self.mode = "coqui"
-            except Exception as e:
-                print("Coqui TTS import OK but model load failed:", e)
-                self.coqui = None
+    def __init__(self, model_name: str = "tts_models/en/ljspeech/tacotron2-DDC"):
+        # NOTE: change model_name if you want a specific Falcon-like TTS model.
+        self.mode = "coqui"
+        self.model_name = model_name
 
-        if self.mode is None and _HAS_GTTS:
-            self.mode = "gtts"
-
-        if self.mode is None:
-            print("No TTS backend available. Install 'TTS' or 'gTTS'.")
-
-    def synthesize(self, text: str, out_filename: str = None) -> str:
+    def synthesize(self, text: str, out_filename: str = None, speaker: str = None, model_name: str = None) -> str:
         """
         Synthesizes text and saves to a file in static/outputs.
         Returns the relative path to the file.
@@ -46,27 +28,28 @@ class TTSService:
         if not text:
             raise ValueError("Empty text")
 
-        out_filename = out_filename or f"tts_{abs(hash(text)) % (10**9)}.mp3"
+        # stable digest name (hash() is salted per process)
+        out_filename = out_filename or f"tts_{tts_resident.cache_key(text, model_name or self.model_name, speaker)[:16]}.mp3"
         out_path = OUT_DIR / out_filename
 
-        if self.mode == "coqui" and self.coqui is not None:
-            try:
-                # Coqui TTS's tts_to_file will produce a WAV/MP3 depending on model.
-                self.coqui.tts_to_file(text=text, file_path=str(out_path))
-                return str(out_path)
-            except Exception as e:
-                print("Coqui synthesis failed:", e)
-                # fallback to gTTS below if available
+        if self.mode == "coqui":
+            # resident model on this host; the server writes into static/outputs too
+            res = tts_resident.speak(text, filename=out_path.name, model_name=model_name or self.model_name,
+                                     speaker=speaker, out_dir=OUT_DIR)
+            if res.get("ok"):
+                return res["path"]
+            print("Coqui synthesis failed:", res.get("error"))
+            # fallback to gTTS below if available
 
-        if self.mode == "gtts":
-            if not _HAS_GTTS:
-                raise RuntimeError("gTTS not installed")
+        if _HAS_GTTS:
             try:
-                tts = gTTS(text=text, lang="en")
                 # gTTS saves mp3
                 out_path = out_path.with_suffix(".mp3")
-                tts.save(str(out_path))
-                return str(out_path)
+                def synth():
+                    gTTS(text=text, lang="en").save(str(out_path))
+                    return str(out_path)
+                path, _ = tts_cache.cached(tts_cache.make_key("gtts", text, lang="en"), str(out_path), synth)
+                return path
             except Exception as e:
                 raise RuntimeError(f"gTTS synthesis failed: {e}")
 
@@ -0,0 +1,131 @@
+# services/farm_events.py
+"""
+Task event channel for the render farm.
+- notify(ev, **info): fire-and-forget event ("created", "status") from the API / workers
+- subscribe(cb): in-process listeners (scheduler running inside the same process)
+- listen(cb): cross-process listener used by the standalone scheduler, over one of two transports:
+  - unix datagram socket (default): FARM_EVENTS_SOCK, an absolute path; by default events.sock next
+    to the farm store (FARM_STORE_PATH), so every process sharing a store shares the socket.
+    Single host only: workers on other machines (e.g. instances added by scripts/autoscale.py)
+    cannot reach it, and the scheduler then only sees their work on its SCHED_RESYNC_SECS resync
+  - Redis pub/sub: set FARM_EVENTS_REDIS (e.g. the Celery broker URL) on the scheduler and every
+    worker host; events go to channel FARM_EVENTS_CHANNEL and cross hosts
+Events are hints only: if nobody listens they are dropped, and the scheduler rebuilds
+from the farm store on start, so losing one never loses a task.
+"""
+import os, json, socket, threading
+from pathlib import Path
+
+ROOT = Path(".").resolve()
+_STORE = Path(os.getenv("FARM_STORE_PATH", str(ROOT / "jobs" / "farm" / "farm.db")))
+SOCK_PATH = str(Path(os.getenv("FARM_EVENTS_SOCK", str(_STORE.parent / "events.sock"))).expanduser().resolve())
+REDIS_URL = os.getenv("FARM_EVENTS_REDIS", "")
+CHANNEL = os.getenv("FARM_EVENTS_CHANNEL", "farm_events")
+
+_subscribers = []
+_sub_lock = threading.Lock()
+_send_sock = None
+_redis = None
+
+
+def _redis_client():
+    global _redis
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(REDIS_URL, socket_timeout=1.0, socket_connect_timeout=1.0)
+    return _redis
+
+
+def subscribe(cb):
+    with _sub_lock:
+        _subscribers.append(cb)
+
+
+def unsubscribe(cb):
+    with _sub_lock:
+        if cb in _subscribers:
+            _subscribers.remove(cb)
+
+
+def notify(ev: str, **info):
+    global _send_sock
+    msg = dict(info, ev=ev)
+    with _sub_lock:
+        subs = list(_subscribers)
+    if subs:
+        for cb in subs:
+            try:
+                cb(msg)
+            except Exception as e:
+                print("farm event subscriber error:", e)
+        return
+    if REDIS_URL:
+        try:
+            _redis_client().publish(CHANNEL, json.dumps(msg))
+        except Exception as e:
+            print("farm event not published:", e)
+        return
+    try:
+        if _send_sock is None:
+            _send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            _send_sock.setblocking(False)
+        _send_sock.sendto(json.dumps(msg).encode(), SOCK_PATH)
+    except (OSError, ValueError):
+        # no scheduler listening / buffer full: the store stays authoritative
+        pass
+
+
+def listen(cb, stop: threading.Event | None = None, sock_path: str = SOCK_PATH):
+    """Blocking receive loop; run it in a thread. Calls cb(msg_dict) per event."""
+    p = Path(sock_path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    if p.exists():
+        p.unlink()
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    s.bind(str(p))
+    s.settimeout(1.0)
+    try:
+        while stop is None or not stop.is_set():
+            try:
+                data = s.recv(65536)
+            except socket.timeout:
+                continue
+            try:
+                cb(json.loads(data.decode()))
+            except Exception as e:
+                print("farm event handler error:", e)
+    finally:
+        s.close()
+        try:
+            p.unlink()
+        except OSError:
+            pass
+
+
+def listen_redis(cb, stop: threading.Event | None = None, channel: str = CHANNEL):
+    """Blocking receive loop on the Redis channel; reconnects after broker errors."""
+    import time
+    while stop is None or not stop.is_set():
+        try:
+            ps = _redis_client().pubsub(ignore_subscribe_messages=True)
+            ps.subscribe(channel)
+            while stop is None or not stop.is_set():
+                m = ps.get_message(timeout=1.0)
+                if not m:
+                    continue
+                try:
+                    cb(json.loads(m["data"]))
+                except Exception as e:
+                    print("farm event handler error:", e)
+            ps.close()
+        except Exception as e:
+            print("farm events: redis listener error, retrying:", e)
+            time.sleep(1.0)
+
+
+def start_listener(cb, sock_path: str = SOCK_PATH):
+    stop = threading.Event()
+    target, args = (listen_redis, (cb, stop)) if REDIS_URL else (listen, (cb, stop, sock_path))
+    th = threading.Thread(target=target, args=args, daemon=True, name="farm-events")
+    th.start()
+    return stop
@@ -2,12 +2,26 @@
 """
 Render Farm Manager core helpers.
 - create_job(job_spec) -> writes job file, returns job_id
-- split_frames(job_spec) -> returns list of frame tasks
-- get_job_status(job_id) -> metadata from jobs dir
-- simple persistence via JSON files under jobs/farm/
+- split_frames(job_spec) -> returns list of frame-chunk tasks (adaptive, see below)
+- get_job_status(job_id) -> job metadata + task stats (from per-job counters, O(1) in job size)
+- job specs persist as JSON files under jobs/farm/; tasks live in the indexed store (services/farm_store.py)
+- migrate_legacy_tasks() imports the old jobs/farm/tasks/*.json files
+
+Adaptive chunking:
+- per-frame cost is estimated from the job's own samples or from sibling jobs sharing a
+  cost key (type + compositor jobfile / job name), kept in jobs/farm/timing_history.json
+- unknown cost: a few spread-out probe frames go first; the rest of the range is planned by
+  record_task_timing() once the probes report back
+- known cost: contiguous chunks of ~FARM_TARGET_TASK_SECS of work, shrinking towards the tail
+  so the last tasks finish together across FARM_TAIL_NODES nodes
+- each task carries planned_secs (frames x estimated secs/frame); the scheduler derives the
+  task's claim expiry from it, so a slow chunk is not re-dispatched while it is still rendering
+- job_spec["chunk_size"] forces a fixed chunk size (1 = one task per frame)
 """
-import os, json, uuid, time
+import os, json, uuid, time, math, fcntl
+from contextlib import contextmanager
 from pathlib import Path
+from services import farm_store
 
 ROOT = Path(".").resolve()
 JOBS_DIR = ROOT / "jobs" / "farm"
@@ -16,10 +30,29 @@ RESULTS_DIR = JOBS_DIR / "results"
 JOBS_DIR.mkdir(parents=True, exist_ok=True)
 TASKS_DIR.mkdir(parents=True, exist_ok=True)
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+HISTORY_FILE = JOBS_DIR / "timing_history.json"
+
+PROBE_FRAMES = int(os.getenv("FARM_PROBE_FRAMES", "3"))
+# keep well under the scheduler claim TTL (SCHED_CLAIM_TTL) so ordinary overruns never expire
+TARGET_TASK_SECS = float(os.getenv("FARM_TARGET_TASK_SECS", "120"))
+MAX_CHUNK = int(os.getenv("FARM_MAX_CHUNK", "50"))
+TAIL_NODES = int(os.getenv("FARM_TAIL_NODES", "4"))
+DEFAULT_FRAME_SECS = float(os.getenv("FARM_DEFAULT_FRAME_SECS", "30"))
+MAX_SAMPLES = 200
 
 def _tid():
     return uuid.uuid4().hex[:10]
 
+@contextmanager
+def _locked(path: Path):
+    # serialise read-modify-write of job/history JSON across worker processes
+    with open(str(path) + ".lock", "w") as lf:
+        fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+
 def create_job(job_spec: dict):
     """
     job_spec example:
@@ -30,79 +63,189 @@ def create_job(job_spec: dict):
       "end_frame": 120,
       "priority": 5,
       "payload": {... engine specific ...},
-      "max_retries": 2
+      "max_retries": 2,
+      "chunk_size": null   # optional fixed frames per task
     }
     """
     jid = job_spec.get("job_id") or f"job_{_tid()}"
     job_spec["job_id"] = jid
     job_spec["created_at"] = time.time()
     job_spec["status"] = "pending"
+    # split into frame-chunk tasks (also records the timing plan on job_spec)
+    tasks = split_frames(job_spec)
     jobfile = JOBS_DIR / f"{jid}.json"
     jobfile.write_text(json.dumps(job_spec, indent=2))
-    # split into frame-level tasks for per-frame engines (if needed)
-    tasks = split_frames(job_spec)
-    for t in tasks:
-        tfile = TASKS_DIR / f"{t['task_id']}.json"
-        tfile.write_text(json.dumps(t, indent=2))
+    farm_store.insert_tasks(tasks)
     return {"ok": True, "job_id": jid, "task_count": len(tasks)}
 
+def cost_key(job_spec: dict):
+    p = job_spec.get("payload", {}) or {}
+    return job_spec.get("cost_key") or f"{job_spec.get('type')}:{p.get('jobfile') or job_spec.get('job_name')}"
+
+def _load_history():
+    try:
+        return json.loads(HISTORY_FILE.read_text())
+    except Exception:
+        return {}
+
+def estimate_frame_secs(job_spec: dict):
+    """Average secs/frame from this job's samples, else from sibling jobs with the same cost key."""
+    avg = (job_spec.get("timing") or {}).get("avg_frame_secs")
+    if avg:
+        return avg
+    hist = _load_history().get(cost_key(job_spec))
+    return hist.get("avg_frame_secs") if hist else None
+
+def plan_chunks(ranges, frame_secs: float, nodes: int = TAIL_NODES, chunk_size: int | None = None):
+    """
+    ranges: [(first, last), ...] inclusive frame ranges -> [(first, last), ...] chunks.
+    Chunks hold ~TARGET_TASK_SECS of work; once fewer than nodes*chunk frames remain they
+    shrink to remaining/nodes so the tail is split finely and no node straggles.
+    """
+    if chunk_size:
+        size = int(chunk_size)
+    else:
+        size = max(1, min(MAX_CHUNK, int(round(TARGET_TASK_SECS / max(frame_secs, 1e-3)))))
+    remaining = sum(b - a + 1 for a, b in ranges)
+    chunks = []
+    for a, b in ranges:
+        f = a
+        while f <= b:
+            n = size if chunk_size else min(size, max(1, math.ceil(remaining / max(1, nodes))))
+            n = min(n, b - f + 1)
+            chunks.append((f, f + n - 1))
+            f += n; remaining -= n
+    return chunks
+
+def _probe_plan(st: int, ed: int, probes: int):
+    """Spread probe frames over [st, ed]; returns (probe_frames, remaining_ranges)."""
+    total = ed - st + 1
+    if total <= probes:
+        return list(range(st, ed+1)), []
+    picks = sorted({st + round(k * (total - 1) / max(1, probes - 1)) for k in range(probes)}) if probes > 1 else [st]
+    rest, cur = [], st
+    for f in picks:
+        if f > cur: rest.append([cur, f - 1])
+        cur = f + 1
+    if cur <= ed: rest.append([cur, ed])
+    return picks, rest
+
+def _chunk_task(job_spec: dict, first: int, last: int, probe: bool = False, frame_secs: float | None = None):
+    frames = list(range(first, last+1))
+    t = {
+        "task_id": f"task_{_tid()}",
+        "job_id": job_spec["job_id"],
+        "frame": first,
+        "nframes": len(frames),
+        "status": "queued",
+        "attempts": 0,
+        "payload": {
+            "type": job_spec.get("type"),
+            "engine_payload": job_spec.get("payload", {}),
+            "frame": first,
+            "frames": frames
+        },
+        # probes run first so the rest of the job can be planned early
+        "priority": job_spec.get("priority", 5) + (1 if probe else 0),
+        "created_at": time.time()
+    }
+    if frame_secs:
+        t["planned_secs"] = round(len(frames) * frame_secs, 3)
+    if probe:
+        t["probe"] = True
+    return t
+
 def split_frames(job_spec: dict):
-    tasks = []
     st = int(job_spec.get("start_frame", job_spec.get("payload",{}).get("start_frame",1)))
     ed = int(job_spec.get("end_frame", st))
     # if single-frame job, create single task
     if ed < st:
         ed = st
-    for f in range(st, ed+1):
-        tid = f"task_{_tid()}"
-        t = {
-            "task_id": tid,
-            "job_id": job_spec["job_id"],
-            "frame": f,
-            "status": "queued",
-            "attempts": 0,
-            "payload": {
-                "type": job_spec.get("type"),
-                "engine_payload": job_spec.get("payload", {}),
-                "frame": f
-            },
-            "priority": job_spec.get("priority", 5),
-            "created_at": time.time()
-        }
-        tasks.append(t)
-    return tasks
+    job_spec["frame_count"] = ed - st + 1
+    timing = job_spec.setdefault("timing", {"cost_key": cost_key(job_spec), "samples": [], "avg_frame_secs": None})
+    chunk_size = job_spec.get("chunk_size")
+    est = estimate_frame_secs(job_spec)
+    if chunk_size or est:
+        timing["planned_with"] = None if chunk_size else est
+        return [_chunk_task(job_spec, a, b, frame_secs=est) for a, b in plan_chunks([(st, ed)], est or 0, chunk_size=chunk_size)]
+    probes, rest = _probe_plan(st, ed, PROBE_FRAMES)
+    job_spec["unplanned"] = rest
+    return [_chunk_task(job_spec, f, f, probe=True) for f in probes]
+
+def record_task_timing(job_id: str, frame_secs: list):
+    """
+    Called by workers when a task finishes (frame_secs may be empty on failure).
+    Appends samples to the job record and the sibling history, then plans the rest of the
+    job once the probes have reported (or all of them finished without timings).
+    """
+    jf = JOBS_DIR / f"{job_id}.json"
+    if not jf.exists():
+        return {"ok": False, "error": "job_not_found"}
+    new_tasks = []
+    with _locked(jf):
+        job = json.loads(jf.read_text())
+        timing = job.setdefault("timing", {"cost_key": cost_key(job), "samples": []})
+        samples = (timing.get("samples", []) + [round(float(x), 3) for x in frame_secs if x is not None])[-MAX_SAMPLES:]
+        timing["samples"] = samples
+        if samples:
+            timing["avg_frame_secs"] = sum(samples) / len(samples)
+        if job.get("unplanned"):
+            counts = farm_store.job_counts(job_id)
+            in_flight = sum(counts.get(k, 0) for k in ("queued", "queued_for_dispatch", "running"))
+            if len(samples) >= PROBE_FRAMES or in_flight == 0:
+                est = timing.get("avg_frame_secs") or DEFAULT_FRAME_SECS
+                ranges = [tuple(r) for r in job.pop("unplanned")]
+                new_tasks = [_chunk_task(job, a, b, frame_secs=est) for a, b in plan_chunks(ranges, est)]
+                timing["planned_with"] = est
+        jf.write_text(json.dumps(job, indent=2))
+    if frame_secs:
+        with _locked(HISTORY_FILE):
+            hist = _load_history()
+            h = hist.get(timing["cost_key"], {"avg_frame_secs": None, "n": 0})
+            for x in frame_secs:
+                # running mean over the first 50 samples, then an EMA so costs can drift
+                h["n"] += 1
+                w = 1.0 / min(h["n"], 50)
+                h["avg_frame_secs"] = x if h["avg_frame_secs"] is None else (1 - w) * h["avg_frame_secs"] + w * x
+            hist[timing["cost_key"]] = h
+            HISTORY_FILE.write_text(json.dumps(hist, indent=2))
+    if new_tasks:
+        farm_store.insert_tasks(new_tasks)
+    return {"ok": True, "planned_tasks": len(new_tasks)}
 
 def get_job_status(job_id: str):
     jf = JOBS_DIR / f"{job_id}.json"
     if not jf.exists():
         return {"ok": False, "error": "job_not_found"}
     job = json.loads(jf.read_text())
-    # compute stats from task files
-    tasks = list(TASKS_DIR.glob(f"*"))
-    total = 0; done=0; failed=0; running=0; queued=0
-    for tfile in tasks:
-        t = json.loads(tfile.read_text())
-        if t.get("job_id")!=job_id: continue
-        total += 1
-        st = t.get("status")
-        if st=="done": done += 1
-        elif st=="failed": failed += 1
-        elif st=="running": running += 1
-        elif st=="queued": queued += 1
-    job["stats"] = {"total": total, "done": done, "failed": failed, "running": running, "queued": queued}
+    counts = farm_store.job_counts(job_id)
+    frames = farm_store.job_counts(job_id, frames=True)
+    total = sum(counts.values())
+    frame_total = job.get("frame_count") or sum(frames.values())
+    frames_done = frames.get("done", 0)
+    job["stats"] = {"total": total, "done": counts.get("done", 0), "failed": counts.get("failed", 0),
+                    "running": counts.get("running", 0), "queued": counts.get("queued", 0),
+                    "frames_total": frame_total, "frames_done": frames_done,
+                    "progress": round(frames_done / frame_total, 4) if frame_total else 0.0}
     return {"ok": True, "job": job}
 
+def pending_count():
+    return farm_store.count_by_status(("queued", "queued_for_dispatch"))
+
+def list_pending(limit: int = 100):
+    return farm_store.list_tasks(status="queued", limit=limit)
+
 def mark_task_status(task_id: str, status: str, res_payload: dict | None = None):
-    tfile = TASKS_DIR / f"{task_id}.json"
-    if not tfile.exists():
-        return {"ok": False, "error": "task_not_found"}
-    t = json.loads(tfile.read_text())
-    t["status"] = status
-    if "attempts" not in t: t["attempts"]=0
+    fields = {"status": status}
     if status in ("done","failed"):
-        t["finished_at"] = time.time()
-    tfile.write_text(json.dumps(t, indent=2))
+        fields["finished_at"] = time.time()
+    if not farm_store.update_task(task_id, **fields):
+        return {"ok": False, "error": "task_not_found"}
     # write result artifact if provided
     if res_payload:
         (RESULTS_DIR / f"{task_id}.result.json").write_text(json.dumps(res_payload, indent=2))
     return {"ok": True}
+
+def migrate_legacy_tasks(tasks_dir: str | Path = TASKS_DIR):
+    """Import per-task JSON files written by older farm versions (safe to re-run)."""
+    return farm_store.import_json_tasks(tasks_dir)
@@ -0,0 +1,250 @@
+# services/farm_store.py
+"""
+Indexed task store for the render farm.
+- one SQLite file (jobs/farm/farm.db, override with FARM_STORE_PATH) instead of one JSON per frame
+- farm_tasks rows are indexed by job/status and by dispatch order
+- farm_job_counts keeps per-job, per-status task and frame counters maintained by triggers, so
+  status / progress / pending lookups cost the same for a 10-frame or 100k-frame job
+- import_json_tasks(dir) migrates the legacy jobs/farm/tasks/*.json layout
+- inserts and status changes emit services.farm_events hints so the scheduler can react without polling
+
+CLI:
+  python -m services.farm_store import-json [tasks_dir]
+"""
+import os, json, time, sqlite3, threading
+from contextlib import contextmanager
+from pathlib import Path
+from services import farm_events
+
+ROOT = Path(".").resolve()
+STORE_PATH = Path(os.getenv("FARM_STORE_PATH", str(ROOT / "jobs" / "farm" / "farm.db")))
+
+# columns stored natively; anything else in a task dict goes into the `extra` JSON blob
+TASK_COLUMNS = ("task_id", "job_id", "frame", "nframes", "status", "attempts", "priority",
+                "created_at", "claimed_at", "finished_at", "payload")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS farm_tasks (
+    task_id     TEXT PRIMARY KEY,
+    job_id      TEXT NOT NULL,
+    frame       INTEGER,
+    nframes     INTEGER NOT NULL DEFAULT 1,
+    status      TEXT NOT NULL DEFAULT 'queued',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    priority    INTEGER NOT NULL DEFAULT 5,
+    created_at  REAL,
+    claimed_at  REAL,
+    finished_at REAL,
+    payload     TEXT,
+    extra       TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_farm_tasks_job_status ON farm_tasks(job_id, status);
+CREATE INDEX IF NOT EXISTS ix_farm_tasks_dispatch ON farm_tasks(status, attempts, priority DESC, created_at);
+
+CREATE TABLE IF NOT EXISTS farm_job_counts (
+    job_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    n      INTEGER NOT NULL DEFAULT 0,
+    frames INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, status)
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_farm_tasks_ins AFTER INSERT ON farm_tasks BEGIN
+    INSERT INTO farm_job_counts(job_id, status, n, frames) VALUES (NEW.job_id, NEW.status, 1, NEW.nframes)
+    ON CONFLICT(job_id, status) DO UPDATE SET n = n + 1, frames = frames + NEW.nframes;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_farm_tasks_upd AFTER UPDATE OF status ON farm_tasks
+WHEN OLD.status IS NOT NEW.status BEGIN
+    UPDATE farm_job_counts SET n = n - 1, frames = frames - OLD.nframes WHERE job_id = OLD.job_id AND status = OLD.status;
+    INSERT INTO farm_job_counts(job_id, status, n, frames) VALUES (NEW.job_id, NEW.status, 1, NEW.nframes)
+    ON CONFLICT(job_id, status) DO UPDATE SET n = n + 1, frames = frames + NEW.nframes;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_farm_tasks_del AFTER DELETE ON farm_tasks BEGIN
+    UPDATE farm_job_counts SET n = n - 1, frames = frames - OLD.nframes WHERE job_id = OLD.job_id AND status = OLD.status;
+END;
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialised = set()
+
+
+def get_conn(path: str | Path | None = None) -> sqlite3.Connection:
+    """
+    Thread-local connection (sqlite3 connections must not cross threads).
+    WAL mode so pollers can read while a worker writes.
+    """
+    p = str(path or STORE_PATH)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(p)
+    if conn is None:
+        Path(p).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(p, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _init_lock:
+            if p not in _initialised:
+                _upgrade(conn)
+                conn.executescript(SCHEMA)
+                _initialised.add(p)
+        conns[p] = conn
+    return conn
+
+
+def _upgrade(conn: sqlite3.Connection):
+    """Stores created before chunked tasks lack the frame counters: add them, rebuild the triggers."""
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(farm_tasks)")}
+    if not cols or "nframes" in cols:
+        return
+    conn.executescript("""
+        BEGIN;
+        ALTER TABLE farm_tasks ADD COLUMN nframes INTEGER NOT NULL DEFAULT 1;
+        ALTER TABLE farm_job_counts ADD COLUMN frames INTEGER NOT NULL DEFAULT 0;
+        UPDATE farm_job_counts SET frames = n;
+        DROP TRIGGER IF EXISTS trg_farm_tasks_ins;
+        DROP TRIGGER IF EXISTS trg_farm_tasks_upd;
+        DROP TRIGGER IF EXISTS trg_farm_tasks_del;
+        COMMIT;
+    """)
+
+
+@contextmanager
+def transaction(path=None):
+    """Explicit write transaction (connections run in autocommit mode otherwise)."""
+    conn = get_conn(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _row_to_task(row: sqlite3.Row) -> dict:
+    t = dict(row)
+    extra = t.pop("extra", None)
+    t["payload"] = json.loads(t["payload"]) if t.get("payload") else {}
+    if extra:
+        t.update(json.loads(extra))
+    # keep the legacy JSON shape: unset timestamps are simply absent
+    for k in ("claimed_at", "finished_at"):
+        if t.get(k) is None:
+            t.pop(k, None)
+    return t
+
+
+def _task_to_row(t: dict) -> tuple:
+    extra = {k: v for k, v in t.items() if k not in TASK_COLUMNS and not k.startswith("_")}
+    return (
+        t["task_id"], t["job_id"], t.get("frame"), int(t.get("nframes", 1)), t.get("status", "queued"),
+        int(t.get("attempts", 0)), int(t.get("priority", 5)),
+        t.get("created_at", time.time()), t.get("claimed_at"), t.get("finished_at"),
+        json.dumps(t.get("payload", {})), json.dumps(extra) if extra else None,
+    )
+
+
+def insert_tasks(tasks: list, path=None) -> int:
+    """Bulk insert task dicts in one transaction; task_ids already present are skipped."""
+    if not tasks:
+        return 0
+    sql = "INSERT OR IGNORE INTO farm_tasks (task_id, job_id, frame, nframes, status, attempts, priority, created_at, claimed_at, finished_at, payload, extra) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)"
+    with transaction(path) as conn:
+        cur = conn.executemany(sql, (_task_to_row(t) for t in tasks))
+    if cur.rowcount:
+        for jid in {t["job_id"] for t in tasks}:
+            farm_events.notify("created", job_id=jid)
+    return cur.rowcount
+
+
+def get_task(task_id: str, path=None) -> dict | None:
+    row = get_conn(path).execute("SELECT * FROM farm_tasks WHERE task_id = ?", (task_id,)).fetchone()
+    return _row_to_task(row) if row else None
+
+
+def update_task(task_id: str, path=None, **fields) -> bool:
+    """Set native columns on one task (status changes update the job counters via trigger)."""
+    cols = {k: v for k, v in fields.items() if k in TASK_COLUMNS and k != "task_id"}
+    if not cols:
+        return False
+    if "payload" in cols:
+        cols["payload"] = json.dumps(cols["payload"])
+    assigns = ", ".join(f"{k} = ?" for k in cols)
+    with transaction(path) as conn:
+        cur = conn.execute(f"UPDATE farm_tasks SET {assigns} WHERE task_id = ?", (*cols.values(), task_id))
+    if cur.rowcount and "status" in cols:
+        farm_events.notify("status", task_id=task_id, status=cols["status"])
+    return cur.rowcount > 0
+
+
+def job_counts(job_id: str, path=None, frames: bool = False) -> dict:
+    """
+    status -> task count for one job (frames=True: status -> frame count),
+    read from the aggregate table (O(statuses), not O(tasks)).
+    """
+    col = "frames" if frames else "n"
+    rows = get_conn(path).execute(
+        f"SELECT status, {col} AS c FROM farm_job_counts WHERE job_id = ? AND n > 0", (job_id,)).fetchall()
+    return {r["status"]: r["c"] for r in rows}
+
+
+def count_by_status(statuses=("queued",), path=None) -> int:
+    qs = ",".join("?" for _ in statuses)
+    row = get_conn(path).execute(
+        f"SELECT COALESCE(SUM(n), 0) FROM farm_job_counts WHERE status IN ({qs})", tuple(statuses)).fetchone()
+    return int(row[0])
+
+
+def list_tasks(status: str | None = None, job_id: str | None = None, limit: int | None = 100, path=None) -> list:
+    """Tasks in dispatch order (attempts asc, priority desc, created_at asc). limit=None returns all."""
+    where, args = [], []
+    if status:
+        where.append("status = ?"); args.append(status)
+    if job_id:
+        where.append("job_id = ?"); args.append(job_id)
+    sql = "SELECT * FROM farm_tasks"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY attempts ASC, priority DESC, created_at ASC"
+    if limit is not None:
+        sql += " LIMIT ?"; args.append(int(limit))
+    return [_row_to_task(r) for r in get_conn(path).execute(sql, args)]
+
+
+def import_json_tasks(tasks_dir: str | Path, path=None, batch: int = 1000) -> dict:
+    """
+    Migrate legacy per-task JSON files (jobs/farm/tasks/*.json) into the store.
+    Idempotent: task_ids already in the store are left untouched. Files are not removed.
+    """
+    tasks_dir = Path(tasks_dir)
+    seen = imported = bad = 0
+    buf = []
+    for f in sorted(tasks_dir.glob("*.json")):
+        try:
+            t = json.loads(f.read_text())
+            t.setdefault("task_id", f.stem)
+            if "job_id" not in t:
+                raise ValueError("missing job_id")
+            buf.append(t)
+        except Exception:
+            bad += 1
+            continue
+        seen += 1
+        if len(buf) >= batch:
+            imported += insert_tasks(buf, path=path); buf = []
+    imported += insert_tasks(buf, path=path)
+    return {"ok": True, "files": seen, "imported": imported, "skipped_invalid": bad}
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 2 and sys.argv[1] == "import-json":
+        src = sys.argv[2] if len(sys.argv) > 2 else str(ROOT / "jobs" / "farm" / "tasks")
+        print(json.dumps(import_json_tasks(src), indent=2))
+    else:
+        print("usage: python -m services.farm_store import-json [tasks_dir]")
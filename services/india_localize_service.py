@@ -1,5 +1,14 @@
 # services/india_localize_service.py
-import time, uuid, json
+"""
+Localization job records.
+- <job_id>.json is written once at creation (and again only by compact_job)
+- progress goes to <job_id>.progress.jsonl, one appended line per event: {"set": {...}},
+  {"step": "..."} or {"seg": "translations"|"tts_map", "lang", "i", "data"} (data carries "idx"
+  = i so a half-finished list still maps back to its segments); a crash loses at
+  most the line being written and concurrent segment workers never rewrite each other's state
+- read_job(jobfile) = base document + replayed journal (finished segments let a retry resume)
+"""
+import time, uuid, json, threading
 from pathlib import Path
 from services.india_lang_pack import LANGS, resolve_lang, available_langs
 
@@ -26,11 +35,66 @@ def create_localization_job(source_media: str, src_lang_hint: str | None, target
     Path(job['jobfile']).write_text(json.dumps(job, indent=2))
     return job
 
+_journal_lock = threading.Lock()
+
+
+def progress_file(jobfile) -> Path:
+    p = Path(jobfile)
+    return p.with_name(p.stem + ".progress.jsonl")
+
+
+def append_progress(jobfile, event: dict):
+    """Append one event line; O_APPEND keeps lines whole across processes, the lock within one."""
+    line = json.dumps(dict(event, ts=round(time.time(), 3)), ensure_ascii=False) + "\n"
+    with _journal_lock, open(progress_file(jobfile), "a", encoding="utf-8") as fh:
+        fh.write(line)
+
+
+def read_job(jobfile):
+    job = json.loads(Path(jobfile).read_text())
+    pf = progress_file(jobfile)
+    if not pf.exists():
+        return job
+    segs = {}
+    for line in pf.read_text(encoding="utf-8").splitlines():
+        try:
+            ev = json.loads(line)
+        except ValueError:
+            continue  # torn last line after a crash
+        if "set" in ev:
+            job.update(ev["set"])
+            for k in ev["set"]:
+                segs.pop(k, None)
+        if "step" in ev:
+            job.setdefault("steps", []).append(ev["step"])
+        if "seg" in ev:
+            per_lang = segs.setdefault(ev["seg"], {})
+            if ev["lang"] not in per_lang:
+                base = job.get(ev["seg"], {}).get(ev["lang"]) or []
+                per_lang[ev["lang"]] = {d.get("idx", k): d for k, d in enumerate(base)}
+            per_lang[ev["lang"]][ev["i"]] = ev["data"]
+    for key, per_lang in segs.items():
+        merged = dict(job.get(key) or {})
+        for lang, items in per_lang.items():
+            merged[lang] = [items[i] for i in sorted(items)]
+        job[key] = merged
+    return job
+
+
 def update_job(jobfile, updates: dict):
+    append_progress(jobfile, {"set": updates})
+    return read_job(jobfile)
+
+
+def compact_job(jobfile):
+    """Fold the journal back into the job document (end of pipeline) and start a fresh journal."""
+    job = read_job(jobfile)
     p = Path(jobfile)
-    job = json.loads(p.read_text())
-    job.update(updates)
-    p.write_text(json.dumps(job, indent=2))
+    tmp = p.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(job, indent=2))
+    with _journal_lock:
+        tmp.replace(p)
+        progress_file(jobfile).unlink(missing_ok=True)
     return job
 
 def list_supported_languages():
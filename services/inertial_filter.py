@@ -4,35 +4,19 @@ Apply simple inertial filtering to per-joint signals:
 - exponential smoothing on positions/rotations
 - velocity clamp to avoid sudden jumps
 This improves visual realism before export to BVH/retarget.
+Both run as whole-array filters (services/keypoint_filters) over (frames, keys); the dict form is
+only converted at the edges. Use keypoint_filters directly for (frames, joints, dims) arrays.
 """
+from services import keypoint_filters
 
 def exponential_smooth(frames: list, alpha: float = 0.25, keys: list | None = None):
     if not frames: return frames
     keys = keys or [k for k in frames[0].keys() if k!="t"]
-    smoothed = []
-    prev = {k: frames[0].get(k,0.0) for k in keys}
-    for f in frames:
-        nf = dict(f)
-        for k in keys:
-            v = f.get(k,0.0)
-            prev[k] = alpha * v + (1-alpha)*prev[k]
-            nf[k] = prev[k]
-        smoothed.append(nf)
-    return smoothed
+    arr = keypoint_filters.exponential(keypoint_filters.dicts_to_array(frames, keys), alpha)
+    return keypoint_filters.array_to_dicts(frames, keys, arr)
 
 def velocity_clamp(frames: list, max_deg_per_sec: float = 360.0, fps: float = 25.0, keys: list | None = None):
     if not frames: return frames
-    dt = 1.0/fps
     keys = keys or [k for k in frames[0].keys() if k!="t"]
-    clamped = [dict(frames[0])]
-    prev = frames[0]
-    for f in frames[1:]:
-        nf = dict(f)
-        for k in keys:
-            dv = f.get(k,0.0) - prev.get(k,0.0)
-            maxdv = max_deg_per_sec * dt
-            if dv > maxdv: nf[k] = prev.get(k,0.0) + maxdv
-            elif dv < -maxdv: nf[k] = prev.get(k,0.0) - maxdv
-        clamped.append(nf)
-        prev = nf
-    return clamped
+    arr = keypoint_filters.velocity_clamp(keypoint_filters.dicts_to_array(frames, keys), max_deg_per_sec, fps)
+    return keypoint_filters.array_to_dicts(frames, keys, arr)
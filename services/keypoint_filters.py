@@ -0,0 +1,148 @@
+# services/keypoint_filters.py
+"""
+Whole-array filters for motion signals shaped (frames, ...) — keypoints (frames, joints, dims),
+joint channels (frames, channels), anything with time on axis 0.
+- moving_average: edge-padded windowed mean from running sums, no per-frame loop
+- exponential / one_euro / velocity_clamp are recursive in time, so they step once per frame but
+  update every joint and dim of that frame in one array operation
+- mask (frames, ...) marks valid samples (e.g. keypoint confidence > 0; broadcast over trailing
+  dims). Missing samples never feed the filter state: the average uses only valid neighbours, the
+  recursive filters hold their last value across gaps (and pass samples through until the first
+  valid one). Without a mask the outputs match the old per-joint loops in mocap / inertial_filter.
+"""
+import math
+import numpy as np
+
+
+def _float(x) -> np.ndarray:
+    """float input keeps its precision (float64 joint channels match the dict loops bit for bit)."""
+    x = np.asarray(x)
+    return x if np.issubdtype(x.dtype, np.floating) else x.astype(np.float32)
+
+
+def _valid(x: np.ndarray, mask) -> np.ndarray:
+    if mask is None:
+        return np.ones(x.shape, bool)
+    m = np.asarray(mask, bool)
+    # (frames, joints) mask on (frames, joints, dims) data
+    m = m.reshape(m.shape + (1,) * (x.ndim - m.ndim))
+    return np.broadcast_to(m, x.shape)
+
+
+def mask_from_confidence(keypoints: np.ndarray, min_conf: float = 0.0) -> np.ndarray:
+    """(frames, joints) validity from the confidence channel of (frames, joints, 3) keypoints."""
+    return np.asarray(keypoints)[..., -1] > min_conf
+
+
+def moving_average(x: np.ndarray, window: int = 5, mask=None) -> np.ndarray:
+    """Centered mean over `window` frames (edge padded); with a mask, the mean of the valid samples only."""
+    x = _float(x)
+    if window <= 1 or not len(x):
+        return x.copy()
+    pad = ((window // 2, window - 1 - window // 2),) + ((0, 0),) * (x.ndim - 1)
+    valid = _valid(x, mask)
+
+    def window_sums(a):
+        c = np.cumsum(np.pad(a, pad, mode="edge"), axis=0, dtype=np.float64)
+        c = np.concatenate([np.zeros((1,) + a.shape[1:]), c])
+        return c[window:] - c[:-window]
+
+    if mask is None:
+        return (window_sums(x) / window).astype(x.dtype)
+    sums, count = window_sums(np.where(valid, x, 0.0)), window_sums(valid.astype(np.float64))
+    out = np.where(count > 0, sums / np.maximum(count, 1), x)
+    return out.astype(x.dtype)
+
+
+def _recursive(x, mask, step):
+    """Run step(state, sample, n) -> new state frame by frame over whole frames; masked samples hold."""
+    x = _float(x)
+    valid = _valid(x, mask)
+    out = np.empty_like(x)
+    if not len(x):
+        return out
+    # first valid sample starts the state as step(x, x) (what the dict loops did), later valid
+    # samples advance it, gaps hold it
+    if mask is None:
+        state = out[0] = step(x[0], x[0], 0)
+        for n in range(1, len(x)):
+            state = out[n] = step(state, x[n], n)
+        return out
+    state = np.where(valid[0], step(x[0], x[0], 0), x[0])
+    seen = valid[0].copy()
+    out[0] = state
+    for n in range(1, len(x)):
+        v = valid[n]
+        state = np.where(v & seen, step(state, x[n], n), np.where(v, step(x[n], x[n], n), state))
+        seen |= v
+        out[n] = np.where(seen, state, x[n])
+    return out
+
+
+def exponential(x: np.ndarray, alpha: float = 0.25, mask=None) -> np.ndarray:
+    """y[n] = alpha * x[n] + (1 - alpha) * y[n-1], y[0] = x[0]."""
+    return _recursive(x, mask, lambda y, xn, n: alpha * xn + (1 - alpha) * y)
+
+
+def velocity_clamp(x: np.ndarray, max_per_sec: float = 360.0, fps: float = 25.0, mask=None) -> np.ndarray:
+    """Slew limit: each frame moves at most max_per_sec / fps from the previous (clamped) frame."""
+    maxdv = max_per_sec * (1.0 / fps)
+
+    def step(y, xn, n):
+        d = xn - y
+        return np.where(d > maxdv, y + maxdv, np.where(d < -maxdv, y - maxdv, xn))
+    return _recursive(x, mask, step)
+
+
+def one_euro(x: np.ndarray, fps: float = 30.0, min_cutoff: float = 1.0, beta: float = 0.0,
+             d_cutoff: float = 1.0, mask=None) -> np.ndarray:
+    """
+    One-Euro filter (Casiez et al.): a low-pass whose cutoff rises with speed, so slow poses are
+    steady and fast moves keep little lag. Cutoffs in Hz; beta scales the speed term.
+    """
+    x = _float(x)
+    valid = _valid(x, mask)
+    te = 1.0 / float(fps)
+
+    def alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    out = np.empty_like(x)
+    if not len(x):
+        return out
+    state, dstate = x[0].astype(np.float64), np.zeros(x.shape[1:])
+    seen = valid[0].copy()
+    last = np.zeros(x.shape[1:])  # frames since the last valid sample, per element
+    out[0] = x[0]
+    for n in range(1, len(x)):
+        v = valid[n]
+        last += 1
+        dt = te * last
+        dx = (x[n] - state) / dt
+        a_d = alpha(d_cutoff, dt)
+        dnew = a_d * dx + (1 - a_d) * dstate
+        a = alpha(min_cutoff + beta * np.abs(dnew), dt)
+        new = a * x[n] + (1 - a) * state
+        upd = v & seen
+        state = np.where(upd, new, np.where(v, x[n], state))
+        dstate = np.where(upd, dnew, dstate)
+        last = np.where(v, 0, last)
+        seen |= v
+        out[n] = np.where(seen, state, x[n])
+    return out
+
+
+def dicts_to_array(frames: list, keys: list) -> np.ndarray:
+    """[{key: value}] -> (frames, len(keys)) float64 (missing keys read as 0.0)."""
+    return np.array([[f.get(k, 0.0) for k in keys] for f in frames], np.float64).reshape(len(frames), len(keys))
+
+
+def array_to_dicts(frames: list, keys: list, arr: np.ndarray) -> list:
+    """Copy of frames with keys overwritten from arr rows (other fields kept)."""
+    out = []
+    for f, row in zip(frames, arr.tolist()):
+        nf = dict(f)
+        nf.update(zip(keys, row))
+        out.append(nf)
+    return out
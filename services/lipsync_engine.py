@@ -1,9 +1,9 @@
 # services/lipsync_engine.py
 import os
-import subprocess
 from pathlib import Path
 import hashlib
 import time
+from services import lipsync_worker
 
 OUT = Path("static/outputs")
 OUT.mkdir(parents=True, exist_ok=True)
@@ -15,14 +15,18 @@ class LipSyncEngine:
     def __init__(self, repo_path="wav2lip_repo", model_path="models/wav2lip/wav2lip_gan.pth"):
         self.repo = Path(repo_path)
         self.model = Path(model_path)
+        self.backend = lipsync_worker.BACKEND
 
+        if self.backend == "stub":
+            return
         if not self.repo.exists():
             raise RuntimeError("Wav2Lip repo not found at: " + str(self.repo))
 
         if not self.model.exists():
             raise RuntimeError("wav2lip_gan.pth not found.")
 
-    def lipsync(self, image_path: str, audio_path: str, output_name=None):
+    def lipsync(self, image_path: str, audio_path: str, output_name=None, vertical=None):
+        """vertical=True/False encodes with the scene clip profile (see video_engine.clip_encode_args)."""
         if not Path(image_path).exists():
             raise FileNotFoundError("Image missing: " + image_path)
         if not Path(audio_path).exists():
@@ -31,17 +35,14 @@ class LipSyncEngine:
         out_name = output_name or f"lipsync_{_safe_name(image_path+audio_path+str(time.time()))}.mp4"
         out_path = OUT / out_name
 
-        cmd = [
-            "python", str(self.repo / "inference.py"),
-            "--checkpoint_path", str(self.model),
-            "--face", image_path,
-            "--audio", audio_path,
-            "--outfile", str(out_path)
-        ]
-
-        p = subprocess.run(cmd, capture_output=True, text=True)
-
-        if p.returncode != 0:
-            raise RuntimeError(f"Wav2Lip failed:\n{p.stderr}\n{p.stdout}")
+        # warm worker: model + face detector stay loaded, faces are detected once per image
+        opts = {}
+        if vertical is not None:
+            from services.video_engine import clip_encode_args, CLIP_SIZE, CLIP_FPS
+            opts = {"encode_args": clip_encode_args(*CLIP_SIZE[bool(vertical)]), "fps": CLIP_FPS}
+        res = lipsync_worker.lipsync(image_path, audio_path, str(out_path), backend=self.backend,
+                                     repo=str(self.repo), checkpoint=str(self.model), **opts)
+        if not res.get("ok"):
+            raise RuntimeError(f"Wav2Lip failed:\n{res.get('error')}")
 
         return str(out_path)
@@ -0,0 +1,440 @@
+# services/lipsync_worker.py
+"""
+Long-lived lip-sync worker (Wav2Lip) shared by every lip-sync path in a process.
+- LipSyncWorker starts `python -m services.lipsync_worker --serve <sock>` once; the child
+  imports torch, loads the checkpoint and the face detector a single time, then takes
+  (face, audio) jobs over the unix socket (one JSON line per job, like services/blender_worker)
+- face-detection boxes are cached per source file (path + size + mtime + pads), so a
+  multi-character scene that reuses one portrait per character detects each face once
+- callers queue on the worker: lipsync() for one line, lipsync_many() for a batch; concurrent
+  callers get a second worker (up to LIPSYNC_WORKERS) instead of waiting
+- LIPSYNC_BACKEND=stub is a CPU-only stand-in (no torch / repo): it sleeps for configurable
+  load / detect / per-frame costs and encodes the still + audio with ffmpeg, so the pipeline
+  can be benchmarked without GPUs (scripts/bench_lipsync.py)
+"""
+import os, sys, json, time, socket, subprocess, threading, tempfile, uuid, atexit
+from collections import OrderedDict
+from pathlib import Path
+
+ROOT = Path(".").resolve()
+PKG_ROOT = Path(__file__).resolve().parent.parent
+BACKEND = os.getenv("LIPSYNC_BACKEND", "wav2lip")  # wav2lip | stub
+DEFAULT_REPO = os.getenv("WAV2LIP_REPO", str(ROOT / "wav2lip_repo"))
+DEFAULT_CKPT = os.getenv("WAV2LIP_CKPT", str(ROOT / "models" / "wav2lip" / "wav2lip_gan.pth"))
+START_TIMEOUT = float(os.getenv("LIPSYNC_WORKER_START_SECS", "180"))
+JOB_TIMEOUT = float(os.getenv("LIPSYNC_WORKER_JOB_SECS", "1800"))
+FACE_CACHE_SIZE = int(os.getenv("LIPSYNC_FACE_CACHE", "256"))
+POOL_SIZE = int(os.getenv("LIPSYNC_WORKERS", "2"))  # resident workers per model when callers overlap
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".ppm")
+
+
+# ---------- worker side (runs inside the child process) ----------
+
+def _file_sig(path):
+    st = os.stat(path)
+    return (str(Path(path).resolve()), st.st_size, st.st_mtime_ns)
+
+
+def _audio_secs(path):
+    from services import media_probe
+    return media_probe.probe(path)["duration"]
+
+
+class _Backend:
+    """Face-box cache shared by both backends; subclasses implement _detect and render."""
+
+    def __init__(self):
+        self.faces = OrderedDict()
+        self.face_hits = 0
+
+    def face_boxes(self, face, frames, opts):
+        key = (_file_sig(face), tuple(opts.get("pads") or (0, 10, 0, 0)), opts.get("resize_factor", 1),
+               bool(opts.get("nosmooth")))
+        if key in self.faces:
+            self.faces.move_to_end(key)
+            self.face_hits += 1
+            return self.faces[key], True
+        boxes = self._detect(frames, opts)
+        self.faces[key] = boxes
+        while len(self.faces) > FACE_CACHE_SIZE:
+            self.faces.popitem(last=False)
+        return boxes, False
+
+
+class StubBackend(_Backend):
+    """CPU-only stand-in with the same cost shape as Wav2Lip (load once, detect per face, per-frame work)."""
+
+    def __init__(self, **_):
+        super().__init__()
+        self.load_ms = float(os.getenv("LIPSYNC_STUB_LOAD_MS", "3000"))
+        self.detect_ms = float(os.getenv("LIPSYNC_STUB_DETECT_MS", "400"))
+        self.frame_ms = float(os.getenv("LIPSYNC_STUB_FRAME_MS", "2"))
+        self.encode = os.getenv("LIPSYNC_STUB_ENCODE", "1") != "0"
+        time.sleep(self.load_ms / 1000.0)  # stands in for import torch + checkpoint load
+
+    def _detect(self, frames, opts):
+        time.sleep(self.detect_ms / 1000.0)
+        return [(0, 0, 0, 0)]
+
+    def render(self, job):
+        fps = float(job.get("fps") or 25)
+        _, cached = self.face_boxes(job["face"], None, job)
+        n = max(1, int(_audio_secs(job["audio"]) * fps))
+        time.sleep(n * self.frame_ms / 1000.0)
+        out = Path(job["outfile"])
+        out.parent.mkdir(parents=True, exist_ok=True)
+        if not self.encode:
+            out.write_bytes(b"")  # orchestration-only benchmarks
+        else:
+            loop = ["-loop", "1"] if job["face"].lower().endswith(IMAGE_EXTS) else ["-stream_loop", "-1"]
+            enc = job.get("encode_args") or ["-r", str(fps), "-c:v", "libx264", "-preset", "ultrafast",
+                                             "-pix_fmt", "yuv420p", "-c:a", "aac"]
+            cmd = ["ffmpeg", "-y", "-v", "error", *loop, "-i", job["face"], "-i", job["audio"], "-map", "0:v", "-map", "1:a",
+                   "-shortest", *enc, str(out)]
+            p = subprocess.run(cmd, capture_output=True, text=True)
+            if p.returncode != 0:
+                raise RuntimeError(f"ffmpeg failed: {p.stderr[-2000:]}")
+        return {"frames": n, "face_cached": cached}
+
+
+class Wav2LipBackend(_Backend):
+    """The Wav2Lip inference.py pipeline with model + detector kept resident."""
+
+    img_size = 96
+    mel_step_size = 16
+
+    def __init__(self, repo=DEFAULT_REPO, checkpoint=DEFAULT_CKPT, device=None):
+        super().__init__()
+        # the repo's top-level `models` / `audio` packages shadow ours, which is one reason
+        # this runs in its own process
+        sys.path.insert(0, str(Path(repo).resolve()))
+        import numpy as np, cv2, torch
+        import audio as w2l_audio
+        import face_detection
+        from models import Wav2Lip
+        self.np, self.cv2, self.torch, self.audio = np, cv2, torch, w2l_audio
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        ck = torch.load(checkpoint, map_location=None if self.device == "cuda" else "cpu")
+        model = Wav2Lip()
+        model.load_state_dict({k.replace("module.", ""): v for k, v in ck["state_dict"].items()})
+        self.model = model.to(self.device).eval()
+        self.detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, flip_input=False,
+                                                     device=self.device)
+        self.face_det_batch = int(os.getenv("WAV2LIP_FACE_DET_BATCH", "16"))
+        self.batch_size = int(os.getenv("WAV2LIP_BATCH", "128"))
+        print("Wav2Lip loaded on", self.device, flush=True)
+
+    def _detect(self, frames, opts):
+        np = self.np
+        bs = self.face_det_batch
+        while True:
+            preds = []
+            try:
+                for i in range(0, len(frames), bs):
+                    preds.extend(self.detector.get_detections_for_batch(np.array(frames[i:i + bs])))
+            except RuntimeError:
+                if bs == 1:
+                    raise RuntimeError("Image too big to run face detection on GPU")
+                bs //= 2
+                continue
+            break
+        pady1, pady2, padx1, padx2 = opts.get("pads") or (0, 10, 0, 0)
+        boxes = []
+        for rect, image in zip(preds, frames):
+            if rect is None:
+                raise ValueError("Face not detected! Ensure the video contains a face in all the frames.")
+            boxes.append([max(0, rect[0] - padx1), max(0, rect[1] - pady1),
+                          min(image.shape[1], rect[2] + padx2), min(image.shape[0], rect[3] + pady2)])
+        boxes = np.array(boxes)
+        if not opts.get("nosmooth") and len(boxes) > 1:
+            # same 5-frame moving average as inference.py
+            T = 5
+            for i in range(len(boxes)):
+                boxes[i] = np.mean(boxes[len(boxes) - T:] if i + T > len(boxes) else boxes[i:i + T], axis=0)
+        return [(int(y1), int(y2), int(x1), int(x2)) for x1, y1, x2, y2 in boxes]
+
+    def _read_frames(self, face, opts):
+        cv2 = self.cv2
+        rf = int(opts.get("resize_factor", 1))
+        if face.lower().endswith(IMAGE_EXTS):
+            return [cv2.imread(face)], float(opts.get("fps") or 25), True
+        cap = cv2.VideoCapture(face)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = []
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if rf > 1:
+                frame = cv2.resize(frame, (frame.shape[1] // rf, frame.shape[0] // rf))
+            frames.append(frame)
+        cap.release()
+        return frames, fps, False
+
+    def _mel_chunks(self, audio_path, fps):
+        np = self.np
+        wav_path, tmp = audio_path, None
+        if not audio_path.lower().endswith(".wav"):
+            tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False).name
+            subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", audio_path, tmp], check=True)
+            wav_path = tmp
+        try:
+            mel = self.audio.melspectrogram(self.audio.load_wav(wav_path, 16000))
+        finally:
+            if tmp:
+                os.unlink(tmp)
+        if np.isnan(mel.reshape(-1)).sum() > 0:
+            raise ValueError("Mel contains nan! Using a TTS voice? Add a small epsilon noise to the wav file and try again")
+        chunks, mult, i = [], 80.0 / fps, 0
+        while True:
+            start = int(i * mult)
+            if start + self.mel_step_size > len(mel[0]):
+                chunks.append(mel[:, len(mel[0]) - self.mel_step_size:])
+                break
+            chunks.append(mel[:, start:start + self.mel_step_size])
+            i += 1
+        return chunks
+
+    def render(self, job):
+        np, cv2, torch = self.np, self.cv2, self.torch
+        frames, fps, static = self._read_frames(job["face"], job)
+        mels = self._mel_chunks(job["audio"], fps)
+        # detect on every source frame so the cached boxes fit any later line's length
+        boxes, cached = self.face_boxes(job["face"], frames, job)
+        frames = frames[:len(mels)]
+        h, w = frames[0].shape[:2]
+        tmp_avi = tempfile.NamedTemporaryFile(suffix=".avi", delete=False).name
+        out = cv2.VideoWriter(tmp_avi, cv2.VideoWriter_fourcc(*"DIVX"), fps, (w, h))
+        s = self.img_size
+        try:
+            for b in range(0, len(mels), self.batch_size):
+                idxs = range(b, min(b + self.batch_size, len(mels)))
+                fidx = [0 if static else i % len(frames) for i in idxs]
+                faces = np.asarray([cv2.resize(frames[j][y1:y2, x1:x2], (s, s))
+                                    for j in fidx for (y1, y2, x1, x2) in [boxes[j]]])
+                masked = faces.copy()
+                masked[:, s // 2:] = 0
+                img_batch = np.concatenate((masked, faces), axis=3) / 255.0
+                mel_batch = np.asarray([mels[i] for i in idxs])[..., None]
+                img_t = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(self.device)
+                mel_t = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(self.device)
+                with torch.no_grad():
+                    pred = self.model(mel_t, img_t)
+                pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.0
+                for p, j in zip(pred, fidx):
+                    y1, y2, x1, x2 = boxes[j]
+                    f = frames[j].copy()
+                    f[y1:y2, x1:x2] = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
+                    out.write(f)
+            out.release()
+            Path(job["outfile"]).parent.mkdir(parents=True, exist_ok=True)
+            # the mux is an encode anyway: with encode_args it also conforms the clip for stream-copy concat
+            enc = job.get("encode_args") or ["-strict", "-2", "-q:v", "1"]
+            p = subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", job["audio"], "-i", tmp_avi,
+                                "-map", "1:v", "-map", "0:a", *enc, str(job["outfile"])], capture_output=True, text=True)
+            if p.returncode != 0:
+                raise RuntimeError(f"ffmpeg mux failed: {p.stderr[-2000:]}")
+        finally:
+            os.unlink(tmp_avi)
+        return {"frames": len(mels), "face_cached": cached}
+
+
+def _make_backend(name, repo, checkpoint):
+    if name == "stub":
+        return StubBackend()
+    return Wav2LipBackend(repo=repo, checkpoint=checkpoint)
+
+
+def serve(sock_path, backend="wav2lip", repo=DEFAULT_REPO, checkpoint=DEFAULT_CKPT):
+    """Child-process loop: load once, then answer {"jobs": [...]} requests until told to quit."""
+    be = _make_backend(backend, repo, checkpoint)
+    if os.path.exists(sock_path):
+        os.unlink(sock_path)
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(sock_path)
+    srv.listen(1)
+    try:
+        while True:
+            conn, _ = srv.accept()
+            with conn, conn.makefile("rb") as rfile:
+                for line in rfile:
+                    req = json.loads(line.decode())
+                    if req.get("cmd") == "quit":
+                        return
+                    for job in req.get("jobs", []):
+                        t0 = time.time()
+                        try:
+                            res = {"ok": True, "out": job["outfile"], **be.render(job)}
+                        except Exception as e:
+                            res = {"ok": False, "out": None, "error": str(e)}
+                        res.update(id=job.get("id"), secs=round(time.time() - t0, 3))
+                        conn.sendall((json.dumps(res) + "\n").encode())
+                    conn.sendall(b'{"done": true}\n')
+    finally:
+        srv.close()
+        if os.path.exists(sock_path):
+            os.unlink(sock_path)
+
+
+# ---------- client side ----------
+
+class LipSyncWorker:
+    def __init__(self, backend: str = BACKEND, repo: str = DEFAULT_REPO, checkpoint: str = DEFAULT_CKPT):
+        self.backend, self.repo, self.checkpoint = backend, str(repo), str(checkpoint)
+        self.sock_path = str(Path(tempfile.gettempdir()) / f"lipsync_{uuid.uuid4().hex[:8]}.sock")
+        self.log_path = self.sock_path[:-5] + ".log"
+        self.proc = None
+        self.conn = None
+        self.rfile = None
+        self.served = 0
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        cmd = [sys.executable, "-m", "services.lipsync_worker", "--serve", self.sock_path,
+               "--backend", self.backend, "--repo", self.repo, "--checkpoint", self.checkpoint]
+        # job paths stay relative to our cwd; only the package itself has to be importable
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(PKG_ROOT), os.getenv("PYTHONPATH")])))
+        with open(self.log_path, "ab") as log:
+            self.proc = subprocess.Popen(cmd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.time() + START_TIMEOUT
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                err = Path(self.log_path).read_text(errors="ignore")[-2000:]
+                self.proc = None
+                raise RuntimeError(f"lip-sync worker exited during startup: {err}")
+            if os.path.exists(self.sock_path):
+                try:
+                    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    s.connect(self.sock_path)
+                    s.settimeout(JOB_TIMEOUT)
+                    self.conn, self.rfile = s, s.makefile("rb")
+                    return self
+                except OSError:
+                    s.close()
+            time.sleep(0.1)
+        self.close()
+        raise TimeoutError("lip-sync worker did not open its socket in time")
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None and self.conn is not None
+
+    def run(self, jobs: list, on_result=None) -> list:
+        """
+        jobs: [{"face", "audio", "outfile", "fps"?, "pads"?, "resize_factor"?, "nosmooth"?,
+                "encode_args"? (ffmpeg output args for the final encode)}]
+        Runs them in order on the resident model; returns one result dict per job.
+        """
+        results = []
+        try:
+            return self._run(jobs, on_result, results)
+        finally:
+            with _workers_lock:
+                self.pending = max(0, self.pending - 1)
+
+    def _run(self, jobs, on_result, results):
+        with self.lock:
+            if not self.alive():
+                self.start()
+            try:
+                self.conn.sendall((json.dumps({"jobs": jobs}) + "\n").encode())
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        raise RuntimeError("lip-sync worker closed the connection")
+                    msg = json.loads(line.decode())
+                    if msg.get("done"):
+                        break
+                    results.append(msg)
+                    self.served += 1
+                    if on_result:
+                        on_result(msg)
+            except BaseException:
+                # timeout / bad line / callback error: later replies of this batch may still be on
+                # the socket, so drop the worker rather than hand them to the next batch
+                self.close()
+                raise
+        return results
+
+    def close(self):
+        try:
+            if self.conn is not None:
+                self.conn.sendall(b'{"cmd": "quit"}\n')
+        except OSError:
+            pass
+        for h in (self.rfile, self.conn):
+            try:
+                if h is not None: h.close()
+            except OSError:
+                pass
+        self.conn = self.rfile = None
+        if self.proc is not None and self.proc.poll() is None:
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+
+
+_workers = {}  # key -> [LipSyncWorker, ...]
+_workers_lock = threading.Lock()
+
+
+def get_worker(backend: str | None = None, repo: str | None = None, checkpoint: str | None = None) -> LipSyncWorker:
+    """An idle worker for this model, starting another (up to LIPSYNC_WORKERS) when all are busy."""
+    key = (backend or BACKEND, str(repo or DEFAULT_REPO), str(checkpoint or DEFAULT_CKPT))
+    with _workers_lock:
+        pool = _workers.setdefault(key, [])
+        for i, w in enumerate(pool):
+            if w.proc is not None and not w.alive():
+                w.close()
+                pool[i] = LipSyncWorker(*key)
+        w = min(pool, key=lambda w: w.pending, default=None)
+        if w is None or (w.pending and len(pool) < POOL_SIZE):
+            w = LipSyncWorker(*key)
+            pool.append(w)
+        w.pending += 1  # released at the end of run()
+        return w
+
+
+def shutdown_all():
+    with _workers_lock:
+        for pool in _workers.values():
+            for w in pool:
+                w.close()
+        _workers.clear()
+
+
+atexit.register(shutdown_all)
+
+
+def lipsync(face: str, audio: str, outfile: str, fps: int = 25, backend: str | None = None,
+            repo: str | None = None, checkpoint: str | None = None, **opts) -> dict:
+    """One line on the warm worker -> {"ok", "out", "secs", "frames", "face_cached"} or {"ok": False, "error"}."""
+    try:
+        return lipsync_many([dict(opts, face=str(face), audio=str(audio), outfile=str(outfile), fps=fps)],
+                            backend=backend, repo=repo, checkpoint=checkpoint)[0]
+    except Exception as e:
+        return {"ok": False, "out": None, "error": str(e)}
+
+
+def lipsync_many(jobs: list, backend: str | None = None, repo: str | None = None, checkpoint: str | None = None,
+                 on_result=None) -> list:
+    """A scene's worth of lines in one round trip; faces repeated across lines are detected once."""
+    return get_worker(backend, repo, checkpoint).run(jobs, on_result=on_result)
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Resident lip-sync worker")
+    ap.add_argument("--serve", required=True, help="unix socket path")
+    ap.add_argument("--backend", default=BACKEND, choices=["wav2lip", "stub"])
+    ap.add_argument("--repo", default=DEFAULT_REPO)
+    ap.add_argument("--checkpoint", default=DEFAULT_CKPT)
+    args = ap.parse_args()
+    serve(args.serve, args.backend, args.repo, args.checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+# services/media_probe.py
+"""
+Header-only media probing: duration, sample rate, channels (and codec) without decoding audio.
+- WAV: RIFF fmt/data chunks; MP3: first frame header + Xing/Info/VBRI (CBR estimate otherwise);
+  M4A/MP4/MOV: moov box (mvhd / mdhd / stsd), walking box headers only, so a trailing moov
+  after a large mdat costs a couple of seeks
+- only the parser matching the extension runs; aac / ogg / flac / opus / webm / mkv ... go straight to
+  one ffprobe call (ADTS AAC syncs like MP3), as does any file the matching parser rejects
+- results are cached in-process (LRU) keyed by (path, size, mtime), so re-probing a file that
+  has not changed is free and a rewritten file is probed again
+Use duration(path) where code used to decode a whole file just to read its length.
+"""
+import os, json, struct, subprocess
+from functools import lru_cache
+from pathlib import Path
+
+CACHE_SIZE = int(os.getenv("MEDIA_PROBE_CACHE", "4096"))
+
+# ---------- WAV ----------
+
+def _probe_wav(f, size):
+    head = f.read(12)
+    if len(head) < 12 or head[:4] not in (b"RIFF", b"RF64") or head[8:12] != b"WAVE":
+        return None
+    fmt = None
+    data_size = None
+    while True:
+        ch = f.read(8)
+        if len(ch) < 8:
+            break
+        cid, csize = ch[:4], struct.unpack("<I", ch[4:])[0]
+        if cid == b"fmt ":
+            body = f.read(csize)
+            tag, channels, rate, byte_rate, block_align, bits = struct.unpack("<HHIIHH", body[:16])
+            fmt = {"tag": tag, "channels": channels, "rate": rate, "byte_rate": byte_rate, "bits": bits}
+            if csize % 2:
+                f.seek(1, 1)
+        elif cid == b"data":
+            # 0xFFFFFFFF (streamed / RF64): the data runs to the end of the file
+            data_size = size - f.tell() if csize == 0xFFFFFFFF else min(csize, size - f.tell())
+            break
+        else:
+            f.seek(csize + (csize % 2), 1)
+    if not fmt or data_size is None or not fmt["byte_rate"]:
+        return None
+    codec = {1: "pcm", 3: "pcm_float", 6: "alaw", 7: "mulaw", 0xFFFE: "pcm"}.get(fmt["tag"], f"wav_{fmt['tag']}")
+    return {"format": "wav", "codec": codec, "duration": data_size / float(fmt["byte_rate"]),
+            "sample_rate": fmt["rate"], "channels": fmt["channels"], "bits": fmt["bits"]}
+
+
+# ---------- MP3 ----------
+
+_MP3_BITRATES = {  # (version_is_1, layer) -> kbps table
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _mp3_header(b):
+    h = struct.unpack(">I", b)[0]
+    if (h >> 21) & 0x7FF != 0x7FF:
+        return None
+    ver, layer_bits, br_idx, sr_idx = (h >> 19) & 3, (h >> 17) & 3, (h >> 12) & 0xF, (h >> 10) & 3
+    if ver == 1 or layer_bits == 0 or br_idx in (0, 15) or sr_idx == 3:
+        return None
+    layer = 4 - layer_bits
+    v1 = ver == 3
+    kbps = _MP3_BITRATES[(v1, layer)] if v1 else _MP3_BITRATES[(False, 1 if layer == 1 else 2)]
+    rate = _MP3_RATES[ver][sr_idx]
+    samples = 384 if layer == 1 else (1152 if (layer == 2 or v1) else 576)
+    return {"version": ver, "layer": layer, "bitrate": kbps[br_idx] * 1000, "rate": rate,
+            "channels": 1 if (h >> 6) & 3 == 3 else 2, "samples": samples, "padding": (h >> 9) & 1}
+
+
+def _frame_len(hdr):
+    if hdr["layer"] == 1:
+        return (12 * hdr["bitrate"] // hdr["rate"] + hdr["padding"]) * 4
+    return (144 if hdr["samples"] == 1152 else 72) * hdr["bitrate"] // hdr["rate"] + hdr["padding"]
+
+
+MP3_SYNC_FRAMES = 4  # consecutive, consistent frame headers required before trusting a sync
+
+
+def _mp3_chain(buf, i, hdr) -> bool:
+    """True when MP3_SYNC_FRAMES frames in a row parse with the same version / layer / rate / channels."""
+    key = (hdr["version"], hdr["layer"], hdr["rate"], hdr["channels"])
+    pos, h = i, hdr
+    for matched in range(MP3_SYNC_FRAMES - 1):
+        pos += _frame_len(h)
+        nxt = buf[pos:pos + 4]
+        if len(nxt) < 4:
+            return matched >= 1  # ran off the read window (short file): at least two frames chained
+        h = _mp3_header(nxt)
+        if not h or (h["version"], h["layer"], h["rate"], h["channels"]) != key:
+            return False
+    return True
+
+
+def _probe_mp3(f, size):
+    start = 0
+    head = f.read(10)
+    if head[:3] == b"ID3" and len(head) == 10:
+        start = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+        if head[5] & 0x10:
+            start += 10  # footer
+    f.seek(start)
+    buf = f.read(64 * 1024)
+    for i in range(len(buf) - 4):
+        if buf[i] != 0xFF or (buf[i + 1] & 0xE0) != 0xE0:
+            continue
+        hdr = _mp3_header(buf[i:i + 4])
+        if not hdr:
+            continue
+        frame_len = _frame_len(hdr)
+        # several following frames must sync too, otherwise this was a false match inside
+        # tag / junk data or another codec's bitstream (ADTS AAC shares the 0xFFF sync word)
+        if not _mp3_chain(buf, i, hdr):
+            continue
+        frame = buf[i:i + frame_len]
+        frames = None
+        for tag in (b"Xing", b"Info"):
+            j = frame.find(tag, 4, 64)
+            if j > 0 and struct.unpack(">I", frame[j + 4:j + 8])[0] & 1:
+                frames = struct.unpack(">I", frame[j + 8:j + 12])[0]
+        j = frame.find(b"VBRI", 32, 40)
+        if frames is None and j > 0:
+            frames = struct.unpack(">I", frame[j + 14:j + 18])[0]
+        audio_bytes = size - (start + i)
+        if frames:
+            dur = frames * hdr["samples"] / float(hdr["rate"])
+            # a Xing/VBRI count must roughly agree with the bytes actually there
+            avg_frame = audio_bytes / float(frames)
+            if not (frame_len / 8.0 <= avg_frame <= frame_len * 8.0):
+                return None
+        else:
+            f.seek(max(0, size - 128))
+            if f.read(3) == b"TAG":
+                audio_bytes -= 128
+            dur = audio_bytes * 8.0 / hdr["bitrate"]
+        return {"format": "mp3", "codec": "mp3", "duration": dur, "sample_rate": hdr["rate"],
+                "channels": hdr["channels"], "bitrate": hdr["bitrate"], "vbr_header": bool(frames)}
+    return None
+
+
+# ---------- MP4 / M4A / MOV ----------
+
+_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"udta"}
+_CODECS = {b"mp4a": "aac", b"avc1": "h264", b"avc3": "h264", b"hvc1": "hevc", b"hev1": "hevc",
+           b"alac": "alac", b"Opus": "opus", b"fLaC": "flac", b".mp3": "mp3", b"ac-3": "ac3",
+           b"ec-3": "eac3", b"mp4v": "mpeg4", b"av01": "av1", b"vp09": "vp9"}
+
+
+def _boxes(f, start, end):
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            return
+        size, typ = struct.unpack(">I", hdr[:4])[0], hdr[4:]
+        hsize = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            hsize = 16
+        elif size == 0:
+            size = end - pos
+        if size < hsize:
+            return
+        yield typ, pos + hsize, pos + size
+        pos += size
+
+
+def _esds_object_type(blob):
+    # ES_Descriptor(0x03) -> DecoderConfigDescriptor(0x04) -> objectTypeIndication
+    i = blob.find(b"\x04", 4)
+    while i >= 0:
+        j = i + 1
+        while j < len(blob) and blob[j] & 0x80:
+            j += 1
+        if j + 1 < len(blob):
+            return blob[j + 1]
+        i = blob.find(b"\x04", i + 1)
+    return None
+
+
+def _probe_mp4(f, size):
+    f.seek(4)
+    if f.read(4) not in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+        return None
+    moov = next(((s, e) for t, s, e in _boxes(f, 0, size) if t == b"moov"), None)
+    if not moov:
+        return None
+    out = {"format": "mp4", "duration": 0.0, "has_video": False}
+    audio = video = None
+
+    def walk(start, end, track):
+        nonlocal audio, video
+        for typ, s, e in _boxes(f, start, end):
+            if typ == b"mvhd":
+                f.seek(s)
+                v = f.read(1)[0]
+                f.seek(s + (20 if v == 1 else 12))
+                ts, dur = struct.unpack(">IQ" if v == 1 else ">II", f.read(12 if v == 1 else 8))
+                if ts:
+                    out["duration"] = dur / float(ts)
+            elif typ == b"trak":
+                t = {}
+                walk(s, e, t)
+                if t.get("handler") == b"soun" and audio is None:
+                    audio = t
+                elif t.get("handler") == b"vide" and video is None:
+                    video = t
+            elif typ == b"hdlr":
+                f.seek(s + 8)
+                track["handler"] = f.read(4)
+            elif typ == b"mdhd":
+                f.seek(s)
+                v = f.read(1)[0]
+                f.seek(s + (20 if v == 1 else 12))
+                ts, dur = struct.unpack(">IQ" if v == 1 else ">II", f.read(12 if v == 1 else 8))
+                if ts:
+                    track["duration"] = dur / float(ts)
+                    track["timescale"] = ts
+            elif typ == b"stsd":
+                f.seek(s + 8)
+                entry = f.read(min(e - s - 8, 512))
+                track["fourcc"] = entry[4:8]
+                track["entry"] = entry
+            elif typ in _CONTAINERS:
+                walk(s, e, track)
+
+    walk(*moov, {})
+    if audio is not None and len(audio.get("entry", b"")) >= 36:
+        ent = audio["entry"]
+        codec = _CODECS.get(audio["fourcc"], audio["fourcc"].decode("latin-1").strip())
+        if audio["fourcc"] == b"mp4a":
+            ot = _esds_object_type(ent[36:])
+            codec = {0x40: "aac", 0x66: "aac", 0x67: "aac", 0x68: "aac", 0x69: "mp3", 0x6B: "mp3"}.get(ot, "aac")
+        out.update(codec=codec, channels=struct.unpack(">H", ent[24:26])[0],
+                   sample_rate=struct.unpack(">I", ent[32:36])[0] >> 16,
+                   audio_duration=audio.get("duration"))
+    if video is not None:
+        ent = video.get("entry", b"")
+        out["has_video"] = True
+        out["video_codec"] = _CODECS.get(video.get("fourcc"), (video.get("fourcc") or b"").decode("latin-1").strip())
+        if len(ent) >= 36:
+            out["width"], out["height"] = struct.unpack(">HH", ent[32:36])
+        out["video_duration"] = video.get("duration")
+    if not out["duration"]:
+        out["duration"] = max((t.get("duration") or 0) for t in (audio or {}, video or {}))
+    return out
+
+
+# ---------- fallback ----------
+
+def _probe_ffprobe(path):
+    p = subprocess.run(["ffprobe", "-v", "error", "-show_entries",
+                        "format=duration,format_name:stream=codec_type,codec_name,sample_rate,channels,width,height",
+                        "-of", "json", str(path)], capture_output=True, text=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {path}: {p.stderr[-500:]}")
+    info = json.loads(p.stdout or "{}")
+    streams = info.get("streams", [])
+    a = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    v = next((s for s in streams if s.get("codec_type") == "video"), None)
+    out = {"format": info.get("format", {}).get("format_name"), "codec": a.get("codec_name"),
+           "duration": float(info.get("format", {}).get("duration") or 0),
+           "sample_rate": int(a.get("sample_rate") or 0), "channels": int(a.get("channels") or 0),
+           "has_video": v is not None}
+    if v:
+        out.update(video_codec=v.get("codec_name"), width=v.get("width"), height=v.get("height"))
+    return out
+
+
+_PARSERS = {".wav": _probe_wav, ".wave": _probe_wav, ".mp3": _probe_mp3, ".m4a": _probe_mp4, ".mp4": _probe_mp4,
+            ".mov": _probe_mp4, ".m4v": _probe_mp4, ".3gp": _probe_mp4}
+# containers / codecs without a header parser here: straight to ffprobe (never the MP3 sync scan)
+_FFPROBE_ONLY = {".aac", ".adts", ".ogg", ".oga", ".flac", ".opus", ".webm", ".mkv", ".mka", ".wma", ".wmv",
+                 ".avi", ".ac3", ".eac3", ".amr", ".aif", ".aiff", ".caf"}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _probe_cached(path: str, size: int, mtime_ns: int) -> dict:
+    ext = Path(path).suffix.lower()
+    if ext in _PARSERS:
+        order = [_PARSERS[ext]]
+    elif ext in _FFPROBE_ONLY:
+        order = []
+    else:
+        # unknown extension: signature-checked parsers first, the MP3 heuristic last
+        order = [_probe_wav, _probe_mp4, _probe_mp3]
+    with open(path, "rb") as f:
+        for parser in order:
+            f.seek(0)
+            try:
+                res = parser(f, size)
+            except (struct.error, IndexError, ValueError):
+                res = None
+            if res and res.get("duration"):
+                res["source"] = "header"
+                return res
+    res = _probe_ffprobe(path)
+    res["source"] = "ffprobe"
+    return res
+
+
+def probe(path) -> dict:
+    """{"format", "codec", "duration", "sample_rate", "channels", ...}; raises if unreadable."""
+    st = os.stat(path)
+    return dict(_probe_cached(str(Path(path).resolve()), st.st_size, st.st_mtime_ns))
+
+
+def duration(path, default: float = 0.0) -> float:
+    """Duration in seconds from headers; `default` when the file is missing or unreadable."""
+    try:
+        return float(probe(path).get("duration") or default)
+    except Exception:
+        return default
+
+
+def cache_info():
+    return _probe_cached.cache_info()
@@ -4,8 +4,9 @@ Motion Capture Engine wrapper
 - Modes: "mediapipe" (fast, CPU-friendly), "movenet" (fast), "openpose" (high-quality, GPU)
 - Functions:
     - save_upload(file_bytes, filename) -> path
-    - extract_2d_keypoints(video_path, mode="mediapipe") -> json per-frame keypoints
-    - smooth_keypoints(keypoints_seq, window=5) -> smoothed sequence
+    - extract_2d_keypoints(video_path, mode="mediapipe") -> (frames, joints, 3) float32 keypoints
+      (x, y, confidence), decode pipelined on a thread, optional frame stride / ROI
+    - smooth_keypoints(keypoints_seq, window=5) -> smoothed sequence (array or the old list form)
     - estimate_3d_from_2d(keypoints_seq, method="simple_lifting") -> 3D keypoints (basic)
     - export_bvh(keypoints_3d, skeleton_map, out_path) -> writes BVH
     - export_fbx(keypoints_3d, out_path) -> (optional) calls blender/FBX exporter or uses fbx SDK
@@ -38,10 +39,68 @@ def save_upload(file_bytes: bytes, filename: str | None = None) -> str:
 # ------------------------------
 # 1) 2D keypoint extraction (MediaPipe)
 # ------------------------------
-def extract_2d_keypoints_mediapipe(video_path: str, max_frames: int = None) -> Dict:
+def normalize_roi(roi):
+    """
+    (x, y, w, h) normalized crop -> the same clamped to the unit frame, or None for no crop.
+    Raises ValueError for anything that is not 4 finite numbers or leaves an empty area.
+    """
+    if roi is None:
+        return None
+    try:
+        x, y, w, h = (float(v) for v in roi)
+    except (TypeError, ValueError):
+        raise ValueError("roi must be 4 numbers (x, y, w, h)")
+    if not all(math.isfinite(v) for v in (x, y, w, h)):
+        raise ValueError("roi values must be finite")
+    x0, y0, x1, y1 = max(0.0, x), max(0.0, y), min(1.0, x + w), min(1.0, y + h)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"roi {tuple(roi)} does not overlap the frame")
+    return (x0, y0, x1 - x0, y1 - y0)
+
+def _roi_pixels(roi, w: int, h: int):
+    """Normalized roi -> (x0, y0, x1, y1) pixel box inside a w x h frame, at least 1 px each way."""
+    if roi is None:
+        return 0, 0, w, h
+    x0 = min(max(int(roi[0] * w), 0), w - 1)
+    y0 = min(max(int(roi[1] * h), 0), h - 1)
+    x1 = min(max(int((roi[0] + roi[2]) * w), x0 + 1), w)
+    y1 = min(max(int((roi[1] + roi[3]) * h), y0 + 1), h)
+    return x0, y0, x1, y1
+
+def _decode_frames(cap, q, stride: int, max_frames: int | None, roi, stop, errors: list):
+    """Decoder thread: grab every frame, retrieve (decode + crop + RGB) only every `stride`th one."""
+    import cv2
+    idx = taken = 0
+    try:
+        while not stop.is_set():
+            if not cap.grab():
+                break
+            if idx % stride == 0:
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                h, w = frame.shape[:2]
+                x0, y0, x1, y1 = _roi_pixels(roi, w, h)
+                q.put((idx, cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2RGB), (x0 / w, y0 / h, (x1 - x0) / w, (y1 - y0) / h)))
+                taken += 1
+                if max_frames and taken >= max_frames:
+                    break
+            idx += 1
+    except Exception as e:
+        errors.append(e)
+    finally:
+        q.put(None)
+
+def extract_2d_keypoints_mediapipe(video_path: str, max_frames: int = None, stride: int = 1, roi=None,
+                                   as_frames: bool = False) -> Dict:
     """
     Returns:
-      { "fps": 30, "frames": [ {"time":0.0, "keypoints":[(x,y,score), ...]}, ... ] }
+      { "fps": 30, "keypoints": float32 array (frames, 33, 3) = (x, y, confidence), "times": float32 (frames,) }
+      (plus the old "frames": [ {"time":0.0, "keypoints":[(x,y,score), ...]}, ... ] when as_frames=True)
+    stride: run pose on every Nth frame only (static shots); skipped frames are grabbed, not decoded.
+    roi: (x, y, w, h) normalized crop fed to the model; landmarks are mapped back to full-frame coords.
+         Clamped to the frame; one that misses the frame returns {"ok": False, "error": "invalid_roi"}.
+    Decoding runs on its own thread, MOCAP_DECODE_QUEUE frames ahead of inference.
     Uses: mediapipe (python) -> install: pip install mediapipe opencv-python
     """
     try:
@@ -49,87 +108,128 @@ def extract_2d_keypoints_mediapipe(video_path: str, max_frames: int = None) -> D
         import mediapipe as mp
     except Exception as e:
         return {"ok": False, "error": "mediapipe_not_installed", "msg": str(e)}
+    import queue, threading
+    try:
+        roi = normalize_roi(roi)
+    except ValueError as e:
+        return {"ok": False, "error": "invalid_roi", "msg": str(e)}
 
+    stride = max(1, int(stride or 1))
     cap = cv2.VideoCapture(str(video_path))
     fps = cap.get(cv2.CAP_PROP_FPS) or 25
+    expected = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0) // stride + 1
+    if max_frames:
+        expected = min(expected, max_frames)
     mp_pose = mp.solutions.pose
     pose = mp_pose.Pose(static_image_mode=False, min_detection_confidence=0.5, min_tracking_confidence=0.5)
-    frames = []
-    idx = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        idx += 1
-        if max_frames and idx > max_frames:
-            break
-        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        res = pose.process(img_rgb)
-        kps = []
-        if res.pose_landmarks:
-            for lm in res.pose_landmarks.landmark:
-                kps.append((lm.x, lm.y, lm.visibility if hasattr(lm,'visibility') else 1.0))
-        else:
-            # fill with zeros for consistent indexing (33 for mp pose)
-            kps = [(0.0,0.0,0.0)] * 33
-        frames.append({"time": round((idx-1)/fps, 6), "keypoints": kps})
-    cap.release()
-    pose.close()
-    return {"ok": True, "fps": fps, "frames": frames}
+    # (x, y, confidence) per joint per frame, one contiguous buffer grown by doubling
+    kps = np.zeros((max(expected, 16), 33, 3), np.float32)
+    times = np.zeros(len(kps), np.float32)
+    q, stop, errors = queue.Queue(maxsize=int(os.getenv("MOCAP_DECODE_QUEUE", "8"))), threading.Event(), []
+    decoder = threading.Thread(target=_decode_frames, args=(cap, q, stride, max_frames, roi, stop, errors), daemon=True)
+    decoder.start()
+    n = 0
+    try:
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            idx, img_rgb, (rx, ry, rw, rh) = item
+            res = pose.process(img_rgb)
+            if n == len(kps):
+                kps = np.concatenate([kps, np.zeros_like(kps)])
+                times = np.concatenate([times, np.zeros_like(times)])
+            times[n] = idx / fps
+            if res.pose_landmarks:
+                # missing landmarks stay (0, 0, 0) for consistent indexing (33 for mp pose)
+                lms = res.pose_landmarks.landmark
+                row = np.array([(lm.x, lm.y, getattr(lm, "visibility", 1.0)) for lm in lms], np.float32)
+                row[:, 0] = rx + row[:, 0] * rw
+                row[:, 1] = ry + row[:, 1] * rh
+                kps[n, :len(row)] = row[:33]
+            n += 1
+    finally:
+        stop.set()
+        while decoder.is_alive():
+            # unblock a decoder waiting on a full queue
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                decoder.join(0.05)
+        cap.release()
+        pose.close()
+    if errors:
+        return {"ok": False, "error": "decode_failed", "msg": str(errors[0]), "frames_done": n}
+    out = {"ok": True, "fps": fps / stride, "keypoints": kps[:n], "times": times[:n], "stride": stride, "roi": roi}
+    if as_frames:
+        out["frames"] = to_frames(out["keypoints"], out["times"])
+    return out
+
+def to_frames(keypoints: np.ndarray, times, key: str = "keypoints") -> List[Dict]:
+    """Array form -> the old list form ([{"time", key: [(x,y,s), ...]}]) for callers that still want it."""
+    return [{"time": round(float(t), 6), key: [tuple(map(float, kp)) for kp in f]} for t, f in zip(times, keypoints)]
+
+def as_array(frames, key: str = "keypoints"):
+    """(keypoints (T, N, C) float32, times (T,) or None) from either the array or the old list form."""
+    if isinstance(frames, dict):
+        return np.asarray(frames[key], np.float32), frames.get("times")
+    if isinstance(frames, np.ndarray):
+        return frames.astype(np.float32, copy=False), None
+    arr = np.array([f[key] for f in frames], np.float32).reshape(len(frames), -1, 3)
+    return arr, np.array([f["time"] for f in frames], np.float32)
 
 # ------------------------------
 # 2) Simple smoothing
 # ------------------------------
-def smooth_keypoints(frames: List[Dict], window: int = 5) -> List[Dict]:
+def smooth_keypoints(frames, window: int = 5, mask=None):
     """
-    frames: list of {"time":..., "keypoints":[(x,y,score), ...]}
-    returns smoothed frames (same length)
+    frames: (T, N, 3) array, or list of {"time":..., "keypoints":[(x,y,score), ...]}
+    mask: optional (T, N) valid flags (e.g. keypoint_filters.mask_from_confidence); missing joints
+          are then filled from their valid neighbours instead of being averaged in as (0, 0, 0)
+    returns smoothed frames (same length, same form as the input)
     """
-    arr = np.array([[[kp[0], kp[1], kp[2]] for kp in f["keypoints"]] for f in frames])  # shape (T, N, 3)
-    pad = window//2
-    padded = np.pad(arr, ((pad,pad),(0,0),(0,0)), mode='edge')
-    out = []
-    for i in range(arr.shape[0]):
-        win = padded[i:i+window].mean(axis=0)
-        kps = [(float(w[0]), float(w[1]), float(w[2])) for w in win]
-        out.append({"time": frames[i]["time"], "keypoints": kps})
-    return out
+    from services import keypoint_filters
+    arr, times = as_array(frames)  # shape (T, N, 3)
+    out = keypoint_filters.moving_average(arr, window, mask=mask)
+    if isinstance(frames, np.ndarray):
+        return out
+    return to_frames(out, times)
 
 # ------------------------------
 # 3) Basic 3D lifting (weak perspective assumption)
 # ------------------------------
-def lift_2d_to_3d_simple(frames: List[Dict], focal: float = 1.0, depth_scale: float = 1.0) -> List[Dict]:
+def lift_2d_to_3d_simple(frames, focal: float = 1.0, depth_scale: float = 1.0):
     """
     Very naive lifting: estimate Z from relative keypoint size (not accurate).
     For production use: use a 3D pose model (VideoPose3D, SPIN).
-    This returns list of frames with 3D coords per joint: (x,y,z)
+    Array in -> (T, N, 3) array of (x,y,z) out; list in -> list of frames with "keypoints3d".
     """
-    out = []
-    for f in frames:
-        kps3 = []
-        for (x,y,s) in f["keypoints"]:
-            # map normalized x,y to centered coords
-            cx = (x - 0.5)
-            cy = (0.5 - y)
-            z = (1.0 - s) * depth_scale  # lower visibility -> assume further
-            kps3.append((cx, cy, z))
-        out.append({"time": f["time"], "keypoints3d": kps3})
-    return out
+    arr, times = as_array(frames)
+    out = np.empty(arr.shape[:2] + (3,), np.float32)
+    # map normalized x,y to centered coords
+    out[..., 0] = arr[..., 0] - 0.5
+    out[..., 1] = 0.5 - arr[..., 1]
+    out[..., 2] = (1.0 - arr[..., 2]) * depth_scale  # lower visibility -> assume further
+    if isinstance(frames, np.ndarray):
+        return out
+    return to_frames(out, times, key="keypoints3d")
 
 # ------------------------------
 # 4) Export BVH (very generic skeleton mapping)
 # ------------------------------
-def export_bvh_from_3d(frames3d: List[Dict], out_path: str, skeleton_name: str = "human") -> Dict:
+def export_bvh_from_3d(frames3d, out_path: str, skeleton_name: str = "human", fps: float | None = None) -> Dict:
     """
     Export a simple BVH file approximating motion using hip as root.
+    frames3d: (T, N, 3) array (pass fps) or list of {"time", "keypoints3d"}.
     Note: This is a simplified BVH writer for quick preview. For production use retarget via Blender (fbx/bvh export there).
     """
     try:
         # very naive BVH: use joint 0 as root, and write positions as channels Xposition Yposition Zposition and rotations zero
-        joints_count = len(frames3d[0]["keypoints3d"])
+        arr, times = as_array(frames3d, key="keypoints3d")
+        joints_count = arr.shape[1]
         # We'll create a single root with 0 rotation channels and write frame positions as root translation
-        times = [f["time"] for f in frames3d]
-        fps = round(1.0 / (times[1]-times[0])) if len(times)>1 else 25
+        if not fps:
+            fps = round(1.0 / float(times[1]-times[0])) if times is not None and len(times)>1 else 25
         out_lines = []
         out_lines.append("HIERARCHY")
         out_lines.append("ROOT Hips")
@@ -141,17 +241,9 @@ def export_bvh_from_3d(frames3d: List[Dict], out_path: str, skeleton_name: str =
         out_lines.append("\t\tOFFSET 0.00 0.00 0.00")
         out_lines.append("\t}")
         out_lines.append("}")
-        out_lines.append("MOTION")
-        out_lines.append(f"Frames: {len(frames3d)}")
-        out_lines.append(f"Frame Time: {1.0/fps:.6f}")
-        for f in frames3d:
-            root = f["keypoints3d"][0]  # joint0 as hip
-            x,y,z = root
-            # rotations zero
-            out_lines.append(f"{x:.6f} {y:.6f} {z:.6f} 0.0 0.0 0.0")
-        Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(out_path, "w") as fh:
-            fh.write("\n".join(out_lines))
+        # joint0 as hip, rotations zero; rows formatted from the array and streamed in chunks
+        from services.advanced_bvh import write_bvh_file
+        write_bvh_file(out_path, out_lines, arr[:, 0], 1.0/fps, "%.6f %.6f %.6f 0.0 0.0 0.0")
         return {"ok": True, "out": str(out_path)}
     except Exception as e:
         return {"ok": False, "error": str(e)}
@@ -159,9 +251,11 @@ def export_bvh_from_3d(frames3d: List[Dict], out_path: str, skeleton_name: str =
 # ------------------------------
 # 5) High-level pipeline
 # ------------------------------
-def run_mocap_pipeline(video_path: str, mode: str = "mediapipe", smooth_w: int = 5, lift_method: str = "simple", out_name: str | None = None):
+def run_mocap_pipeline(video_path: str, mode: str = "mediapipe", smooth_w: int = 5, lift_method: str = "simple", out_name: str | None = None,
+                       stride: int = 1, roi=None):
     """
     High-level: save upload -> extract 2D -> smooth -> lift to 3D -> export BVH
+    Every step works on the (frames, joints, 3) float32 array from extraction.
     Returns: {"ok":True, "bvh":"/path/to.bvh", "task_id":...}
     """
     tid = _task_id()
@@ -169,22 +263,25 @@ def run_mocap_pipeline(video_path: str, mode: str = "mediapipe", smooth_w: int =
     out_path = OUTDIR / out_name
     # 1) extract 2D
     if mode == "mediapipe":
-        res = extract_2d_keypoints_mediapipe(video_path)
+        res = extract_2d_keypoints_mediapipe(video_path, stride=stride, roi=roi)
     else:
         # placeholder for other modes; user must implement OpenPose wrapper separately
         return {"ok": False, "error": "unsupported_mode", "supported": ["mediapipe"]}
     if not res.get("ok"):
         return res
-    frames = res["frames"]
+    if not len(res["keypoints"]):
+        return {"ok": False, "error": "no_frames"}
     # 2) smoothing
-    frames_s = smooth_keypoints(frames, window=smooth_w)
+    from services import keypoint_filters
+    kps_s = smooth_keypoints(res["keypoints"], window=smooth_w,
+                             mask=keypoint_filters.mask_from_confidence(res["keypoints"]))
     # 3) lift to 3d
     if lift_method == "simple":
-        frames3d = lift_2d_to_3d_simple(frames_s)
+        kps3d = lift_2d_to_3d_simple(kps_s)
     else:
-        frames3d = lift_2d_to_3d_simple(frames_s)
+        kps3d = lift_2d_to_3d_simple(kps_s)
     # 4) export BVH
-    exp = export_bvh_from_3d(frames3d, str(out_path))
+    exp = export_bvh_from_3d(kps3d, str(out_path), fps=res.get("fps", 25))
     if not exp.get("ok"):
         return exp
-    return {"ok": True, "task_id": tid, "bvh": str(out_path), "fps": res.get("fps",25)}
+    return {"ok": True, "task_id": tid, "bvh": str(out_path), "fps": res.get("fps",25), "frames": int(len(kps3d))}
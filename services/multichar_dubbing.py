@@ -7,12 +7,14 @@ Input:
 Outputs:
   - produces per-speaker wav files, timing map (list of segments with start/end in seconds)
   - returns {"ok":True, "tracks": {"Old Man":"path.wav", ...}, "segments":[...]}
+  - bake_to_video(video, result) lays that timeline onto a video (stream copy, see services/dub_bake)
 Notes:
   - Uses tts_offline from services.lip_emotion or external TTS
   - If start times needed, use forced pacing or speech-rate to estimate duration
 """
 import os, json, uuid, shlex, subprocess
 from pathlib import Path
+from services import media_probe
 from services.lip_emotion import tts_offline
 ROOT = Path(".").resolve()
 OUT = ROOT / "static" / "dubbing"
@@ -41,13 +43,19 @@ def generate_tracks(script_lines: list, voices: dict):
         res = tts_offline(text, str(out_wav), voice=voice or "default")
         if not res.get("ok"):
             return {"ok": False, "error": "tts_failed", "detail": res}
-        # estimate duration (or inspect wav length with sox/ffprobe)
-        try:
-            import soundfile as sf
-            dur = sf.info(str(out_wav)).duration
-        except Exception:
-            dur = estimate_duration_from_text(text)
+        # real duration from the wav header, text estimate if unreadable
+        dur = media_probe.duration(out_wav) or estimate_duration_from_text(text)
         segments.append({"speaker":speaker,"text":text,"start":round(time_cursor,3),"end":round(time_cursor+dur,3),"file":str(out_wav)})
         time_cursor += dur
         tracks.setdefault(speaker, []).append(str(out_wav))
     return {"ok": True, "tracks": tracks, "segments": segments, "total_duration":round(time_cursor,3)}
+
+def bake_to_video(video_path: str, result: dict, out_path: str | None = None, duck_original: bool = True):
+    """
+    Put the generate_tracks() timeline under an existing video: one ffmpeg pass, video stream copied,
+    original audio kept ducked under the dialogue (duck_original=False replaces it).
+    """
+    from services.dub_bake import bake_dub
+    out_path = out_path or str(OUT / f"dubbed_{_task_id()}.mp4")
+    return bake_dub(video_path, {"und": result.get("segments", [])}, out_path,
+                    original_gain=None if duck_original else 0.0)
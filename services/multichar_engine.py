@@ -140,6 +140,19 @@ class MultiCharacterEngine:
             return res.get("downloaded") or res.get("remote_file")
         return res
 
+    def synthesize_lines(self, lines: List[Dict]) -> List[Any]:
+        """
+        lines: [{"text", "filename"}] -> local path per line, or the Exception for lines that failed.
+        All lines go to the TTS server in one synthesize_many call (batched /tts/speak_batch).
+        """
+        if not self.tts:
+            raise RuntimeError("No TTS client available")
+        out = []
+        for res in self.tts.synthesize_many(lines):
+            path = (res.get("downloaded") or res.get("remote_file")) if res.get("ok") else None
+            out.append(path or RuntimeError(res.get("error") or "TTS did not return audio file"))
+        return out
+
     def create_scene_video(self, script: str, prefer_upload: bool=False, user_images: Dict[str,str]=None, make_lipsync: bool=False, bg_override: str=None, out_name: str=None) -> Dict[str,Any]:
         """
         High level: detect characters -> split dialogue -> for each assignment:
@@ -186,20 +199,25 @@ class MultiCharacterEngine:
                 char_assets[key] = asset
             result["steps"]["char_assets"] = char_assets
 
-            # 5) for each assignment produce short clip
+            # 5) synthesize every line in one batch, then produce a short clip per assignment
+            voices = [None] * len(assignments)
+            if self.tts:
+                lines = [{"text": a["text"], "filename": f"voice_{a['char'].get('preset') or a['char'].get('type')}_{idx}.mp3"}
+                         for idx, a in enumerate(assignments)]
+                try:
+                    voices = self.synthesize_lines(lines)
+                except Exception as e:
+                    voices = [e] * len(assignments)
             clips_info = []
             for idx, a in enumerate(assignments):
                 char = a["char"]
                 text = a["text"]
                 preset_key = char.get("preset") or char.get("type")
                 asset = char_assets.get(preset_key, {})
-                # synthesize TTS
-                try:
-                    voice_fname = f"voice_{preset_key}_{idx}.mp3"
-                    voice_path = self.synthesize_text(text, voice_filename=voice_fname) if self.tts else None
-                except Exception as e:
+                voice_path = voices[idx]
+                if isinstance(voice_path, Exception):
+                    result["errors"].append({"step":"tts","error":str(voice_path),"assignment":a})
                     voice_path = None
-                    result["errors"].append({"step":"tts","error":str(e),"assignment":a})
                 # attempt lipsync if requested and lip engine available & image exists
                 talking_video = None
                 try:
@@ -2,6 +2,8 @@
 import time, traceback, json
 from pathlib import Path
 from typing import Dict, Any, List
+from services.task_graph import TaskGraph
+from services import media_probe
 
 OUT = Path("static/outputs")
 OUT.mkdir(parents=True, exist_ok=True)
@@ -50,20 +52,13 @@ except Exception:
     _HAS_LIP = False
 
 try:
-    from services.video_engine import VideoService
+    from services.video_engine import VideoService, concat_clips
     _HAS_VIDEO = True
 except Exception:
     VideoService = None
+    concat_clips = None
     _HAS_VIDEO = False
 
-# for audio duration measurement
-_HAS_PYDUB = False
-try:
-    from pydub import AudioSegment
-    _HAS_PYDUB = True
-except Exception:
-    _HAS_PYDUB = False
-
 # moviepy fallback for timing/composition if necessary
 _HAS_MOVIEPY = False
 try:
@@ -115,19 +110,101 @@ class MultiCharEnhancedEngine:
         return self.voice_map.get(speaker_type, self.voice_map.get("narrator"))
 
     def _measure_audio_duration(self, path: str) -> float:
-        """Return duration in seconds. Try pydub first, then moviepy. Return 0 on failure."""
+        """Return duration in seconds from the file headers (no decode). Return 0 on failure."""
+        return media_probe.duration(path)
+
+    def _speaker_image(self, key: str, script_text: str, result: Dict) -> str | None:
+        """Generate one image per speaker (shared by all of that speaker's lines)."""
+        # try PresetEngine + ImageService
+        if self.preset:
+            try:
+                meta = self.preset.prepare_prompt_only(key, extra=None)
+                prompt = meta.get("prompt") or (script_text[:200])
+            except Exception:
+                prompt = script_text[:200]
+        else:
+            prompt = script_text[:200]
+        if not self.imgsvc:
+            return None
         try:
-            if _HAS_PYDUB:
-                seg = AudioSegment.from_file(path)
-                return len(seg) / 1000.0
-            if _HAS_MOVIEPY:
-                a = AudioFileClip(path)
-                dur = a.duration
-                a.close()
-                return dur
-        except Exception:
-            pass
-        return 0.0
+            name = f"char_{key}_{int(time.time())}.png"
+            return self.imgsvc.generate(prompt=prompt, out_filename=name)
+        except Exception as e:
+            result["errors"].append({"step":"image_gen","speaker":key,"error":str(e)})
+            return None
+
+    def _background(self, bg_override: str | None, script_text: str, result: Dict):
+        bg_path = bg_override
+        if not bg_path and self.bg:
+            try:
+                bg_res = self.bg.generate_background(preset_key=None, script_text=script_text)
+                result["steps"]["background"] = bg_res
+                return bg_res.get("image")
+            except Exception as e:
+                result["steps"]["background"] = {"ok": False, "error": str(e)}
+                return None
+        result["steps"]["background"] = {"image": bg_path, "source": "override" if bg_path else "none"}
+        return bg_path
+
+    def _line_audio(self, idx: int, d: Dict, result: Dict) -> Dict:
+        """TTS + duration for one line -> {index, speaker, text, audio, dur}."""
+        sp = d.get("speaker")
+        text = d.get("text")
+        voice_id = self._get_voice_for(sp)
+        # prepare filename
+        audio_name = f"line_{idx}_{sp}.mp3"
+        audio_path = None
+        if self.tts:
+            try:
+                # TTSClient.synthesize may accept voice param; adapt if your client uses other key
+                # try both keywords 'voice' and 'speaker' to be safe
+                try:
+                    res = self.tts.synthesize(text, filename=audio_name, voice=voice_id)
+                except TypeError:
+                    # older client signature
+                    res = self.tts.synthesize(text, filename=audio_name)
+                if isinstance(res, dict):
+                    audio_path = res.get("downloaded") or res.get("remote_file")
+                elif isinstance(res, str):
+                    audio_path = res
+            except Exception as e:
+                audio_path = None
+                result["errors"].append({"step":"tts","line":idx,"speaker":sp,"error":str(e)})
+        else:
+            result["errors"].append({"step":"tts_missing","line":idx,"speaker":sp})
+        # measure duration
+        dur = 0.0
+        if audio_path:
+            dur = self._measure_audio_duration(audio_path)
+        # if missing duration -> estimate by words (0.5s per 3 words) fallback
+        if dur <= 0:
+            words = len(text.split())
+            dur = max(0.5, words * 0.35)
+        return {"index": idx, "speaker": sp, "text": text, "audio": audio_path, "dur": dur}
+
+    def _line_lipsync(self, img: str | None, la: Dict, result: Dict) -> str | None:
+        # attempt lipsync (needs both image and audio); None lets the clip step fall back
+        if not (img and la["audio"]):
+            return None
+        try:
+            return self.lip.lipsync(img, la["audio"], output_name=f"lip_{la['index']}_{la['speaker']}.mp4", vertical=True)
+        except Exception as e:
+            result["errors"].append({"step":"lipsync_failed","line":la["index"], "error": str(e)})
+            return None
+
+    def _line_clip(self, img: str | None, la: Dict, lip: str | None, result: Dict) -> str | None:
+        if lip:
+            return lip
+        # fallback to VideoService simple composer
+        if self.video and img and la["audio"]:
+            try:
+                return self.video.make_simple_video(img, la["audio"], out_filename=f"clip_{la['index']}_{la['speaker']}.mp4", vertical=True, add_subtitles=True)
+            except Exception as e:
+                result["errors"].append({"step":"compose_failed","line":la["index"], "error": str(e)})
+                return None
+        # fallback: silent placeholder video or skip
+        result["errors"].append({"step":"no_clip","line":la["index"], "reason":"missing img or video service"})
+        return None
 
     def create_scene(self,
                      script_text: str,
@@ -140,10 +217,11 @@ class MultiCharEnhancedEngine:
         """
         High level:
          1) split dialogue -> list of {speaker, text}
-         2) for each unique speaker prepare character image (user_image or generate)
-         3) synthesize each line with speaker-specific voice
-         4) measure durations and assign timeline start times (cumulative)
-         5) produce per-line clip: lipsync if available else image+audio via VideoService
+         2) for each unique speaker prepare character image once (user_image or generate)
+         3) synthesize each line with speaker-specific voice + measure its duration
+         4) produce per-line clip: lipsync if available else image+audio via VideoService
+            (2-4 run as a dependency graph, lines in parallel, see services/task_graph)
+         5) assign timeline start times (cumulative)
          6) concatenate clips in timeline order -> final video
         """
         result = {"ok": True, "steps": {}, "errors": []}
@@ -162,89 +240,38 @@ class MultiCharEnhancedEngine:
                     speakers.append({"speaker": sp, "speaker_raw": d.get("speaker_raw")})
             result["steps"]["speakers"] = speakers
 
-            # 3) prepare character images (user uploads override)
-            char_assets = {}
+            # 3-5) per-speaker images, background, per-line TTS / lipsync / clip run as one dependency graph:
+            #      lines only depend on their own audio and their speaker's image, so they proceed
+            #      side by side, bounded per resource class (services/task_graph)
+            graph = TaskGraph()
             for s in speakers:
                 key = s["speaker"]
-                user_img = None
                 if user_images and key in user_images:
-                    user_img = user_images[key]
-                img_path = None
-                if user_img:
-                    img_path = user_img
+                    graph.add(f"img:{key}", lambda p=user_images[key]: p, resource="cpu")
                 else:
-                    # try PresetEngine + ImageService
-                    if self.preset:
-                        try:
-                            meta = self.preset.prepare_prompt_only(key, extra=None)
-                            prompt = meta.get("prompt") or (script_text[:200])
-                        except Exception:
-                            prompt = script_text[:200]
-                    else:
-                        prompt = script_text[:200]
-                    if self.imgsvc:
-                        try:
-                            name = f"char_{key}_{int(time.time())}.png"
-                            img_path = self.imgsvc.generate(prompt=prompt, out_filename=name)
-                        except Exception as e:
-                            img_path = None
-                            result["errors"].append({"step":"image_gen","speaker":key,"error":str(e)})
-                    else:
-                        img_path = None
-                char_assets[key] = {"image": img_path}
-            result["steps"]["char_assets"] = char_assets
-
-            # 4) background
-            bg_path = bg_override
-            if not bg_path and self.bg:
-                try:
-                    bg_res = self.bg.generate_background(preset_key=None, script_text=script_text)
-                    bg_path = bg_res.get("image")
-                    result["steps"]["background"] = bg_res
-                except Exception as e:
-                    result["steps"]["background"] = {"ok": False, "error": str(e)}
-            else:
-                result["steps"]["background"] = {"image": bg_path, "source": "override" if bg_path else "none"}
-
-            # 5) synthesize lines → produce audio files
-            line_assets = []  # list of dicts per line: {speaker, text, audio_path, duration_seconds}
+                    graph.add(f"img:{key}", lambda k=key: self._speaker_image(k, script_text, result), resource="image")
+            graph.add("background", lambda: self._background(bg_override, script_text, result), resource="image")
             for idx, d in enumerate(dialogue):
                 sp = d.get("speaker")
-                text = d.get("text")
-                voice_id = self._get_voice_for(sp)
-                # prepare filename
-                audio_name = f"line_{idx}_{sp}.mp3"
-                audio_path = None
-                if self.tts:
-                    try:
-                        # TTSClient.synthesize may accept voice param; adapt if your client uses other key
-                        # try both keywords 'voice' and 'speaker' to be safe
-                        try:
-                            res = self.tts.synthesize(text, filename=audio_name, voice=voice_id)
-                        except TypeError:
-                            # older client signature
-                            res = self.tts.synthesize(text, filename=audio_name)
-                        if isinstance(res, dict):
-                            audio_path = res.get("downloaded") or res.get("remote_file")
-                        elif isinstance(res, str):
-                            audio_path = res
-                    except Exception as e:
-                        audio_path = None
-                        result["errors"].append({"step":"tts","line":idx,"speaker":sp,"error":str(e)})
-                else:
-                    result["errors"].append({"step":"tts_missing","line":idx,"speaker":sp})
-                # measure duration
-                dur = 0.0
-                if audio_path:
-                    dur = self._measure_audio_duration(audio_path)
-                # if missing duration -> estimate by words (0.5s per 3 words) fallback
-                if dur <= 0:
-                    words = len(text.split())
-                    dur = max(0.5, words * 0.35)
-                line_assets.append({"index": idx, "speaker": sp, "text": text, "audio": audio_path, "dur": dur})
+                graph.add(f"tts:{idx}", lambda i=idx, d=d: self._line_audio(i, d, result), resource="tts")
+                deps = [f"img:{sp}", f"tts:{idx}"]
+                if make_lipsync and self.lip:
+                    graph.add(f"lip:{idx}", lambda img, la: self._line_lipsync(img, la, result), deps=deps, resource="lipsync")
+                    deps = deps + [f"lip:{idx}"]
+                graph.add(f"clip:{idx}", lambda img, la, lip=None: self._line_clip(img, la, lip, result),
+                          deps=deps, resource="encode")
+            graph.run()
+            for name, st in graph.results.items():
+                if not st["ok"]:
+                    result["errors"].append({"step": name, "error": st.get("error")})
+
+            char_assets = {s["speaker"]: {"image": graph.result(f"img:{s['speaker']}")} for s in speakers}
+            result["steps"]["char_assets"] = char_assets
+            line_assets = [graph.result(f"tts:{idx}") for idx in range(len(dialogue))]
+            line_assets = [la for la in line_assets if la]
             result["steps"]["line_assets"] = line_assets
 
-            # 6) compute timeline start times (cumulative)
+            # 6) compute timeline start times (cumulative, in dialogue order)
             t = 0.0
             for la in line_assets:
                 la["start"] = t
@@ -252,57 +279,32 @@ class MultiCharEnhancedEngine:
                 t = la["end"] + pause_between_lines
 
             result["steps"]["timeline"] = [{"index":la["index"], "speaker":la["speaker"], "start":la["start"], "end":la["end"]} for la in line_assets]
+            result["steps"]["timings"] = {name: st.get("secs") for name, st in graph.results.items()}
 
-            # 7) for each line -> create clip (lip sync preferred) -> collect final clip paths in order
-            clips = []
-            for la in line_assets:
-                sp = la["speaker"]
-                audio = la["audio"]
-                img = char_assets.get(sp, {}).get("image")
-                clip_path = None
-                # attempt lipsync (needs both image and audio and lip engine)
-                if make_lipsync and self.lip and img and audio:
-                    try:
-                        clip_path = self.lip.lipsync(img, audio, output_name=f"lip_{la['index']}_{sp}.mp4")
-                    except Exception as e:
-                        result["errors"].append({"step":"lipsync_failed","line":la["index"], "error": str(e)})
-                        clip_path = None
-                # fallback to VideoService simple composer
-                if not clip_path:
-                    if self.video and img and audio:
-                        try:
-                            clip_path = self.video.make_simple_video(img, audio, out_filename=f"clip_{la['index']}_{sp}.mp4", vertical=True, add_subtitles=True)
-                        except Exception as e:
-                            result["errors"].append({"step":"compose_failed","line":la["index"], "error": str(e)})
-                            clip_path = None
-                    else:
-                        # fallback: silent placeholder video or skip
-                        result["errors"].append({"step":"no_clip","line":la["index"], "reason":"missing img or video service"})
-                        clip_path = None
-                clips.append({"line": la, "clip": clip_path})
-
+            clips = [{"line": la, "clip": graph.result(f"clip:{la['index']}")} for la in line_assets]
             result["steps"]["clips"] = clips
 
-            # 8) assemble final timeline:
-            #    - Simple approach: concatenate clips in their sequence order.
-            #    - More advanced: place clips at absolute start times on a longer timeline (requires CompositeVideoClip).
+            # 8) assemble final timeline: clips share one encode profile (video_engine.clip_encode_args),
+            #    so concat_clips joins them at container level (-c copy); it re-encodes once only when
+            #    inputs don't match. moviepy is the last resort when ffmpeg itself is unavailable.
             final_video_path = None
-            # Attempt to assemble via moviepy by concatenation (fast & simple)
-            if _HAS_MOVIEPY:
+            video_paths = [c["clip"] for c in clips if c["clip"]]
+            out_fname = out_name or f"multichar_enhanced_{int(time.time())}.mp4"
+            out_path = OUT / out_fname
+            if not video_paths:
+                result["errors"].append({"step":"concat","error":"No clip files available to concatenate"})
+            elif concat_clips:
+                t0 = time.time()
+                cres = concat_clips(video_paths, str(out_path), vertical=True)
+                result["steps"]["assembly"] = {"mode": cres.get("mode"), "secs": round(time.time() - t0, 3)}
+                if cres["ok"]:
+                    final_video_path = cres["path"]
+                else:
+                    result["errors"].append({"step":"ffmpeg_concat","error":cres.get("error")})
+            if not final_video_path and video_paths and _HAS_MOVIEPY:
                 try:
-                    clip_objs = []
-                    from moviepy.editor import VideoFileClip, AudioFileClip, concatenate_videoclips
-                    for cinfo in clips:
-                        cp = cinfo.get("clip")
-                        if not cp:
-                            continue
-                        vc = VideoFileClip(cp)
-                        clip_objs.append(vc)
-                    if not clip_objs:
-                        raise RuntimeError("No clip files available to concatenate")
+                    clip_objs = [VideoFileClip(cp) for cp in video_paths]
                     final_clip = concatenate_videoclips(clip_objs, method="compose")
-                    out_fname = out_name or f"multichar_enhanced_{int(time.time())}.mp4"
-                    out_path = OUT / out_fname
                     final_clip.write_videofile(str(out_path), fps=24, codec="libx264", audio_codec="aac", logger=None)
                     # close
                     for v in clip_objs:
@@ -312,15 +314,6 @@ class MultiCharEnhancedEngine:
                 except Exception as e:
                     result["errors"].append({"step":"moviepy_concat","error":str(e)})
                     final_video_path = None
-            else:
-                # fallback: if VideoService has concat helper, try that (not guaranteed)
-                if self.video and hasattr(self.video, "concat_videos"):
-                    try:
-                        video_paths = [c["clip"] for c in clips if c["clip"]]
-                        final_video_path = self.video.concat_videos(video_paths, out_filename=out_name or f"multichar_enh_{int(time.time())}.mp4")
-                    except Exception as e:
-                        result["errors"].append({"step":"video_service_concat","error":str(e)})
-                        final_video_path = None
 
             result["steps"]["final_video"] = final_video_path
 
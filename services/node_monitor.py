@@ -3,7 +3,8 @@
 Very small node register and heartbeat store.
 Workers must call /farm/node/heartbeat to register.
 """
-from pathlib import Path, json
+import json
+from pathlib import Path
 import time
 ROOT = Path(".").resolve()
 NODES_DIR = ROOT / "runtime" / "nodes"
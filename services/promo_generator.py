@@ -8,6 +8,7 @@ Auto Promo Generator
 """
 import os, uuid, json, shlex, subprocess
 from pathlib import Path
+from services import media_probe
 
 ROOT = Path(".").resolve()
 OUT = ROOT / "static" / "promo"
@@ -28,12 +29,7 @@ def pick_best_clips(master_video: str, length: int = 15, ratio: str = "9:16"):
     out_prefix = OUT / f"promo_{_tid()}"
     out_prefix.mkdir(parents=True, exist_ok=True)
     # get duration
-    cmd_dur = f"ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 {shlex.quote(master_video)}"
-    p = subprocess.run(cmd_dur, shell=True, capture_output=True, text=True)
-    try:
-        dur = float(p.stdout.strip())
-    except:
-        dur = length * 3
+    dur = media_probe.duration(master_video) or length * 3
     # decide clip segments — take 3 segments of length/3 each spaced across video
     seg_count = 3
     seg_len = max(1.0, length / seg_count)
@@ -1,6 +1,7 @@
 # services/prop_library.py
 from pathlib import Path
 import json
+from services import asset_index
 
 ROOT = Path(".").resolve()
 PROP_DIR = ROOT / "assets" / "props"
@@ -14,13 +15,15 @@ MANIFEST = {
     "cup": {"file":"cup.fbx","hand":"left","grip_style":"onehand","mass":0.1},
     "laptop": {"file":"laptop.fbx","hand":"both","grip_style":"lap","mass":2.0}
 }
+PROP_EXTS = (".fbx", ".glb", ".gltf", ".obj", ".blend")
 
 def list_props():
-    # augment file paths
+    # augment file paths; existence comes from the asset index (no stat per prop per call)
+    idx = asset_index.get_index(PROP_DIR, exts=PROP_EXTS, audio=False)
     out = {}
     for k,v in MANIFEST.items():
         p = PROP_DIR / v['file']
-        out[k] = {**v, "path": str(p), "exists": p.exists()}
+        out[k] = {**v, "path": str(p), "exists": idx.exists(v['file'])}
     return out
 
 def get_prop(name):
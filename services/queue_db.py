@@ -1,6 +1,17 @@
 # services/queue_db.py
-from sqlalchemy import Table, Column, String, Integer, Float, JSON, Boolean, DateTime
-from sqlalchemy import select, insert, update, and_, func, text
+"""
+Postgres farm queue.
+- enqueue_tasks / enqueue_frames: multi-row insert, one transaction per frame range
+- claim_tasks(n, lease_secs): lease up to n tasks in one round trip; tasks whose lease expired
+  (worker died mid-frame) are reclaimable by the same query, so no separate sweeper is needed
+- every claim stamps a fresh lease_token on its rows; renew_lease / complete_tasks / release_tasks
+  only touch rows still holding that token, so a worker whose lease expired (and whose tasks were
+  reclaimed by another worker) cannot extend, finish or requeue someone else's lease
+Runs on Postgres (FOR UPDATE SKIP LOCKED) and on SQLite for tests
+(FARM_DATABASE_URL=sqlite:///farm_test.db), where writers are serialised anyway.
+"""
+from sqlalchemy import Table, Column, String, Integer, Float, JSON, Boolean, DateTime, Index
+from sqlalchemy import select, insert, update, and_, or_, func, text, inspect
 from sqlalchemy.exc import DBAPIError
 from services.db import engine, SessionLocal, metadata
 import datetime, uuid, time
@@ -15,35 +26,99 @@ tasks = Table("farm_tasks", metadata,
     Column("payload", JSON),
     Column("created_at", DateTime, default=func.now()),
     Column("locked_until", DateTime, nullable=True),
+    Column("lease_token", String, nullable=True),
+    Index("ix_farm_tasks_claim", "status", "priority", "attempts", "created_at"),
 )
 
 def init_db():
     metadata.create_all(bind=engine)
+    # tables created before lease tokens: add the column in place
+    cols = {c["name"] for c in inspect(engine).get_columns("farm_tasks")}
+    if "lease_token" not in cols:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE farm_tasks ADD COLUMN lease_token VARCHAR"))
+
+def _tid():
+    return "task_"+uuid.uuid4().hex[:10]
 
 def enqueue_task(job_id, frame, payload, priority=5):
-    tid = "task_"+uuid.uuid4().hex[:10]
+    return enqueue_tasks([{"job_id": job_id, "frame": frame, "payload": payload, "priority": priority}])[0]
+
+def enqueue_tasks(rows: list, chunk: int = 1000):
+    """
+    rows: [{"job_id", "frame", "payload", "priority"?}, ...]
+    One transaction, one multi-row INSERT per `chunk` rows. Returns task ids in input order.
+    """
+    now = datetime.datetime.utcnow()
+    values = [{"task_id": r.get("task_id") or _tid(), "job_id": r["job_id"], "frame": r.get("frame"),
+               "status": "queued", "attempts": 0, "priority": r.get("priority", 5),
+               "payload": r.get("payload", {}), "created_at": now} for r in rows]
     with SessionLocal() as s:
-        s.execute(insert(tasks).values(task_id=tid, job_id=job_id, frame=frame, status="queued", attempts=0, priority=priority, payload=payload))
+        for i in range(0, len(values), chunk):
+            s.execute(insert(tasks).values(values[i:i+chunk]))
         s.commit()
-    return tid
+    return [v["task_id"] for v in values]
 
-def claim_next_task(lock_secs=120):
+def enqueue_frames(job_id, start_frame, end_frame, payload, priority=5):
+    """Enqueue one task per frame of [start_frame, end_frame] in a single transaction."""
+    rows = [{"job_id": job_id, "frame": f, "priority": priority,
+             "payload": dict(payload, frame=f)} for f in range(int(start_frame), int(end_frame)+1)]
+    return enqueue_tasks(rows)
+
+def claim_tasks(n=1, lease_secs=120):
+    """
+    Lease up to n tasks in one round trip. Picks queued tasks plus running tasks whose lease
+    expired, in (priority desc, attempts asc, created_at asc) order. Returns a list of dicts;
+    each carries the lease_token the holder must pass to renew / complete / release them.
+    """
     now = datetime.datetime.utcnow()
-    locked_until = now + datetime.timedelta(seconds=lock_secs)
+    token = uuid.uuid4().hex
+    lease = now + datetime.timedelta(seconds=lease_secs)
+    claimable = or_(tasks.c.status == "queued",
+                    and_(tasks.c.status == "running", tasks.c.locked_until < now))
+    pick = (select(tasks.c.task_id)
+            .where(claimable)
+            .order_by(tasks.c.priority.desc(), tasks.c.attempts.asc(), tasks.c.created_at.asc())
+            .limit(n)
+            .with_for_update(skip_locked=True))  # no-op on SQLite
+    q = (update(tasks)
+         .where(tasks.c.task_id.in_(pick.scalar_subquery()))
+         .values(status="running", locked_until=lease, lease_token=token, attempts=tasks.c.attempts + 1)
+         .returning(*tasks.c))
+    with SessionLocal() as s:
+        rows = [dict(r._mapping) for r in s.execute(q)]
+        s.commit()
+    rows.sort(key=lambda r: (-(r["priority"] or 0), r["attempts"], r["created_at"] or now))
+    return rows
+
+def claim_next_task(lock_secs=120):
+    rows = claim_tasks(1, lease_secs=lock_secs)
+    return rows[0] if rows else None
+
+def _held(task_ids: list, lease_token: str):
+    return and_(tasks.c.task_id.in_(task_ids), tasks.c.status == "running", tasks.c.lease_token == lease_token)
+
+def renew_lease(task_ids: list, lease_token: str, lease_secs=120):
+    """Extend the lease on tasks still running under lease_token. Returns number of rows renewed."""
+    lease = datetime.datetime.utcnow() + datetime.timedelta(seconds=lease_secs)
+    cond = _held(task_ids, lease_token)
+    with SessionLocal() as s:
+        res = s.execute(update(tasks).where(cond).values(locked_until=lease))
+        s.commit()
+    return res.rowcount
+
+def complete_tasks(task_ids: list, lease_token: str, status="done"):
+    """Finish a batch of leased tasks ("done" / "failed") in one statement; rows leased to someone else are skipped."""
+    with SessionLocal() as s:
+        res = s.execute(update(tasks).where(_held(task_ids, lease_token))
+                        .values(status=status, locked_until=None, lease_token=None))
+        s.commit()
+    return res.rowcount
+
+def release_tasks(task_ids: list, lease_token: str):
+    """Hand unfinished leased tasks back to the queue (e.g. worker shutting down)."""
     with SessionLocal() as s:
-        # atomic claim: select for update SKIP LOCKED pattern (Postgres)
-        q = text("""
-            UPDATE farm_tasks SET status='running', locked_until = :lu, attempts = attempts + 1
-            WHERE task_id = (
-              SELECT task_id FROM farm_tasks
-              WHERE status='queued' AND (locked_until IS NULL OR locked_until < :now)
-              ORDER BY priority DESC, attempts ASC, created_at ASC
-              LIMIT 1
-              FOR UPDATE SKIP LOCKED
-            )
-            RETURNING *
-        """)
-        res = s.execute(q, {"lu": locked_until, "now": now})
-        row = res.fetchone()
+        res = s.execute(update(tasks).where(_held(task_ids, lease_token))
+                        .values(status="queued", locked_until=None, lease_token=None))
         s.commit()
-        return dict(row) if row else None
+    return res.rowcount
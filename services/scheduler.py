@@ -1,100 +1,169 @@
 # services/scheduler.py
-import time, os, json, random
+"""
+Event-driven farm dispatcher.
+- ready queue: in-memory heap ordered like the store (attempts asc, priority desc, created_at asc),
+  so picking the next task is O(log n) instead of a full scan per pass
+- wakes on farm_events ("created" -> load the job's queued tasks, "status" -> free a slot / requeue)
+- on start the heap and the claim table are rebuilt from the farm store, so restarts lose nothing
+- a slow safety resync (SCHED_RESYNC_SECS) covers dropped event datagrams
+- claims expire per task: max(SCHED_CLAIM_TTL, SCHED_CLAIM_FACTOR x planned_secs + SCHED_CLAIM_SLACK),
+  so long chunks keep their node and only lost / crashed work is re-dispatched
+"""
+import time, os, json, random, heapq, threading
 from pathlib import Path
 from datetime import datetime, timedelta
 from tasks.farm_tasks import run_task
 from services.node_monitor import list_nodes
-from services.farm_manager import TASKS_DIR, mark_task_status if False else None
-
-ROOT = Path(".").resolve()
-TASKS_DIR = ROOT / "jobs" / "farm" / "tasks"
+from services import farm_store, farm_events
 
 # scheduler config
-POLL_INTERVAL = int(os.getenv("SCHED_POLL_SECS", "3"))
 MAX_CONCURRENT = int(os.getenv("SCHED_MAX_CONCURRENT", "8"))
-CLAIM_TTL = int(os.getenv("SCHED_CLAIM_TTL", "300"))  # sec
+CLAIM_TTL = int(os.getenv("SCHED_CLAIM_TTL", "300"))  # sec, floor for every claim (and tasks without a plan)
+CLAIM_FACTOR = float(os.getenv("SCHED_CLAIM_FACTOR", "3"))
+CLAIM_SLACK = float(os.getenv("SCHED_CLAIM_SLACK", "120"))  # sec
+RESYNC_SECS = int(os.getenv("SCHED_RESYNC_SECS", "60"))
+
+READY_STATUSES = ("queued", "queued_for_dispatch")
+
+# in-memory state, always rebuildable from the farm store
+claimed = {}  # task_id -> claim expires_at
+ready = []    # heap of (attempts, -priority, created_at, task_id)
+in_ready = set()
+_cv = threading.Condition()
+
+
+def _key(t: dict):
+    return (int(t.get('attempts',0)), -int(t.get('priority',5)), t.get('created_at',0) or 0, t['task_id'])
+
+def claim_expiry(t: dict, claimed_at: float) -> float:
+    """When a claim made at claimed_at lapses, from the task's planned_secs (CLAIM_TTL if unplanned)."""
+    planned = float(t.get('planned_secs') or 0)
+    return claimed_at + max(CLAIM_TTL, CLAIM_FACTOR * planned + CLAIM_SLACK if planned else 0)
 
-# small in-memory trackers (restart-safe tasks remain in tasks dir)
-claimed = {}  # task_id -> claimed_at
+def push_ready(t: dict):
+    with _cv:
+        if t['task_id'] in in_ready or t['task_id'] in claimed:
+            return
+        heapq.heappush(ready, _key(t))
+        in_ready.add(t['task_id'])
+        _cv.notify()
+
+def rebuild():
+    """Reload ready queue and claims from the store (startup / resync)."""
+    with _cv:
+        # running tasks count against concurrency until they finish or their claim expires;
+        # claims on tasks the store no longer has running (a missed done/failed event) are dropped
+        running = farm_store.list_tasks(status="running", limit=None)
+        live = {t['task_id'] for t in running}
+        for tid in [tid for tid in claimed if tid not in live]:
+            claimed.pop(tid, None)
+        for t in running:
+            claimed.setdefault(t['task_id'], claim_expiry(t, t.get('claimed_at') or time.time()))
+        ready.clear(); in_ready.clear()
+        for status in READY_STATUSES:
+            for t in farm_store.list_tasks(status=status, limit=None):
+                if t['task_id'] not in claimed:
+                    ready.append(_key(t)); in_ready.add(t['task_id'])
+        heapq.heapify(ready)
+        _cv.notify()
+    print(f"Scheduler rebuilt: {len(ready)} ready, {len(claimed)} running")
+
+def on_event(msg: dict):
+    ev = msg.get('ev')
+    if ev == "created":
+        for t in farm_store.list_tasks(status="queued", job_id=msg.get('job_id'), limit=None):
+            push_ready(t)
+    elif ev == "status":
+        tid, st = msg.get('task_id'), msg.get('status')
+        if st in ("done", "failed"):
+            with _cv:
+                claimed.pop(tid, None)
+                _cv.notify()
+        elif st == "queued":
+            t = farm_store.get_task(tid)
+            if t: push_ready(t)
 
 def can_dispatch():
     # simple concurrency heuristic
     return len(claimed) < MAX_CONCURRENT
 
-def claim_task(tpath: Path):
+def claim_task(t: dict):
     try:
-        t = json.loads(tpath.read_text())
         tid = t['task_id']
-        if t.get('status') in ('running','done'): 
+        cur = farm_store.get_task(tid)
+        if cur is None or cur.get('status') not in READY_STATUSES:
             return False
-        # mark running
-        t['status'] = 'queued_for_dispatch'
-        t['claimed_at'] = time.time()
-        tpath.write_text(json.dumps(t, indent=2))
-        claimed[tid] = time.time()
-        # dispatch through celery
-        run_task.delay(str(tpath))
-        # update status to running (worker will finalize)
-        t['status'] = 'running'
-        tpath.write_text(json.dumps(t, indent=2))
+        # mark running before handing off, so a fast worker's "done" is never overwritten
+        now = time.time()
+        claimed[tid] = claim_expiry(cur, now)
+        farm_store.update_task(tid, status='running', claimed_at=now)
+        # dispatch through celery (worker will finalize)
+        run_task.delay(tid)
         print(f"Dispatched {tid}")
         return True
     except Exception as e:
+        tid = t.get('task_id')
+        if claimed.pop(tid, None) is not None:
+            farm_store.update_task(tid, status='queued')
         print("Claim failed", e)
         return False
 
 def sweep_claims():
-    # remove stale claims older than TTL (to allow re-dispatch)
+    # remove expired claims (to allow re-dispatch); returns secs until the next expiry
     now = time.time()
-    stale = [tid for tid,at in claimed.items() if now - at > CLAIM_TTL]
+    with _cv:
+        stale = [tid for tid,exp in claimed.items() if now > exp]
+        for tid in stale:
+            claimed.pop(tid, None)
     for tid in stale:
-        # find file and reset
-        for f in TASKS_DIR.glob("*.json"):
-            try:
-                data = json.loads(f.read_text())
-                if data.get('task_id') == tid and data.get('status') == 'running':
-                    data['status'] = 'queued'
-                    f.write_text(json.dumps(data, indent=2))
-            except:
-                pass
-        claimed.pop(tid, None)
+        t = farm_store.get_task(tid)
+        if t and t.get('status') == 'running':
+            farm_store.update_task(tid, status='queued')
+            push_ready(t)
+    with _cv:
+        if not claimed:
+            return None
+        return max(0.0, min(claimed.values()) - now)
 
 def pick_task():
-    # prioritise lower attempts, higher priority tasks
-    tasks = []
-    for f in TASKS_DIR.glob("*.json"):
-        try:
-            t = json.loads(f.read_text())
-            if t.get('status') in ("queued", "queued_for_dispatch"):
-                t['_path'] = str(f)
-                tasks.append(t)
-        except:
-            continue
-    if not tasks: return None
-    # sort by (attempts asc, priority desc, created_at asc)
-    tasks.sort(key=lambda x: (x.get('attempts',0), -int(x.get('priority',5)), x.get('created_at',0)))
-    return tasks[0]
+    # pop the best entry; entries for tasks claimed meanwhile are skipped lazily
+    with _cv:
+        while ready:
+            key = heapq.heappop(ready)
+            tid = key[-1]
+            in_ready.discard(tid)
+            if tid not in claimed:
+                return {"task_id": tid}
+    return None
 
 def run_loop():
     print("Scheduler started at", datetime.utcnow().isoformat())
+    farm_events.subscribe(on_event)
+    stop = farm_events.start_listener(on_event)
+    rebuild()
+    last_sync = time.time()
     while True:
         try:
-            sweep_claims()
-            if not can_dispatch():
-                time.sleep(POLL_INTERVAL)
-                continue
-            t = pick_task()
-            if not t:
-                time.sleep(POLL_INTERVAL)
-                continue
-            p = Path(t['_path'])
-            # final check and attempt to claim
-            claimed_ok = claim_task(p)
-            if not claimed_ok:
-                time.sleep(0.2)
+            next_expiry = sweep_claims()
+            if time.time() - last_sync > RESYNC_SECS:
+                rebuild(); last_sync = time.time()
+            dispatched = False
+            while can_dispatch():
+                t = pick_task()
+                if not t:
+                    break
+                dispatched = claim_task(t) or dispatched
+            if dispatched:
                 continue
+            # sleep until an event, the next claim expiry or the safety resync
+            timeout = RESYNC_SECS if next_expiry is None else min(RESYNC_SECS, next_expiry + 0.05)
+            with _cv:
+                if not (ready and can_dispatch()):
+                    _cv.wait(timeout=timeout)
         except KeyboardInterrupt:
             print("Scheduler stopping")
+            stop.set()
+            farm_events.unsubscribe(on_event)
             break
         except Exception as e:
             print("Scheduler error:", e)
@@ -1,16 +1,24 @@
 # services/sound_engine.py
+"""
+Voice / music / effect helpers on pydub AudioSegments.
+- effects run on one in-memory float32 buffer per call (services/audio_mix), never a temp file:
+  reverb / echo are a few vectorized delayed adds, pitch shifts the array with librosa
+- auto_duck is a single pass: voice RMS per AUTO_DUCK_BLOCK_MS block -> gain target -> one-pole
+  attack / release follower -> gain interpolated per sample onto the music in bounded chunks;
+  cost is linear in length
+"""
 import os
 from pathlib import Path
 from pydub import AudioSegment, effects
 import numpy as np
-import librosa
-import soundfile as sf
 import math
 import hashlib
 import time
+from services import audio_mix
 
 OUT_DIR = Path("static/outputs")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
+DUCK_BLOCK_MS = float(os.getenv("AUTO_DUCK_BLOCK_MS", "10"))
 
 def _safe_name(seed: str):
     return hashlib.sha1(seed.encode("utf-8")).hexdigest()[:10]
@@ -23,48 +31,51 @@ def save_audio(segment: AudioSegment, path: str, format: str = "mp3"):
     segment.export(path, format=format)
     return str(path)
 
+def to_array(segment: AudioSegment) -> np.ndarray:
+    """AudioSegment -> float32 (frames, channels), int16 full scale = 1.0."""
+    seg = segment.set_sample_width(2)
+    return audio_mix.from_pcm16(seg.raw_data, seg.channels)
+
+def from_array(samples: np.ndarray, frame_rate: int) -> AudioSegment:
+    return AudioSegment(audio_mix.to_pcm16(samples), frame_rate=frame_rate, sample_width=2, channels=samples.shape[1])
+
+def _taps(samples: np.ndarray, rate: int, taps) -> np.ndarray:
+    """samples + delayed copies: taps = [(delay_ms, gain_db)], truncated at the original length."""
+    out = samples.copy()
+    for delay_ms, gain_db in taps:
+        d = int(rate * delay_ms / 1000.0)
+        if 0 < d < len(samples):
+            out[d:] += samples[:len(samples) - d] * audio_mix.db_to_gain(gain_db)
+    return out
+
 # --- Effects ---
 def apply_reverb(pydub_seg: AudioSegment, decay: float = 0.4) -> AudioSegment:
     """
     Simple reverb via multiple delayed attenuated copies.
     decay: 0..1 smaller = light, bigger = more reverb
     """
-    base = pydub_seg
-    combined = base
     delay_ms = 50
     attenuation = 0.6 * decay
-    # add few echoes
-    for i in range(1, 6):
-        delayed = base - (i * 6)  # reduce gain
-        delayed = delayed.delay(i * delay_ms)
-        delayed = delayed - (i * (6 + attenuation*10))
-        combined = combined.overlay(delayed)
-    return combined
+    # five echoes, each i*50 ms later and i*(12 + attenuation*10) dB down
+    taps = [(i * delay_ms, -(i * 6) - i * (6 + attenuation * 10)) for i in range(1, 6)]
+    return from_array(_taps(to_array(pydub_seg), pydub_seg.frame_rate, taps), pydub_seg.frame_rate)
 
 def apply_echo(segment: AudioSegment, delay_ms: int = 200, repeats: int = 3, attenuation_db: float = 6.0) -> AudioSegment:
-    out = segment
-    for i in range(1, repeats+1):
-        echo = segment - (attenuation_db * i)
-        out = out.overlay(echo, position=delay_ms * i)
-    return out
+    taps = [(delay_ms * i, -attenuation_db * i) for i in range(1, repeats + 1)]
+    return from_array(_taps(to_array(segment), segment.frame_rate, taps), segment.frame_rate)
 
 def change_pitch(segment: AudioSegment, semitones: float) -> AudioSegment:
     """
     Change pitch by resampling technique (preserves length by re-speeding).
     Positive semitones => higher pitch.
     """
-    # convert to numpy
-    samples = np.array(segment.get_array_of_samples()).astype(np.float32)
     sr = segment.frame_rate
-    # librosa pitch shift
+    # librosa pitch shift, all channels at once, in memory
     try:
-        shifted = librosa.effects.pitch_shift(samples, sr, n_steps=semitones)
-        # convert back to AudioSegment
-        tmp_path = OUT_DIR / f"tmp_pitch_{_safe_name(str(time.time()))}.wav"
-        sf.write(str(tmp_path), shifted, sr)
-        out = AudioSegment.from_wav(str(tmp_path))
-        tmp_path.unlink(missing_ok=True)
-        return out
+        import librosa
+        samples = to_array(segment)
+        shifted = librosa.effects.pitch_shift(np.ascontiguousarray(samples.T), sr=sr, n_steps=semitones)
+        return from_array(np.asarray(shifted, np.float32).reshape(samples.shape[1], -1).T, sr)
     except Exception as e:
         # fallback: speed change (affects duration)
         rate = 2.0 ** (semitones / 12.0)
@@ -77,39 +88,62 @@ def speed_change(sound: AudioSegment, speed=1.0) -> AudioSegment:
     return sped.set_frame_rate(sound.frame_rate)
 
 # --- Advanced: auto-ducking (voice over music) ---
-def auto_duck(music: AudioSegment, voice: AudioSegment, duck_amount_db: float = 12.0, padding_ms: int = 120):
+def duck_envelope(voice: np.ndarray, rate: int, frames: int, duck_amount_db: float = 12.0, padding_ms: int = 120,
+                  threshold_db: float = -36.0, attack_ms: float = 20.0, release_ms: float = 250.0):
+    """
+    Music gain (dB) per DUCK_BLOCK_MS block from a mono voice buffer, in one pass -> (env_db, block_frames).
+    Voice RMS is measured per block; blocks above threshold_db (plus padding_ms after them) target
+    -duck_amount_db, and the gain follows the target with attack (going down) / release (going up).
+    """
+    block = max(1, int(rate * DUCK_BLOCK_MS / 1000.0))
+    n = -(-frames // block)
+    v = np.zeros(n * block, np.float32)
+    v[:min(len(voice), len(v))] = voice[:len(v)]
+    rms = np.sqrt(np.mean(v.reshape(n, block) ** 2, axis=1))
+    present = rms > audio_mix.db_to_gain(threshold_db)
+    hold = int(padding_ms / DUCK_BLOCK_MS)
+    if hold > 0:
+        # keep ducking for `hold` blocks after the voice stops (running max via cumsum)
+        c = np.concatenate([[0], np.cumsum(present)])
+        present = (c[1:] - c[np.maximum(np.arange(n) - hold, 0)]) > 0
+    target = np.where(present, -abs(duck_amount_db), 0.0)
+    a_att = math.exp(-DUCK_BLOCK_MS / max(attack_ms, 1e-3))
+    a_rel = math.exp(-DUCK_BLOCK_MS / max(release_ms, 1e-3))
+    env = np.empty(n, np.float32)
+    g = 0.0
+    for i, t in enumerate(target.tolist()):
+        g = t + (a_att if t < g else a_rel) * (g - t)
+        env[i] = g
+    return env, block
+
+def apply_envelope_db(samples: np.ndarray, env_db: np.ndarray, block: int, chunk: int = 1 << 20) -> np.ndarray:
+    """samples * the block envelope interpolated per sample, in place, chunk by chunk (bounded memory)."""
+    centers = (np.arange(len(env_db)) + 0.5) * block
+    for a in range(0, len(samples), chunk):
+        b = min(len(samples), a + chunk)
+        gain_db = np.interp(np.arange(a, b), centers, env_db).astype(np.float32)
+        samples[a:b] *= (10.0 ** (gain_db / 20.0))[:, None]
+    return samples
+
+def auto_duck(music: AudioSegment, voice: AudioSegment, duck_amount_db: float = 12.0, padding_ms: int = 120,
+              attack_ms: float = 20.0, release_ms: float = 250.0, threshold_db: float = -36.0):
     """
     Reduce music volume when voice is present.
-    Approach: break music into chunks, detect voice presence by rms of voice, reduce music where voice > threshold.
+    Approach: RMS envelope of the voice drives a smoothed gain on the music (duck_envelope), then the
+    voice is summed on top; both as numpy buffers, one pass over the track.
     """
     # convert to mono and same frame_rate
-    voice = voice.set_frame_rate(music.frame_rate).set_channels(1)
-    music = music.set_channels(1)
-
-    # chunk size
-    chunk_ms = 200
-    music_chunks = [music[i:i+chunk_ms] for i in range(0, len(music), chunk_ms)]
-    voice_chunks = [voice[i:i+chunk_ms] for i in range(0, len(voice), chunk_ms)]
-
-    out = AudioSegment.silent(duration=0)
-    for idx, mchunk in enumerate(music_chunks):
-        # corresponding voice chunk index
-        vchunk = voice_chunks[idx] if idx < len(voice_chunks) else AudioSegment.silent(duration=chunk_ms)
-        # compute rms
-        vrms = vchunk.rms
-        # threshold for presence
-        threshold = 500  # empirical
-        if vrms > threshold:
-            # duck music chunk
-            mchunk = mchunk - duck_amount_db
-        out += mchunk
-    # mix voice on top
+    rate = music.frame_rate
+    v = to_array(voice.set_frame_rate(rate).set_channels(1))
+    m = to_array(music.set_channels(1))
+    env, block = duck_envelope(v[:, 0], rate, len(m), duck_amount_db, padding_ms, threshold_db, attack_ms, release_ms)
     # pad music or voice to equal length
-    final_length = max(len(out), len(voice))
-    out = out + AudioSegment.silent(duration=max(0, final_length - len(out)))
-    voice_pad = voice + AudioSegment.silent(duration=max(0, final_length - len(voice)))
-    mixed = out.overlay(voice_pad)
-    return mixed
+    out = np.zeros((max(len(m), len(v)), 1), np.float32)
+    out[:len(m)] = m
+    del m
+    apply_envelope_db(out[:len(env) * block], env, block)
+    out[:len(v)] += v
+    return from_array(out, rate)
 
 # --- Overlay sound effect at timestamp ---
 def overlay_sfx(base: AudioSegment, sfx_path: str, at_ms: int = 0, gain_during_sfx_db: float = -6.0):
@@ -136,11 +170,8 @@ def mix_voice_and_music(voice_path: str, music_path: str = None, out_name: str =
         music = load_audio(music_path).normalize() + music_gain_db
         # make music at least as long as voice
         if len(music) < len(voice):
-            # loop music
-            repeated = AudioSegment.silent(duration=0)
-            while len(repeated) < len(voice):
-                repeated += music
-            music = repeated
+            # loop music (one concatenation, not a growing +=)
+            music = music * -(-len(voice) // max(1, len(music)))
         else:
             music = music[:len(voice)]
         if auto_ducking:
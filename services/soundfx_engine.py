@@ -4,8 +4,11 @@ Sound FX & Ambient Engine
 - detect_events(script_text) -> list of events with rough timestamps (relative)
 - select_sfx_for_event(event_key) -> path to sfx file (from assets/sfx)
 - mix_audio(dialogue_tracks, events, ambience, music) -> final audio path
+- mix_tracks renders on the numpy core in services/audio_mix (one buffer, events added in place,
+  ducking as a gain vector, each file decoded once, one encode); mix_tracks_reference is the
+  original pydub renderer, kept as the golden reference (SOUNDFX_MIXER=pydub selects it)
 
-Dependencies: pydub (and ffmpeg installed on system)
+Dependencies: pydub, numpy (and ffmpeg installed on system)
 pip install pydub
 ffmpeg must be available in PATH
 """
@@ -16,6 +19,7 @@ import random
 import math
 from pathlib import Path
 from typing import List, Dict, Any
+from services import asset_index
 
 try:
     from pydub import AudioSegment, effects
@@ -26,6 +30,7 @@ except Exception as e:
 SFX_DIR = Path("assets/sfx")           # put fx files here (e.g., tiger_roar.mp3, footstep1.wav)
 AMBIENCE_DIR = Path("assets/ambience") # ambient loops (rain.mp3, wind.mp3, crowd.mp3)
 MUSIC_DIR = Path("assets/music")       # background music tracks
+MIXER = os.getenv("SOUNDFX_MIXER", "numpy")  # numpy | pydub (reference)
 
 OUT_DIR = Path("static/audio")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -58,17 +63,8 @@ PREFERRED_PATTERNS = {
 }
 
 def _find_best_file_for(patterns: List[str], dirpath: Path):
-    if not dirpath.exists():
-        return None
-    files = list(dirpath.glob("*"))
-    best = None
-    for f in files:
-        lname = f.name.lower()
-        for p in patterns:
-            if p in lname:
-                return str(f)
-    # fallback random
-    return str(random.choice(files)) if files else None
+    # answered from the in-memory asset index (refreshed when the directory changes), no glob per cue
+    return asset_index.get_index(dirpath).best(patterns)
 
 class SoundFXEngine:
     def __init__(self, sfx_dir: str | None = None, ambience_dir: str | None = None, music_dir: str | None = None):
@@ -138,6 +134,77 @@ class SoundFXEngine:
     def mix_tracks(self, dialogue_tracks: List[Dict], script_text: str, mood: str | None = None, music_intensity: str | None = None, ducking_db: float = -10.0) -> Dict[str,Any]:
         """
         dialogue_tracks: list of {"path": "/path/to/line.mp3", "start": seconds, "end": seconds, "speaker": "young_male"}
+        Same steps, levels and file choices as mix_tracks_reference, rendered on numpy buffers.
+        Returns: {"ok": True, "final_audio": path, "details": {...}}
+        """
+        if MIXER == "pydub":
+            return self.mix_tracks_reference(dialogue_tracks, script_text, mood, music_intensity, ducking_db)
+        from services import audio_mix
+        total_dur = 0.0
+        for lt in dialogue_tracks:
+            total_dur = max(total_dur, lt.get("end", lt.get("start",0) + 0.0))
+        total_dur = max(total_dur, 1.0)
+
+        # choose every file first (same order of random draws as the reference), decode after
+        lines = []
+        for lt in dialogue_tracks:
+            ap = lt.get("audio") or lt.get("path") or lt.get("audio_path")
+            if ap and Path(ap).exists():
+                lines.append((ap, lt))
+        sfx_plan = []
+        for ev in self.detect_events(script_text):
+            sfx = self.select_sfx_for_event(ev["event"])
+            if not sfx or not Path(sfx).exists():
+                continue
+            approx_time = max(0.1, ev.get("frac", 0.0) * total_dur)
+            sfx_plan.append((ev, sfx, approx_time, random.uniform(-2.0, 1.0)))
+        amb_file = self.select_ambience(mood)
+        music_file = self.select_music(music_intensity)
+
+        rate, channels = audio_mix.mix_format([ap for ap, _ in lines] + [s[1] for s in sfx_plan] + [amb_file, music_file])
+        # library files stay decoded between mixes; dialogue lines are per-mix only
+        audio_mix.warm([s[1] for s in sfx_plan] + [amb_file, music_file], rate, channels)
+        assets = audio_mix.Assets(rate, channels).preload(
+            [ap for ap, _ in lines] + [s[1] for s in sfx_plan] + [amb_file, music_file])
+        mix = audio_mix.Mix((int(total_dur * 1000) + 2000) / 1000.0, rate, channels)
+        details = {"dialogue":[], "sfx":[], "ambience": None, "music": None}
+        # 1) dialogue
+        for ap, lt in lines:
+            seg = assets.get(ap)
+            mix.add(seg, int(lt.get("start", 0) * 1000) / 1000.0)  # ms positions, as overlay()
+            details["dialogue"].append({"path":ap, "start":lt.get("start"), "dur":len(seg)/float(rate)})
+        # 2) sfx with their random level variance
+        for ev, sfx, t, vol_change in sfx_plan:
+            mix.add(assets.get(sfx), int(t * 1000) / 1000.0, gain_db=vol_change)
+            details["sfx"].append({"event":ev["event"], "file":sfx, "time": t})
+        # 3) ambience loop, 12 dB down
+        amb = assets.get(amb_file)
+        if amb is not None and len(amb):
+            mix.add(audio_mix.loop_to(amb, mix.frames), 0, gain_db=-12)
+            details["ambience"] = {"file": str(amb_file)}
+        # 4) music: normalized, -6 dB, ducked under dialogue by one envelope, -6 dB under the master
+        music = assets.get(music_file)
+        if music is not None and len(music):
+            windows = []
+            for lt in dialogue_tracks:
+                start = lt.get("start", 0)
+                if lt.get("audio") and Path(lt.get("audio")).exists():
+                    end = lt.get("end", start + assets.secs(lt["audio"]))
+                else:
+                    end = start + (lt.get("dur", 1.0) or 1.0)
+                windows.append((int(start * 1000) / 1000.0, int(end * 1000) / 1000.0))
+            env = audio_mix.duck_envelope(mix.frames, rate, windows, ducking_db)
+            env *= audio_mix.peak_normalize_gain(music) * audio_mix.db_to_gain(-12)
+            mix.add(audio_mix.loop_to(music, mix.frames), 0, envelope=env)
+            details["music"] = {"file": str(music_file)}
+        out_name = OUT_DIR / f"final_mix_{int(random.random()*100000)}.mp3"
+        mix.normalize().export(str(out_name), "mp3", "192k")
+        return {"ok": True, "final_audio": str(out_name), "details": details}
+
+    def mix_tracks_reference(self, dialogue_tracks: List[Dict], script_text: str, mood: str | None = None, music_intensity: str | None = None, ducking_db: float = -10.0) -> Dict[str,Any]:
+        """
+        pydub renderer (reference output for the numpy mixer).
+        dialogue_tracks: list of {"path": "/path/to/line.mp3", "start": seconds, "end": seconds, "speaker": "young_male"}
         Steps:
           1) load each dialogue track and place at start time onto master (silence background)
           2) detect events from script_text and overlay SFX at approximated times
@@ -0,0 +1,100 @@
+# services/task_graph.py
+"""
+Small in-process dependency graph runner for multi-step pipelines (multi-character scenes).
+- add(name, fn, deps, resource): fn(*dep_results) runs once every dep has finished
+- each resource class (image, tts, lipsync, encode) has its own concurrency limit, so a
+  burst of TTS lines never waits behind image generation and the GPU stages stay bounded
+- a node whose dependency failed is marked skipped; nodes that want a fallback should catch
+  their own errors and return None instead of raising
+Limits come from SCENE_MAX_<RESOURCE> (e.g. SCENE_MAX_TTS=4); unknown resources default to 2.
+"""
+import os, time, threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_LIMITS = {
+    "image": int(os.getenv("SCENE_MAX_IMAGE", "1")),
+    "tts": int(os.getenv("SCENE_MAX_TTS", "4")),
+    "lipsync": int(os.getenv("SCENE_MAX_LIPSYNC", os.getenv("LIPSYNC_WORKERS", "2"))),
+    "encode": int(os.getenv("SCENE_MAX_ENCODE", "2")),
+    "cpu": int(os.getenv("SCENE_MAX_CPU", str(os.cpu_count() or 2))),
+}
+
+
+class TaskGraph:
+    def __init__(self, limits: dict | None = None):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.nodes = {}   # name -> {"fn", "deps", "resource"}
+        self.order = []
+        self.results = {}  # name -> {"ok", "result"|"error", "secs"}
+
+    def add(self, name: str, fn, deps=(), resource: str | None = "cpu"):
+        if name in self.nodes:
+            raise ValueError(f"duplicate node: {name}")
+        for d in deps:
+            if d not in self.nodes:
+                raise ValueError(f"{name}: unknown dependency {d} (add dependencies first)")
+        self.nodes[name] = {"fn": fn, "deps": list(deps), "resource": resource or "cpu"}
+        self.order.append(name)
+        return name
+
+    def result(self, name: str):
+        return self.results.get(name, {}).get("result")
+
+    def _call(self, name):
+        node = self.nodes[name]
+        t0 = time.time()
+        out = node["fn"](*[self.results[d]["result"] for d in node["deps"]])
+        return out, round(time.time() - t0, 3)
+
+    def run(self) -> dict:
+        """Run every node, respecting dependencies and per-resource limits. Returns name -> status."""
+        waiting = {n: set(self.nodes[n]["deps"]) for n in self.order}
+        dependents = {n: [] for n in self.order}
+        for n in self.order:
+            for d in self.nodes[n]["deps"]:
+                dependents[d].append(n)
+        ready = [n for n in self.order if not waiting[n]]
+        running = {}  # future -> name
+        busy = {}
+        workers = max(1, sum(self.limits.values()))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="graph") as pool:
+            while ready or running:
+                # start whatever the resource limits allow, in insertion order
+                still = []
+                for n in ready:
+                    res = self.nodes[n]["resource"]
+                    if busy.get(res, 0) < self.limits.get(res, 2):
+                        busy[res] = busy.get(res, 0) + 1
+                        running[pool.submit(self._call, n)] = n
+                    else:
+                        still.append(n)
+                ready = still
+                if not running:
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    n = running.pop(fut)
+                    busy[self.nodes[n]["resource"]] -= 1
+                    try:
+                        out, secs = fut.result()
+                        self.results[n] = {"ok": True, "result": out, "secs": secs}
+                    except Exception as e:
+                        self.results[n] = {"ok": False, "result": None, "error": str(e)}
+                    for m in dependents[n]:
+                        waiting[m].discard(n)
+                        if waiting[m]:
+                            continue
+                        failed = [d for d in self.nodes[m]["deps"] if not self.results[d]["ok"]]
+                        if failed:
+                            self._skip(m, failed, dependents, waiting)
+                        else:
+                            ready.append(m)
+        return self.results
+
+    def _skip(self, name, failed, dependents, waiting):
+        self.results[name] = {"ok": False, "result": None, "skipped": True,
+                              "error": f"dependency failed: {', '.join(failed)}"}
+        for m in dependents[name]:
+            waiting[m].discard(name)
+            if not waiting[m]:
+                self._skip(m, [name], dependents, waiting)
@@ -0,0 +1,127 @@
+# services/tts_cache.py
+"""
+Content-addressed cache for synthesized speech, shared by every TTS path on a host.
+- key = sha256 of (engine, model, voice, params, normalized text); stable across restarts
+- audio lives under cache/tts/<kk>/<key><ext> (override with TTS_CACHE_DIR)
+- a small SQLite index tracks size + last use; least recently used entries are evicted once
+  the cache grows past TTS_CACHE_MAX_MB
+- fetch(key, dest) copies a hit to the caller's output path, so callers that expect their own
+  filename keep working (a copy, not a link: engines rewrite output paths in place)
+"""
+import os, re, json, shutil, sqlite3, hashlib, threading, time, unicodedata
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", "cache/tts"))
+MAX_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+ENABLED = os.getenv("TTS_CACHE", "1") != "0"
+
+_local = threading.local()
+
+
+def normalize_text(text: str) -> str:
+    # same words, same audio: unicode-normalize and collapse whitespace
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def make_key(engine: str, text: str, model: str | None = None, voice: str | None = None, **params) -> str:
+    blob = json.dumps({"engine": engine, "model": model, "voice": voice,
+                       "params": {k: v for k, v in sorted(params.items()) if v is not None},
+                       "text": normalize_text(text)}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(CACHE_DIR / "index.db"), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, path TEXT, size INTEGER, last_used REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_lru ON entries(last_used)")
+        _local.conn = conn
+    return conn
+
+
+def lookup(key: str) -> str | None:
+    """Cached file path for key (refreshes its LRU stamp), or None."""
+    if not ENABLED:
+        return None
+    conn = _conn()
+    row = conn.execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+    if not row:
+        return None
+    if not Path(row[0]).exists():
+        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        return None
+    conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+    return row[0]
+
+
+def _place(src: str, dest: str):
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.resolve() == Path(src).resolve():
+        return
+    shutil.copyfile(src, dest)
+
+
+def fetch(key: str, dest: str | None = None) -> str | None:
+    """On a hit, put the cached audio at dest (if given) and return the usable path."""
+    path = lookup(key)
+    if path is None:
+        return None
+    if dest:
+        _place(path, dest)
+        return str(dest)
+    return path
+
+
+def store(key: str, src: str) -> str | None:
+    """Add a freshly synthesized file under key; returns the cache path."""
+    if not ENABLED or not src or not Path(src).exists():
+        return None
+    ext = Path(src).suffix or ".audio"
+    dst = CACHE_DIR / key[:2] / f"{key}{ext}"
+    if not dst.exists():
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_suffix(dst.suffix + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    conn = _conn()
+    conn.execute("INSERT OR REPLACE INTO entries(key, path, size, last_used) VALUES (?,?,?,?)",
+                 (key, str(dst), dst.stat().st_size, time.time()))
+    evict()
+    return str(dst)
+
+
+def evict(max_bytes: int = MAX_BYTES):
+    conn = _conn()
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    for key, path, size in conn.execute("SELECT key, path, size FROM entries ORDER BY last_used ASC").fetchall():
+        if total <= max_bytes:
+            break
+        try:
+            Path(path).unlink()
+        except OSError:
+            pass
+        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        total -= size or 0
+        removed += 1
+    return removed
+
+
+def cached(key: str, dest: str, synth):
+    """
+    Run synth() only on a miss. synth() must write the audio and return its path (or None).
+    Returns (path, hit).
+    """
+    hit = fetch(key, dest)
+    if hit:
+        return hit, True
+    out = synth()
+    if out:
+        store(key, out)
+    return out, False
@@ -1,56 +1,231 @@
 # services/tts_client.py
-import os
+"""
+Client for the TTS server (app_tts.py).
+- one long-lived httpx.AsyncClient per (event loop, server) at module level, shared by every TTSClient
+  instance (pooled keep-alive connections), not one per line or per instance; default_client() is
+  the process-wide instance for callers that do not need their own settings
+- the sync facade (synthesize / synthesize_many) runs on a shared background event loop thread
+  instead of asyncio.run per call, so threads in a scene pipeline share the same pool
+- results are streamed straight to disk (or copied when the server wrote them on this host)
+- synthesize_many sends lines to /tts/speak_batch in groups of TTS_CLIENT_BATCH and downloads
+  the files concurrently; a server without that route (404 / 405, e.g. the main app's /tts router)
+  gets the lines as concurrent /tts/speak calls instead, and is remembered as batch-less
+- the default server is the per-host resident one (app_tts, TTS_RESIDENT_URL, port 8010), which
+  serves both routes; TTS_SERVER_URL overrides it
+- pools of event loops that have been closed (asyncio.run callers) are dropped on the next lookup
+- local services/tts_cache hits skip the server entirely
+"""
+import os, shutil, asyncio, threading, atexit
 from pathlib import Path
 import httpx
 from typing import Optional
+from services import tts_cache
 
-TTS_SERVER_URL = os.getenv("TTS_SERVER_URL", "http://127.0.0.1:8000")  # change if remote
+TTS_SERVER_URL = os.getenv("TTS_SERVER_URL", os.getenv("TTS_RESIDENT_URL", "http://127.0.0.1:8010"))  # change if remote
+MAX_CONNECTIONS = int(os.getenv("TTS_CLIENT_MAX_CONNECTIONS", "32"))
+BATCH_SIZE = int(os.getenv("TTS_CLIENT_BATCH", "32"))
 
 # ensure outputs dir exists locally for downloaded files
 LOCAL_OUT_DIR = Path("static/outputs")
 LOCAL_OUT_DIR.mkdir(parents=True, exist_ok=True)
 
+_loop = None
+_loop_lock = threading.Lock()
+_clients = {}  # (event loop, base_url) -> httpx.AsyncClient
+_sems = {}     # event loop -> download semaphore
+_no_batch = set()  # base_urls that answered /tts/speak_batch with 404 / 405
+_default = None
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop thread shared by every sync caller in this process."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True, name="tts-client-loop").start()
+        return _loop
+
+
+def _http(base_url: str) -> httpx.AsyncClient:
+    """Pooled client for base_url on the running loop (only ever touched from that loop)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get((loop, base_url))
+    if client is None or client.is_closed:
+        # forget pools (and semaphores) of loops that are gone; their connections died with them
+        for key in [k for k in _clients if k[0].is_closed()]:
+            _clients.pop(key, None)
+        for lp in [lp for lp in _sems if lp.is_closed()]:
+            _sems.pop(lp, None)
+        client = _clients[(loop, base_url)] = httpx.AsyncClient(
+            base_url=base_url, limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS))
+    if loop not in _sems:
+        _sems[loop] = asyncio.Semaphore(MAX_CONNECTIONS)
+    return client
+
+
+def close_all():
+    """Close the pools on the background loop (other loops' clients close with their loop)."""
+    loop = _loop
+    if loop is None or not loop.is_running():
+        return
+    for key in [k for k in _clients if k[0] is loop]:
+        try:
+            asyncio.run_coroutine_threadsafe(_clients.pop(key).aclose(), loop).result(5)
+        except Exception:
+            pass
+
+atexit.register(close_all)
+
+
+def default_client() -> "TTSClient":
+    """Process-wide TTSClient for TTS_SERVER_URL."""
+    global _default
+    with _loop_lock:
+        if _default is None:
+            _default = TTSClient()
+        return _default
+
+
+def _cache_key(text, voice, model_name, language):
+    # same key the resident server uses for coqui lines: a local hit needs no request at all
+    return tts_cache.make_key("coqui", text, model=model_name or os.getenv("TTS_DEFAULT_MODEL", "tts_models/en/ljspeech/tacotron2-DDC"),
+                              voice=voice, language=language)
+
+
 class TTSClient:
     def __init__(self, base_url: str | None = None, timeout: int = 60):
         self.base_url = base_url or TTS_SERVER_URL
         self.timeout = timeout
 
-    async def synthesize_async(self, text: str, filename: Optional[str] = None) -> dict:
+    def _http(self) -> httpx.AsyncClient:
+        return _http(self.base_url)
+
+    async def _fetch(self, resp: dict, local_path: Path) -> str:
+        """Put the server's file at local_path: copy when it is on this host, else stream it down."""
+        abs_path = resp.get("abs_path")
+        if abs_path and Path(abs_path).exists():
+            if Path(abs_path).resolve() != local_path.resolve():
+                shutil.copyfile(abs_path, local_path)
+            return str(local_path)
+        client = self._http()
+        tmp = local_path.with_name(local_path.name + ".part")
+        async with _sems[asyncio.get_running_loop()]:
+            async with client.stream("GET", f"/static/outputs/{Path(resp['file']).name}", timeout=self.timeout) as r:
+                r.raise_for_status()
+                with open(tmp, "wb") as fh:
+                    async for chunk in r.aiter_bytes(65536):
+                        fh.write(chunk)
+        tmp.replace(local_path)
+        return str(local_path)
+
+    async def _finish(self, resp: dict) -> dict:
+        remote_path = resp.get("file")
+        if not remote_path:
+            raise RuntimeError("TTS server did not return file path")
+        local_path = LOCAL_OUT_DIR / Path(remote_path).name
+        try:
+            await self._fetch(resp, local_path)
+        except Exception as e:
+            # If download fails, still return remote path
+            return {"ok": True, "remote_file": remote_path, "downloaded": None, "error": str(e)}
+        if resp.get("cache_key"):
+            tts_cache.store(resp["cache_key"], str(local_path))
+        return {"ok": True, "remote_file": remote_path, "downloaded": str(local_path)}
+
+    @staticmethod
+    def _payload(text, filename=None, voice=None, model_name=None, language=None) -> dict:
+        payload = {"text": text, "filename": filename, "speaker": voice, "model_name": model_name, "language": language}
+        return {k: v for k, v in payload.items() if v}
+
+    async def synthesize_async(self, text: str, filename: Optional[str] = None, voice: Optional[str] = None,
+                               model_name: Optional[str] = None, language: Optional[str] = None) -> dict:
         """
         Calls external TTS server async and returns a dict:
         {"ok": True, "remote_file": "static/outputs/xyz.mp3", "downloaded": "static/outputs/xyz.mp3"}
+        voice / model_name / language select the resident model + speaker on the server.
+        """
+        key = _cache_key(text, voice, model_name, language)
+        hit = tts_cache.fetch(key, str(LOCAL_OUT_DIR / (filename or f"tts_{key[:16]}.mp3")))
+        if hit:
+            return {"ok": True, "remote_file": None, "downloaded": hit, "cached": True}
+        r = await self._http().post("/tts/speak", json=self._payload(text, filename, voice, model_name, language),
+                                    timeout=self.timeout)
+        r.raise_for_status()
+        return await self._finish(r.json())
+
+    async def synthesize_many_async(self, items: list) -> list:
+        """
+        items: [{"text", "filename"?, "voice"?, "model_name"?, "language"?}] -> results in the same order.
+        Cache misses go to /tts/speak_batch in groups of BATCH_SIZE; downloads run concurrently.
         """
-        payload = {"text": text}
-        if filename:
-            payload["filename"] = filename
+        out, misses = [None] * len(items), []
+        for i, it in enumerate(items):
+            key = _cache_key(it["text"], it.get("voice"), it.get("model_name"), it.get("language"))
+            hit = tts_cache.fetch(key, str(LOCAL_OUT_DIR / (it.get("filename") or f"tts_{key[:16]}.mp3")))
+            if hit:
+                out[i] = {"ok": True, "remote_file": None, "downloaded": hit, "cached": True}
+            else:
+                misses.append(i)
 
-        url = f"{self.base_url}/tts/speak"
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            r = await client.post(url, json=payload)
+        async def single(i):
+            it = items[i]
+            try:
+                return await self.synthesize_async(it["text"], it.get("filename"), voice=it.get("voice"),
+                                                   model_name=it.get("model_name"), language=it.get("language"))
+            except Exception as e:
+                return {"ok": False, "error": str(e)}
+
+        async def group(idx):
+            if self.base_url not in _no_batch:
+                r = await self._http().post("/tts/speak_batch", json={"items": [
+                    self._payload(items[i]["text"], items[i].get("filename"), items[i].get("voice"),
+                                  items[i].get("model_name"), items[i].get("language")) for i in idx]},
+                    timeout=self.timeout)
+                if r.status_code in (404, 405):
+                    _no_batch.add(self.base_url)
+            if self.base_url in _no_batch:
+                # no batch route on this server: one /tts/speak per line, still concurrent
+                for i, res in zip(idx, await asyncio.gather(*(single(i) for i in idx))):
+                    out[i] = res
+                return
             r.raise_for_status()
-            resp = r.json()
+            results = r.json().get("results", [])
 
-        remote_path = resp.get("file")
-        if not remote_path:
-            raise RuntimeError("TTS server did not return file path")
+            async def one(i, resp):
+                if not resp.get("ok"):
+                    return {"ok": False, "error": resp.get("error")}
+                return await self._finish(resp)
+            done = await asyncio.gather(*(one(i, resp) for i, resp in zip(idx, results)))
+            for i, res in zip(idx, done):
+                out[i] = res
 
-        # Attempt to download the produced file (if accessible)
-        # remote file may be served at e.g. http://server/static/outputs/<name>
-        file_name = Path(remote_path).name
-        file_url = f"{self.base_url}/static/outputs/{file_name}"
-        local_path = LOCAL_OUT_DIR / file_name
+        groups = [misses[k:k + BATCH_SIZE] for k in range(0, len(misses), BATCH_SIZE)]
+        failed = await asyncio.gather(*(group(g) for g in groups), return_exceptions=True)
+        for g, err in zip(groups, failed):
+            if isinstance(err, Exception):
+                for i in g:
+                    out[i] = out[i] or {"ok": False, "error": str(err)}
+        return out
 
+    def _run(self, coro, timeout=None):
+        loop = _background_loop()
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                dr = await client.get(file_url)
-                dr.raise_for_status()
-                local_path.write_bytes(dr.content)
-        except Exception as e:
-            # If download fails, still return remote path
-            return {"ok": True, "remote_file": remote_path, "downloaded": None, "error": str(e)}
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError("TTSClient sync call from the client loop itself; await the *_async method")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
 
-        return {"ok": True, "remote_file": remote_path, "downloaded": str(local_path)}
+    def synthesize(self, text: str, filename: Optional[str] = None, voice: Optional[str] = None,
+                   model_name: Optional[str] = None, language: Optional[str] = None) -> dict:
+        return self._run(self.synthesize_async(text, filename, voice=voice, model_name=model_name, language=language))
+
+    def synthesize_many(self, items: list) -> list:
+        return self._run(self.synthesize_many_async(items))
 
-    def synthesize(self, text: str, filename: Optional[str] = None) -> dict:
-        import asyncio
-        return asyncio.run(self.synthesize_async(text, filename))
+    def close(self):
+        """Pools are shared by every instance; kept for callers that still call close()."""
+        close_all()
@@ -0,0 +1,207 @@
+# services/tts_resident.py
+"""
+Resident Coqui TTS shared by every caller on a host.
+Server side (used by app_tts.py, the per-host TTS server: uvicorn app_tts:app --port 8010):
+- models stay loaded, keyed by model name; one worker thread per model owns it, so
+  access is serialised without a lock around every caller
+- concurrent requests are queued and drained in batches (grouped by speaker) so a burst
+  of short lines runs back-to-back on the warm model
+- every request checks services/tts_cache first (key: model, speaker, language, text), so
+  unchanged lines are never synthesized twice
+Client side (routes/tts.py, services/tts_service.py, falcon_tts_engine):
+- speak(text, ...) posts to the resident server (TTS_RESIDENT_URL) over a pooled HTTP client;
+  TTS_RESIDENT_MODE=local (or an unreachable server) uses this process's own pool instead
+"""
+import os, time, queue, threading
+from concurrent.futures import Future
+from pathlib import Path
+from services import tts_cache
+
+try:
+    import httpx
+    _HAS_HTTPX = True
+except Exception:
+    _HAS_HTTPX = False
+
+DEFAULT_MODEL = os.getenv("TTS_DEFAULT_MODEL", "tts_models/en/ljspeech/tacotron2-DDC")
+# not the main API port: routes/tts.py itself forwards here
+TTS_RESIDENT_URL = os.getenv("TTS_RESIDENT_URL", "http://127.0.0.1:8010")
+RESIDENT_MODE = os.getenv("TTS_RESIDENT_MODE", "server")  # server | local
+BATCH_WINDOW = float(os.getenv("TTS_BATCH_WINDOW_MS", "15")) / 1000.0
+MAX_BATCH = int(os.getenv("TTS_MAX_BATCH", "16"))
+
+OUT_DIR = Path("static/outputs")
+
+
+class _ModelSlot:
+    """One warm model + the thread that owns it."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.model = None
+        self.q = queue.Queue()
+        self.loaded_at = None
+        self.served = 0
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"tts-{model_name}")
+        self.thread.start()
+
+    def _load(self):
+        if self.model is None:
+            from TTS.api import TTS
+            print("Loading Coqui model:", self.model_name)
+            self.model = TTS(self.model_name)
+            self.loaded_at = time.time()
+        return self.model
+
+    def _run(self):
+        while True:
+            batch = [self.q.get()]
+            # collect whatever else arrives within the batch window
+            deadline = time.time() + BATCH_WINDOW
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self.q.get(timeout=max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            batch.sort(key=lambda job: str(job[0].get("speaker")))
+            for req, fut in batch:
+                if fut.set_running_or_notify_cancel():
+                    try:
+                        fut.set_result(self._synth(req))
+                    except Exception as e:
+                        fut.set_exception(e)
+
+    def _synth(self, req: dict) -> str:
+        model = self._load()
+        if req.get("warm_only"):
+            return ""
+        kwargs = {"text": req["text"], "file_path": req["out_path"]}
+        if req.get("speaker") and getattr(model, "is_multi_speaker", False):
+            kwargs["speaker"] = req["speaker"]
+        if req.get("language") and getattr(model, "is_multi_lingual", False):
+            kwargs["language"] = req["language"]
+        model.tts_to_file(**kwargs)
+        self.served += 1
+        return req["out_path"]
+
+    def submit(self, req: dict) -> Future:
+        fut = Future()
+        self.q.put((req, fut))
+        return fut
+
+
+_slots = {}
+_slots_lock = threading.Lock()
+
+
+def get_slot(model_name: str | None = None) -> _ModelSlot:
+    name = model_name or DEFAULT_MODEL
+    with _slots_lock:
+        slot = _slots.get(name)
+        if slot is None:
+            slot = _slots[name] = _ModelSlot(name)
+        return slot
+
+
+def warm(model_name: str | None = None):
+    """Load a model ahead of the first request (server startup)."""
+    slot = get_slot(model_name)
+    slot.submit({"warm_only": True, "text": "", "out_path": ""}).result()
+    return slot
+
+
+def cache_key(text: str, model_name: str | None = None, speaker: str | None = None, language: str | None = None) -> str:
+    return tts_cache.make_key("coqui", text, model=model_name or DEFAULT_MODEL, voice=speaker, language=language)
+
+
+def synthesize_local(text: str, out_path: str, model_name: str | None = None, speaker: str | None = None,
+                     language: str | None = None, timeout: float | None = 600) -> str:
+    """Synthesize on this process's resident model (cache first); blocks until the batch worker is done."""
+    return synthesize_many_local([{"text": text, "out_path": out_path, "speaker": speaker, "language": language}],
+                                 model_name, timeout)[0]
+
+
+def synthesize_many_local(items: list, model_name: str | None = None, timeout: float | None = 600) -> list:
+    """items: [{"text", "out_path", "speaker"?, "language"?}] -> paths; cache misses are queued as one batch."""
+    slot = get_slot(model_name)
+    out, misses = [None] * len(items), []
+    for i, it in enumerate(items):
+        key = cache_key(it["text"], model_name, it.get("speaker"), it.get("language"))
+        hit = tts_cache.fetch(key, str(it["out_path"]))
+        if hit:
+            out[i] = hit
+        else:
+            misses.append((i, key, slot.submit({"text": it["text"], "out_path": str(it["out_path"]),
+                                                "speaker": it.get("speaker"), "language": it.get("language")})))
+    for i, key, fut in misses:
+        out[i] = fut.result(timeout=timeout)
+        tts_cache.store(key, out[i])
+    return out
+
+
+def status():
+    return {name: {"loaded": s.model is not None, "loaded_at": s.loaded_at, "served": s.served,
+                   "queued": s.q.qsize()} for name, s in _slots.items()}
+
+
+# ---------- client side ----------
+
+_http = None
+_http_lock = threading.Lock()
+
+
+def _client():
+    global _http
+    with _http_lock:
+        if _http is None:
+            _http = httpx.Client(base_url=TTS_RESIDENT_URL, timeout=600,
+                                 limits=httpx.Limits(max_keepalive_connections=8, max_connections=32))
+        return _http
+
+
+def speak(text: str, filename: str | None = None, model_name: str | None = None, speaker: str | None = None,
+          language: str | None = None, out_dir: str | Path | None = None) -> dict:
+    """
+    Synthesize through the host's resident TTS server; returns {"ok", "path"} or {"ok": False, "error"}.
+    Falls back to this process's pool when TTS_RESIDENT_MODE=local or the server is unreachable.
+    """
+    out_dir = Path(out_dir or OUT_DIR)
+    key = cache_key(text, model_name, speaker, language)
+    filename = filename or f"tts_{key[:16]}.wav"
+    # same host shares the cache: a hit skips the server round trip entirely
+    hit = tts_cache.fetch(key, str(out_dir / filename))
+    if hit:
+        return {"ok": True, "path": hit, "via": "cache"}
+    if RESIDENT_MODE != "local" and _HAS_HTTPX:
+        try:
+            payload = {"text": text, "filename": filename, "model_name": model_name,
+                       "speaker": speaker, "language": language}
+            r = _client().post("/tts/speak", json={k: v for k, v in payload.items() if v is not None})
+            r.raise_for_status()
+            resp = r.json()
+            path = resp.get("abs_path") or resp.get("file")
+            if path and Path(path).exists():
+                if out_dir != OUT_DIR:
+                    dst = out_dir / Path(path).name
+                    out_dir.mkdir(parents=True, exist_ok=True)
+                    dst.write_bytes(Path(path).read_bytes())
+                    path = str(dst)
+                return {"ok": True, "path": path, "via": "server"}
+            # server on another filesystem: fetch the file
+            name = Path(resp.get("file", "")).name
+            dr = _client().get(f"/static/outputs/{name}")
+            dr.raise_for_status()
+            out_dir.mkdir(parents=True, exist_ok=True)
+            dst = out_dir / name
+            dst.write_bytes(dr.content)
+            return {"ok": True, "path": str(dst), "via": "server"}
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            pass  # no resident server on this host: use a local pool
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+    try:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out_path = out_dir / filename
+        return {"ok": True, "path": synthesize_local(text, str(out_path), model_name, speaker, language), "via": "local"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
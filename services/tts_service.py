@@ -6,18 +6,23 @@ Produces saved wav path.
 """
 import os, uuid
 from pathlib import Path
+from services import tts_resident, tts_cache
+
+COQUI_MODEL = os.getenv("TTS_MULTILINGUAL_MODEL", "tts_models/multilingual/multi-dataset/your_tts")  # choose installed model
 
 OUT_DIR = Path("assets/tts")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def tts_coqui(text, lang="en", voice="random", out_name=None):
+def tts_coqui(text, lang="en", voice="random", out_name=None, model_name=None):
+    # goes through the host's resident TTS server (warm model) instead of loading one per call
     try:
-        from TTS.api import TTS
-        model_name = "tts_models/multilingual/multi-dataset/your_tts"  # placeholder; choose installed model
-        tts = TTS(model_name)
-        out_file = OUT_DIR / (out_name or f"tts_{uuid.uuid4().hex}.wav")
-        tts.tts_to_file(text=text, file_path=str(out_file))
-        return {"ok": True, "path": str(out_file)}
+        res = tts_resident.speak(text, filename=out_name,
+                                 model_name=model_name or COQUI_MODEL,
+                                 speaker=None if voice in (None, "random") else voice,
+                                 language=lang, out_dir=OUT_DIR)
+        if not res.get("ok"):
+            return {"ok": False, "error": res.get("error")}
+        return {"ok": True, "path": res["path"]}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
@@ -27,9 +32,13 @@ def tts_pyttsx3(text, lang="en", voice=None, out_name=None):
         engine = pyttsx3.init()
         if voice:
             engine.setProperty('voice', voice)
-        out_file = OUT_DIR / (out_name or f"tts_{uuid.uuid4().hex}.wav")
-        engine.save_to_file(text, str(out_file))
-        engine.runAndWait()
-        return {"ok": True, "path": str(out_file)}
+        key = tts_cache.make_key("pyttsx3", text, voice=voice, lang=lang)
+        out_file = OUT_DIR / (out_name or f"tts_{key[:16]}.wav")
+        def synth():
+            engine.save_to_file(text, str(out_file))
+            engine.runAndWait()
+            return str(out_file)
+        path, _ = tts_cache.cached(key, str(out_file), synth)
+        return {"ok": True, "path": path}
     except Exception as e:
         return {"ok": False, "error": str(e)}
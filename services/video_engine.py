@@ -1,7 +1,13 @@
 # services/video_engine.py
 import os
+import json
+import shlex
+import shutil
+import subprocess
+import tempfile
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List
+from services import media_probe
 import hashlib
 import time
 
@@ -25,6 +31,147 @@ except Exception as e:
     print("moviepy not available:", e)
     _HAS_MOVIEPY = False
 
+# Every per-line clip (still+audio here, lip-sync in services/lipsync_worker) is encoded with
+# these parameters so a scene can be assembled with a container-level concat (-c copy).
+CLIP_FPS = 24
+CLIP_SIZE = {True: (1080, 1920), False: (1280, 720)}  # vertical -> size
+CLIP_AUDIO_RATE = 44100
+STILL_GOP_SECS = float(os.getenv("CLIP_STILL_GOP_SECS", "1"))  # length of the looped still segment
+STILL_CACHE = Path(os.getenv("CLIP_STILL_CACHE", "cache/stills"))
+
+
+def clip_encode_args(width: int, height: int, fps: int = CLIP_FPS) -> List[str]:
+    """ffmpeg output args for a concat-compatible clip (fit + pad to width x height)."""
+    vf = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+          f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color=black,setsar=1,fps={fps}")
+    # no B-frames: decode order == display order, so clips cut/loop on exact frames under -c copy
+    return ["-vf", vf, "-c:v", "libx264", "-preset", os.getenv("CLIP_X264_PRESET", "veryfast"), "-crf", "20",
+            "-bf", "0", "-pix_fmt", "yuv420p", "-r", str(fps), "-video_track_timescale", str(fps * 512),
+            "-c:a", "aac", "-b:a", "160k", "-ar", str(CLIP_AUDIO_RATE), "-ac", "2"]
+
+
+def _audio_params(path: str):
+    """(codec, sample_rate, channels, duration) from the file headers."""
+    info = media_probe.probe(path)
+    return info.get("codec"), int(info.get("sample_rate") or 0), int(info.get("channels") or 0), float(info.get("duration") or 0)
+
+
+def still_segment(image_path: str, width: int, height: int, fps: int = CLIP_FPS) -> str:
+    """
+    Encode a still once as a short closed GOP (one keyframe, tune stillimage) and cache it per
+    (image content, size, fps); still_clip loops it with -c:v copy for any line length.
+    """
+    st = os.stat(image_path)
+    key = hashlib.sha1(f"{Path(image_path).resolve()}|{st.st_size}|{st.st_mtime_ns}|{width}x{height}@{fps}|{STILL_GOP_SECS}"
+                       .encode("utf-8")).hexdigest()[:20]
+    seg = STILL_CACHE / f"still_{key}.mp4"
+    if seg.exists():
+        return str(seg)
+    seg.parent.mkdir(parents=True, exist_ok=True)
+    gop = str(max(1, int(round(STILL_GOP_SECS * fps))))
+    tmp = seg.with_suffix(f".{os.getpid()}.tmp.mp4")
+    cmd = ["ffmpeg", "-y", "-v", "error", "-loop", "1", "-framerate", str(fps), "-i", str(image_path),
+           "-t", str(STILL_GOP_SECS), "-an", *clip_encode_args(width, height, fps),
+           "-tune", "stillimage", "-g", gop, "-keyint_min", gop, "-sc_threshold", "0", str(tmp)]
+    p = subprocess.run(cmd, capture_output=True, text=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"still encode failed: {p.stderr[-2000:]}")
+    os.replace(tmp, seg)
+    return str(seg)
+
+
+def still_clip(image_path: str, audio_path: str, out_path: str, vertical: bool = True) -> str:
+    """
+    Still + audio line clip in the scene clip profile, without re-encoding any video per line:
+    the cached still segment is stream-looped (-c:v copy) for the audio's length. Audio is copied
+    when it is already AAC at the profile rate/layout, otherwise encoded (cheap next to video).
+    """
+    w, h = CLIP_SIZE[bool(vertical)]
+    seg = still_segment(image_path, w, h)
+    codec, rate, channels, dur = _audio_params(audio_path)
+    if dur <= 0:
+        raise RuntimeError(f"could not read audio duration: {audio_path}")
+    if (codec, rate, channels) == ("aac", CLIP_AUDIO_RATE, 2):
+        aargs = ["-c:a", "copy"]
+    else:
+        aargs = ["-c:a", "aac", "-b:a", "160k", "-ar", str(CLIP_AUDIO_RATE), "-ac", "2"]
+    # bounded loop count + exact frame count (an endless loop with -shortest never ends under -c copy)
+    loops = int(dur // STILL_GOP_SECS) + 1
+    cmd = ["ffmpeg", "-y", "-v", "error", "-stream_loop", str(loops), "-i", seg, "-i", str(audio_path),
+           "-map", "0:v", "-map", "1:a", "-c:v", "copy", *aargs,
+           "-frames:v", str(max(1, int(round(dur * CLIP_FPS)))), "-t", f"{dur:.3f}",
+           "-video_track_timescale", str(CLIP_FPS * 512), "-movflags", "+faststart", str(out_path)]
+    p = subprocess.run(cmd, capture_output=True, text=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {p.stderr[-2000:]}")
+    return str(out_path)
+
+
+def _stream_sig(path: str):
+    """(video params, audio params) that must match for a stream-copy concat."""
+    cmd = ["ffprobe", "-v", "error", "-show_entries",
+           "stream=codec_type,codec_name,profile,width,height,pix_fmt,r_frame_rate,time_base,sample_rate,channels,extradata_hash",
+           "-show_data_hash", "sha256", "-of", "json", str(path)]
+    p = subprocess.run(cmd, capture_output=True, text=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {path}: {p.stderr[-500:]}")
+    streams = json.loads(p.stdout or "{}").get("streams", [])
+    v = next((s for s in streams if s.get("codec_type") == "video"), None)
+    a = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    vk = ("codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate", "time_base", "extradata_hash")
+    ak = ("codec_name", "sample_rate", "channels")
+    return (tuple(v.get(k) for k in vk) if v else None, tuple(a.get(k) for k in ak) if a else None)
+
+
+def concat_clips(paths: List[str], out_path: str, vertical: bool = True, force_reencode: bool = False) -> dict:
+    """
+    Join clips in order. Inputs with identical stream parameters are joined losslessly with the
+    concat demuxer (-c copy: no decode, time independent of pixel count); anything mismatched
+    falls back to one re-encode through the concat filter.
+    Returns {"ok", "path", "mode": "copy"|"reencode"} or {"ok": False, "error"}.
+    """
+    paths = [str(p) for p in paths if p]
+    if not paths:
+        return {"ok": False, "error": "no clips"}
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    sigs = set()
+    if not force_reencode:
+        try:
+            sigs = {_stream_sig(p) for p in paths}
+        except Exception as e:
+            print("concat probe failed, re-encoding:", e)
+            sigs = {None, "probe_failed"}
+    if len(sigs) == 1:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as lf:
+            for p in paths:
+                lf.write("file " + shlex.quote(str(Path(p).resolve())) + "\n")
+        try:
+            cmd = ["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", lf.name,
+                   "-c", "copy", "-movflags", "+faststart", str(out_path)]
+            p = subprocess.run(cmd, capture_output=True, text=True)
+        finally:
+            os.unlink(lf.name)
+        if p.returncode == 0:
+            return {"ok": True, "path": str(out_path), "mode": "copy"}
+        print("stream-copy concat failed, re-encoding:", p.stderr[-500:])
+    # fallback: normalise every input to the clip profile and encode once
+    w, h = CLIP_SIZE[bool(vertical)]
+    cmd = ["ffmpeg", "-y", "-v", "error"]
+    for p in paths:
+        cmd += ["-i", p]
+    fit = (f"scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:color=black,"
+           f"setsar=1,fps={CLIP_FPS},format=yuv420p")
+    graph = "".join(f"[{i}:v]{fit}[v{i}];[{i}:a]aresample={CLIP_AUDIO_RATE},"
+                    f"aformat=channel_layouts=stereo[a{i}];" for i in range(len(paths)))
+    graph += "".join(f"[v{i}][a{i}]" for i in range(len(paths))) + f"concat=n={len(paths)}:v=1:a=1[v][a]"
+    cmd += ["-filter_complex", graph, "-map", "[v]", "-map", "[a]", "-c:v", "libx264", "-preset", "veryfast",
+            "-crf", "20", "-pix_fmt", "yuv420p", "-c:a", "aac", "-b:a", "160k", "-movflags", "+faststart", str(out_path)]
+    p = subprocess.run(cmd, capture_output=True, text=True)
+    if p.returncode != 0:
+        return {"ok": False, "error": p.stderr[-2000:]}
+    return {"ok": True, "path": str(out_path), "mode": "reencode"}
+
+
 class VideoService:
     def __init__(self):
         self.out_dir = OUT_DIR
@@ -35,12 +182,12 @@ class VideoService:
 
     def make_simple_video(self, image_path: str, audio_path: str, out_filename: Optional[str] = None, vertical: bool = False, add_subtitles: bool = False, subtitle_text: Optional[str] = None) -> str:
         """
-        Simple moviepy-based video: shows the image for the length of audio and adds audio.
+        Shows the image for the length of audio and adds audio.
+        Without a subtitle overlay this is still_clip (cached still segment, no per-line video
+        encode); with one, moviepy renders it. Both use the scene clip profile, so clips can be
+        stream-copy concatenated.
         Returns relative path to mp4.
         """
-        if not _HAS_MOVIEPY:
-            raise RuntimeError("moviepy not installed")
-
         img_p = Path(image_path)
         aud_p = Path(audio_path)
         if not img_p.exists():
@@ -52,6 +199,13 @@ class VideoService:
         seed = f"{image_path}-{audio_path}-{time.time()}"
         name = out_filename or f"video_{self._safe_name(seed)}.mp4"
         out_path = self.out_dir / name
+        w, h = CLIP_SIZE[bool(vertical)]
+
+        if not (add_subtitles and subtitle_text) and shutil.which("ffmpeg"):
+            return still_clip(str(img_p), str(aud_p), str(out_path), vertical=vertical)
+
+        if not _HAS_MOVIEPY:
+            raise RuntimeError("moviepy not installed")
 
         # load audio
         audio = AudioFileClip(str(aud_p))
@@ -59,16 +213,10 @@ class VideoService:
         # create image clip lasting audio duration (or 5s fallback)
         dur = float(duration) if duration else 5.0
 
-        # decide size: vertical if requested, else keep image size
+        # fit inside the clip frame (1080x1920 vertical, 1280x720 landscape) and pad
         clip = ImageClip(str(img_p))
-        # resize for vertical shorts if needed
-        if vertical:
-            clip = clip.resize(height=1920) if clip.h < 1920 else clip.resize(height=1920)
-            # crop/center to 1080x1920
-            clip = clip.on_color(size=(1080,1920), color=(0,0,0), pos=("center","center"))
-        else:
-            # default to 1280 width for landscape
-            clip = clip.resize(width=1280) if clip.w < 1280 else clip
+        clip = clip.resize(min(w / clip.w, h / clip.h))
+        clip = clip.on_color(size=(w, h), color=(0,0,0), pos=("center","center"))
 
         clip = clip.set_duration(dur).set_audio(audio)
 
@@ -86,13 +234,24 @@ class VideoService:
 
         # write file
         # Use reasonable codec settings
-        final.write_videofile(str(out_path), fps=24, codec="libx264", audio_codec="aac", threads=2, logger=None)
+        final.write_videofile(str(out_path), fps=CLIP_FPS, codec="libx264", audio_codec="aac", audio_fps=CLIP_AUDIO_RATE,
+                              threads=2, logger=None,
+                              ffmpeg_params=["-pix_fmt", "yuv420p", "-crf", "20", "-ac", "2",
+                                             "-video_track_timescale", str(CLIP_FPS * 512)])
         # close clips
         final.close()
         clip.close()
         audio.close()
         return str(out_path)
 
+    def concat_videos(self, video_paths: List[str], out_filename: Optional[str] = None, vertical: bool = True) -> str:
+        """Lossless scene assembly (see concat_clips); re-encodes only mismatched inputs."""
+        name = out_filename or f"concat_{self._safe_name(str(video_paths) + str(time.time()))}.mp4"
+        res = concat_clips(video_paths, str(self.out_dir / name), vertical=vertical)
+        if not res["ok"]:
+            raise RuntimeError(f"concat failed: {res['error']}")
+        return res["path"]
+
     def make_lipsync_wav2lip(self, image_path: str, audio_path: str, out_filename: Optional[str] = None, wav2lip_repo_path: Optional[str] = None) -> str:
         """
         If you have the Wav2Lip repo cloned and the environment set up, this function will attempt to call
@@ -159,8 +318,8 @@ class VideoService:
         elif audio_text:
             # try tts client
             try:
-                from services.tts_client import TTSClient
-                tclient = TTSClient()
+                from services.tts_client import default_client
+                tclient = default_client()
                 # use sync synthesize (it downloads file locally)
                 res = tclient.synthesize(audio_text)
                 # res: {"ok": True, "remote_file":..., "downloaded": "static/outputs/xxx.mp3"}
@@ -152,25 +152,17 @@ def export_bvh_simple(motion_list: List[Dict], out_path: str):
         lines.append("\t\t\t\tOFFSET 0.00 2.00 0.00")
         lines.append("\t\t\t}")
         lines.append("\t\t}")
+        lines.append("\t}")
         lines.append("}")
-        lines.append("MOTION")
-        frames = len(motion_list)
         frame_time = 1.0/25.0
-        lines.append(f"Frames: {frames}")
-        lines.append(f"Frame Time: {frame_time:.6f}")
-        for m in motion_list:
-            # root pos (x y z) + zeros for rotations (we keep rotations zero for root)
-            # approximate root pos using hip_y as small Y translate
-            x = 0.0; y = m.get("hip_y",0.0); z = 0.0
-            # neck rotations: Z Y X from motion (use neck_tilt, head_nod as rotation)
-            neck_z = m.get("spine_bend",0.0)
-            neck_y = m.get("neck_tilt",0.0)
-            neck_x = m.get("head_nod",0.0)
-            # neck child rotations zeros
-            lines.append(f"{x:.6f} {y:.6f} {z:.6f} 0.0 0.0 0.0 {neck_z:.6f} {neck_y:.6f} {neck_x:.6f} 0.0 0.0 0.0")
-        Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(out_path, "w") as fh:
-            fh.write("\n".join(lines))
+        # root pos (x y z) + zeros for rotations (we keep rotations zero for root)
+        # approximate root pos using hip_y as small Y translate
+        # neck rotations: Z Y X from motion (use neck_tilt, head_nod as rotation); neck child rotations zeros
+        from services.advanced_bvh import write_bvh_file
+        from services.keypoint_filters import dicts_to_array
+        motion = dicts_to_array(motion_list, ["hip_y", "spine_bend", "neck_tilt", "head_nod"])
+        write_bvh_file(out_path, lines, motion, frame_time,
+                       "0.000000 %.6f 0.000000 0.0 0.0 0.0 %.6f %.6f %.6f 0.0 0.0 0.0")
         return {"ok": True, "out": out_path}
     except Exception as e:
         return {"ok": False, "error": str(e)}
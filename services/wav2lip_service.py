@@ -4,7 +4,8 @@ Wav2Lip service wrapper
 - Searches for the Wav2Lip repo in a few common locations or uses WAV2LIP_REPO env var
 - Validates presence of required checkpoints
 - Prepares job folders and job metadata
-- Calls inference.py as a subprocess and returns rc + combined stdout/stderr
+- Runs inference on the resident lip-sync worker (services/lipsync_worker) and returns
+  rc + log text; WAV2LIP_SUBPROCESS=1 restores the one-process-per-clip inference.py call
 - Provides a helper to merge audio/video using ffmpeg
 """
 
@@ -14,9 +15,11 @@ import shutil
 import subprocess
 import tempfile
 import logging
+import json
 from pathlib import Path
 import uuid
 from typing import Dict, Optional, Tuple, List
+from services import lipsync_worker
 
 LOG = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -109,9 +112,17 @@ def prepare_job(video_path: str, audio_path: Optional[str], consent: bool, optio
 
 def run_wav2lip_raw(repo_inference_py: Path, checkpoint_path: Path, face_video: str, audio: str, out_file: str, timeout: Optional[int] = None) -> Tuple[int, str]:
     """
-    Call inference.py directly using given repo path and chosen checkpoint.
-    Returns (returncode, combined_stdout_stderr)
+    Run Wav2Lip with the given repo and checkpoint on the warm worker for that pair.
+    Returns (returncode, log)
     """
+    if os.getenv("WAV2LIP_SUBPROCESS", "0") != "1":
+        res = lipsync_worker.lipsync(face_video, audio, out_file, repo=str(Path(repo_inference_py).parent),
+                                     checkpoint=str(checkpoint_path))
+        if not res.get("ok"):
+            LOG.error("Wav2Lip worker failed: %s", res.get("error"))
+            return 1, str(res.get("error"))
+        LOG.info("Wav2Lip finished in %ss (%s frames, face cached=%s)", res.get("secs"), res.get("frames"), res.get("face_cached"))
+        return 0, json.dumps(res)
     cmd = [
         "python", str(repo_inference_py),
         "--checkpoint_path", str(checkpoint_path),
@@ -1,46 +1,180 @@
 # tasks/composite_orchestrator.py
-from celery import Celery, group, chain
-import json, os, tarfile, uuid, subprocess, shlex
+"""
+Composite orchestration as a callback-driven DAG (no task ever waits on another):
+  chord( render_chunk_task x N ) -> comp_frames_done
+                                      |-> comp_grade_task     (ffmpeg lut3d -> mp4/mov)
+                                      |-> comp_archive_task   (frames tar.gz -> upload_to_s3)
+                                      '-> comp_export_task    (Resolve XML)
+The three downstream steps only need the rendered frames, so they run side by side.
+A manifest (jobs/comp_orch/<job_id>.json) records the result ids; get_comp_progress()
+answers progress queries from the result backend. Manifest writes are locked read-modify-write
+with an atomic replace, since the orchestrator, the chord callback and the errback all update it.
+A chunk that raises (or hits its time limit) never reaches comp_frames_done; the chord errback
+comp_render_failed records status "render_failed" instead.
+"""
+from celery import Celery, group, chord
+from celery.result import AsyncResult, GroupResult
+import json, os, tarfile, uuid, subprocess, shlex, time, fcntl
+from contextlib import contextmanager
 from pathlib import Path
-from tasks.compositor_worker import render_frame_task, upload_to_s3
+from tasks.compositor_worker import render_chunk_task, upload_to_s3
 from services.resolve_export import make_resolve_xml
 
 BROKER = os.getenv("CELERY_BROKER","redis://redis:6379/0")
 app = Celery('comp_orch', broker=BROKER, backend=BROKER)
 
+ROOT = Path(".").resolve()
+MANIFEST_DIR = ROOT / "jobs" / "comp_orch"
+CHUNK = int(os.getenv("COMP_CHUNK_FRAMES", "8"))  # frames per render task (warm Blender per chunk)
+
+
+def _manifest_path(job_id):
+    return MANIFEST_DIR / f"{job_id}.json"
+
+@contextmanager
+def _locked(path: Path):
+    # serialise manifest read-modify-write across worker processes
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(str(path) + ".lock", "w") as lf:
+        fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+
+def _update_manifest(job_id, **fields):
+    mp = _manifest_path(job_id)
+    with _locked(mp):
+        m = json.loads(mp.read_text()) if mp.exists() else {}
+        m.update(fields)
+        # readers (get_comp_progress) never see a half-written file
+        tmp = mp.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(m, indent=2))
+        tmp.replace(mp)
+    return m
+
+def _final_path(job, outdir):
+    return job.get("output", {}).get("path", str(Path(outdir) / "final.mp4"))
+
 @app.task(bind=True)
 def orchestrate_comp(self, jobfile):
     job = json.load(open(jobfile))
     start = job.get("start_frame",1); end = job.get("end_frame",start)
-    outdir = Path(job.get("output",{}).get("dir","static/compositor/frames")) / job.get("job_id",str(uuid.uuid4())[:6])
+    job_id = job.get("job_id",str(uuid.uuid4())[:6])
+    outdir = Path(job.get("output",{}).get("dir","static/compositor/frames")) / job_id
     outdir.mkdir(parents=True, exist_ok=True)
-    # submit parallel frame tasks
+    # submit parallel frame-chunk renders; the chord callback fires when the last one lands
     frames = list(range(start, end+1))
-    grp = group(render_frame_task.s(jobfile, f, str(outdir)) for f in frames)
-    res = grp.apply_async()
-    # wait synchronously (or return group id and let client poll) — here we'll wait naive (not recommended for very long jobs)
-    res.get()  # blocks until done
+    chunks = [frames[i:i+CHUNK] for i in range(0, len(frames), CHUNK)]
+    _update_manifest(job_id, job_id=job_id, jobfile=str(jobfile), outdir=str(outdir), frames=len(frames),
+                     chunks=len(chunks), status="rendering", downstream={}, created_at=time.time())
+    header = group(render_chunk_task.s(jobfile, c, str(outdir)) for c in chunks)
+    body = comp_frames_done.s(jobfile, str(outdir), job_id)
+    body.link_error(comp_render_failed.s(job_id))
+    res = chord(header)(body)
+    res.parent.save()  # lets get_comp_progress restore the group without anyone blocking on it
+    m = _update_manifest(job_id, group_id=res.parent.id, callback_id=res.id)
+    return {"ok": True, "status": "submitted", **m}
+
+@app.task(bind=True)
+def comp_frames_done(self, chunk_results, jobfile, outdir, job_id):
+    """Chord callback: check the renders, then fan out the independent post steps."""
+    failed = [r for cr in chunk_results for r in (cr or {}).get("frames", []) if not r.get("ok")]
+    if failed or not all((cr or {}).get("ok") for cr in chunk_results):
+        _update_manifest(job_id, status="render_failed", failed_frames=[r.get("frame") for r in failed])
+        return {"ok": False, "error": "render_failed", "failed_frames": [r.get("frame") for r in failed]}
+    job = json.load(open(jobfile))
+    steps = {}
+    if job.get("output", {}).get("type") in ("mp4","mov"):
+        steps["grade"] = comp_grade_task.s(jobfile, outdir)
+    if job.get("upload",{}).get("s3",False):
+        steps["archive"] = comp_archive_task.s(jobfile, outdir)
+    steps["export"] = comp_export_task.s(jobfile, outdir)
+    ids = {}
+    for name, sig in steps.items():
+        ids[name] = sig.apply_async().id
+    _update_manifest(job_id, status="post_processing", downstream=ids)
+    return {"ok": True, "downstream": ids}
+
+@app.task
+def comp_render_failed(request, exc, traceback, job_id):
+    """Chord errback: a render chunk raised, so comp_frames_done will never run."""
+    print(f"comp {job_id}: render chunk failed: {exc!r}")
+    _update_manifest(job_id, status="render_failed", error=repr(exc))
+    return {"ok": False, "error": "render_failed"}
+
+@app.task(bind=True)
+def comp_grade_task(self, jobfile, outdir):
     # optional grade into video (if output.type == mp4)
+    job = json.load(open(jobfile))
     out_spec = job.get("output", {})
-    if out_spec.get("type") in ("mp4","mov"):
-        pattern = str(outdir / "out_%04d.png")
-        lut = job.get("grade", {}).get("path")
-        final_path = job.get("output", {}).get("path", str(outdir / "final.mp4"))
-        if lut:
-            cmd = f'ffmpeg -y -r {out_spec.get("fps",25)} -i {pattern} -vf lut3d=file={shlex.quote(lut)} -c:v libx264 -crf 18 {shlex.quote(final_path)}'
-        else:
-            cmd = f'ffmpeg -y -r {out_spec.get("fps",25)} -i {pattern} -c:v libx264 -crf 18 {shlex.quote(final_path)}'
-        subprocess.run(cmd, shell=True)
-    # optional archive + upload
-    if job.get("upload",{}).get("s3",False):
-        archive = str(outdir.parent / (outdir.name + ".tar.gz"))
-        with tarfile.open(archive, "w:gz") as tar:
-            tar.add(outdir, arcname=outdir.name)
-        bucket = job["upload"]["s3"]["bucket"]
-        key = job["upload"]["s3"].get("key", outdir.name + ".tar.gz")
-        upload_to_s3.delay(archive, bucket, key)
-    # produce Resolve XML for the final clip
-    clips = [{"file": job.get("output",{}).get("path", ""), "start_time":0.0, "duration": (end-start+1)/job.get("output",{}).get("fps",25)}]
-    xml_path = str(outdir / "resolve_import.xml")
-    make_resolve_xml(clips, xml_path, fps=job.get("output",{}).get("fps",25))
-    return {"ok": True, "frames": len(frames), "final": job.get("output",{}).get("path",""), "resolve_xml": xml_path}
+    pattern = str(Path(outdir) / "out_%04d.png")
+    lut = job.get("grade", {}).get("path")
+    final_path = _final_path(job, outdir)
+    if lut:
+        cmd = f'ffmpeg -y -r {out_spec.get("fps",25)} -i {pattern} -vf lut3d=file={shlex.quote(lut)} -c:v libx264 -crf 18 {shlex.quote(final_path)}'
+    else:
+        cmd = f'ffmpeg -y -r {out_spec.get("fps",25)} -i {pattern} -c:v libx264 -crf 18 {shlex.quote(final_path)}'
+    p = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    return {"ok": p.returncode == 0, "final": final_path, "stderr": p.stderr[-2000:]}
+
+@app.task(bind=True)
+def comp_archive_task(self, jobfile, outdir):
+    # archive the rendered frames (not the graded video / XML, which may still be in progress)
+    job = json.load(open(jobfile))
+    outdir = Path(outdir)
+    archive = str(outdir.parent / (outdir.name + ".tar.gz"))
+    skip = (".mp4", ".mov", ".xml")
+    with tarfile.open(archive, "w:gz") as tar:
+        tar.add(outdir, arcname=outdir.name, filter=lambda ti: None if ti.name.lower().endswith(skip) else ti)
+    bucket = job["upload"]["s3"]["bucket"]
+    key = job["upload"]["s3"].get("key", outdir.name + ".tar.gz")
+    up = upload_to_s3.delay(archive, bucket, key)
+    return {"ok": True, "archive": archive, "upload_task_id": up.id}
+
+@app.task(bind=True)
+def comp_export_task(self, jobfile, outdir):
+    # produce Resolve XML for the final clip (only needs the planned path + duration)
+    job = json.load(open(jobfile))
+    start = job.get("start_frame",1); end = job.get("end_frame",start)
+    fps = job.get("output",{}).get("fps",25)
+    clips = [{"file": job.get("output",{}).get("path", ""), "start_time":0.0, "duration": (end-start+1)/fps}]
+    xml_path = str(Path(outdir) / "resolve_import.xml")
+    make_resolve_xml(clips, xml_path, fps=fps)
+    return {"ok": True, "resolve_xml": xml_path}
+
+def get_comp_progress(job_id):
+    """Progress from the result backend: rendered frames plus state of each downstream step."""
+    mp = _manifest_path(job_id)
+    if not mp.exists():
+        return {"ok": False, "error": "job_not_found"}
+    m = json.loads(mp.read_text())
+    # group_id is written right after the chord is submitted; until then there is nothing to restore
+    grp = GroupResult.restore(m["group_id"], app=app) if m.get("group_id") else None
+    frames_done = 0
+    chunks_done = 0
+    if grp is not None:
+        for r in grp.results:
+            if r.successful():
+                chunks_done += 1
+                frames_done += sum(1 for fr in (r.result or {}).get("frames", []) if fr.get("ok"))
+    steps, failed_steps = {}, []
+    for name, tid in (m.get("downstream") or {}).items():
+        r = AsyncResult(tid, app=app)
+        steps[name] = r.state
+        # the steps report their own failures as a successful {"ok": False, ...} result
+        if r.state == "FAILURE" or (r.state == "SUCCESS" and not (r.result or {}).get("ok", True)):
+            failed_steps.append(name)
+    if m.get("status") == "render_failed" or failed_steps:
+        state = "failed"
+    elif steps and all(s == "SUCCESS" for s in steps.values()):
+        state = "done"
+    elif steps:
+        state = "post_processing"
+    elif not m.get("group_id"):
+        state = "submitting"
+    else:
+        state = "rendering"
+    return {"ok": True, "job_id": job_id, "state": state, "frames_total": m.get("frames"),
+            "frames_done": frames_done, "chunks_done": chunks_done, "chunks_total": m.get("chunks"),
+            "steps": steps, "failed_steps": failed_steps}
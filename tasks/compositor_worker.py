@@ -3,6 +3,7 @@ from celery import Celery, group
 import os, subprocess, shlex, json
 from pathlib import Path
 import boto3
+from services.blender_worker import render_frames
 
 BROKER = os.getenv("CELERY_BROKER","redis://redis:6379/0")
 app = Celery('compositor', broker=BROKER, backend=BROKER)
@@ -11,13 +12,28 @@ BLENDER_SCRIPT = str(Path.cwd() / "blender_scripts" / "composite_passes_oidn.py"
 
 @app.task(bind=True, time_limit=18000)
 def render_frame_task(self, jobfile, frame, outdir):
-    cmd = f"blender --background --python {shlex.quote(BLENDER_SCRIPT)} -- {shlex.quote(jobfile)} {shlex.quote(outdir)}"
-    # The composite script currently loops frames; for parallelism: we could support a single-frame mode
-    # For now call script with env var FRAME to instruct it to render single frame (modify script to read os.environ['FRAME'])
-    env = os.environ.copy()
-    env['FRAME'] = str(frame)
-    p = subprocess.run(cmd, shell=True, env=env, capture_output=True, text=True)
-    return {"ok": p.returncode==0, "frame": frame, "stdout": p.stdout[:200], "stderr": p.stderr[:200]}
+    # single frame on the warm Blender worker for this job (scene stays loaded between tasks)
+    res = render_chunk_task(jobfile, [frame], outdir)
+    r = (res.get("frames") or [{}])[0]
+    return {"ok": res["ok"], "frame": frame, "path": r.get("path"), "error": r.get("error")}
+
+@app.task(bind=True, time_limit=18000)
+def render_chunk_task(self, jobfile, frames, outdir):
+    """Render a contiguous chunk of frames in one resident Blender; reports per-frame progress."""
+    done, got = [], []
+    def on_frame(msg):
+        done.append(msg.get("frame"))
+        got.append(msg)
+        if self.request.id:
+            self.update_state(state="PROGRESS", meta={"done_frames": list(done), "total": len(frames)})
+    try:
+        per_frame = render_frames(jobfile, outdir, frames, on_frame=on_frame)
+    except Exception as e:
+        # report instead of raising so the orchestrator's chord callback still runs
+        err = str(e)
+        per_frame = got + [{"frame": f, "ok": False, "error": err} for f in frames if f not in done]
+        return {"ok": False, "error": err, "frames": per_frame}
+    return {"ok": bool(per_frame) and all(r.get("ok") for r in per_frame), "frames": per_frame}
 
 @app.task(bind=True)
 def upload_to_s3(self, file_path, bucket, key, acl="private"):
@@ -10,8 +10,8 @@ app = Celery("eleven_dub", broker=BROKER, backend=BROKER)
 def eleven_full_dub(self, video_path, target_lang="hi", voice_id=None):
     from services.asr_service import transcribe_with_whisper
     from services.eleven_lang_map import get_lang_config
-    from services.elevenlabs_service import eleven_tts
-    from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip
+    from services.elevenlabs_service import eleven_tts_many
+    from services.dub_bake import bake_dub
 
     config = get_lang_config(target_lang)
     model = config["model"]
@@ -21,20 +21,16 @@ def eleven_full_dub(self, video_path, target_lang="hi", voice_id=None):
     res = transcribe_with_whisper(video_path)
     segs = res.get("segments", [])
 
-    audio_clips = []
-    for s in segs:
-        txt = s["text"]
-        tts = eleven_tts(txt, voice_id=voice_id or default_voice, model=model)
-        if tts["ok"]:
-            a = AudioFileClip(tts["path"]).set_start(s["start"])
-            audio_clips.append(a)
+    # all segments in flight together (bounded + rate limited), results back in segment order
+    results = eleven_tts_many([{"text": s["text"], "voice_id": voice_id or default_voice, "model": model} for s in segs])
+    lines = [{"start": s["start"], "tts_path": tts["path"]} for s, tts in zip(segs, results) if tts["ok"]]
 
-    v = VideoFileClip(video_path)
-    comp = CompositeAudioClip(audio_clips)
     out = f"jobs/eleven_dub/{target_lang}_{Path(video_path).stem}.mp4"
     Path("jobs/eleven_dub").mkdir(parents=True, exist_ok=True)
 
-    v2 = v.set_audio(comp)
-    v2.write_videofile(out, codec="libx264", audio_codec="aac", logger=None)
+    # dub replaces the audio; the video stream is copied, not re-encoded
+    res = bake_dub(video_path, {target_lang: lines}, out, original_gain=0.0)
+    if not res.get("ok"):
+        return {"ok": False, "error": res.get("error")}
 
     return {"ok": True, "dubbed": out}
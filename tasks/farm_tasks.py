@@ -2,6 +2,9 @@
 from celery import Celery
 import os, json, time, shlex, subprocess
 from pathlib import Path
+from services import farm_store
+from services.blender_worker import render_frames
+from services.farm_manager import record_task_timing
 
 BROKER = os.getenv("CELERY_BROKER", "redis://redis:6379/0")
 app = Celery('farm', broker=BROKER, backend=BROKER)
@@ -12,49 +15,69 @@ RESULTS_DIR = ROOT / "jobs" / "farm" / "results"
 
 # Example worker entry: worker polls task files and claims one (naive). But with Celery we implement worker task wrapper.
 @app.task(bind=True)
-def run_task(self, task_json_path):
+def run_task(self, task_ref):
     """
-    task_json_path: path to task file (TASKS_DIR/<task_id>.json)
-    Worker should call this as run_task.delay(str(task_path))
+    task_ref: task_id in the farm store (a legacy TASKS_DIR/<task_id>.json path is accepted too)
+    Worker should call this as run_task.delay(task_id)
     """
+    task_id = Path(task_ref).stem if str(task_ref).endswith(".json") else task_ref
+    t = None
     try:
-        tfile = Path(task_json_path)
-        if not tfile.exists():
+        t = farm_store.get_task(task_id)
+        if t is None:
             return {"ok": False, "error": "task_missing"}
-        t = json.loads(tfile.read_text())
-        task_id = t['task_id']
         # mark running
-        t['status'] = 'running'
-        t['attempts'] = t.get('attempts',0) + 1
-        tfile.write_text(json.dumps(t, indent=2))
+        farm_store.update_task(task_id, status='running', attempts=t.get('attempts',0) + 1)
         payload = t['payload']
         # dispatch by type — sample: call engine scripts or routes
         typ = payload.get('type')
         frame = payload.get('frame')
+        frames = payload.get('frames') or [frame]
         engine_payload = payload.get('engine_payload',{})
-        # Simple mapping: if type == 'composite', call composite script for single-frame mode
+        # Simple mapping: if type == 'composite', render the task's frame(s)
         if typ == "composite" or typ=="render":
-            # assume blender script supports FRAME env var or single-frame mode
-            # Here we call a CLI specified in engine_payload['cmd'] or fallback to composite_passes_oidn.py
             cmd = engine_payload.get('cmd')
-            if not cmd:
-                blender_script = ROOT / "blender_scripts" / "composite_passes_oidn.py"
+            if cmd:
+                # custom CLI: one process per task, frames passed via FRAME / FRAMES env
+                env = os.environ.copy()
+                env['FRAME'] = str(frames[0])
+                env['FRAMES'] = ",".join(str(f) for f in frames)
+                t0 = time.time()
+                p = subprocess.run(cmd, shell=True, env=env, capture_output=True, text=True, timeout=1800)
+                ok = p.returncode == 0
+                result = {"ok": ok, "stdout": p.stdout[:2000], "stderr": p.stderr[:2000]}
+                if ok:
+                    result["frame_secs"] = [(time.time() - t0) / len(frames)] * len(frames)
+            else:
+                # warm Blender worker keeps the scene loaded across tasks of the same job
                 jobfile = engine_payload.get('jobfile')  # job JSON for compositor
-                cmd = f"blender --background --python {str(blender_script)} -- {jobfile} {engine_payload.get('outdir','static/compositor/frames')}"
-            # set FRAME env and run
-            env = os.environ.copy()
-            env['FRAME'] = str(frame)
-            p = subprocess.run(cmd, shell=True, env=env, capture_output=True, text=True, timeout=1800)
-            ok = p.returncode == 0
-            result = {"ok": ok, "stdout": p.stdout[:2000], "stderr": p.stderr[:2000]}
+                outdir = engine_payload.get('outdir','static/compositor/frames')
+                done = []
+                def on_frame(msg):
+                    done.append(msg.get('frame'))
+                    self.update_state(state='PROGRESS', meta={"task_id": task_id, "done_frames": list(done), "total": len(frames)})
+                per_frame = render_frames(jobfile, outdir, frames, on_frame=on_frame)
+                result = {"ok": bool(per_frame) and all(r.get('ok') for r in per_frame), "frames": per_frame,
+                          "frame_secs": [r['secs'] for r in per_frame if r.get('ok') and r.get('secs') is not None]}
         else:
             # unknown type fallback: mark success
             result = {"ok": True, "note": "no-op task type"}
         # write result
         (RESULTS_DIR / f"{task_id}.result.json").write_text(json.dumps(result, indent=2))
-        t['status'] = 'done' if result.get('ok') else 'failed'
-        t['finished_at'] = time.time()
-        tfile.write_text(json.dumps(t, indent=2))
+        farm_store.update_task(task_id, status='done' if result.get('ok') else 'failed', finished_at=time.time())
+        # feed measured cost back so the rest of this job (and sibling jobs) get sized chunks
+        record_task_timing(t['job_id'], result.get('frame_secs', []))
         return result
     except Exception as e:
-        return {"ok": False, "error": str(e)}
+        # fail the task now (status event frees the scheduler slot, planner sees it finished)
+        # instead of leaving it "running" until its claim expires
+        result = {"ok": False, "error": str(e)}
+        try:
+            cur = farm_store.get_task(task_id) if t is not None else None
+            if cur and cur.get('status') == 'running':
+                farm_store.update_task(task_id, status='failed', finished_at=time.time())
+                record_task_timing(t['job_id'], [])
+            (RESULTS_DIR / f"{task_id}.result.json").write_text(json.dumps(result, indent=2))
+        except Exception as e2:
+            print("run_task: could not mark", task_id, "failed:", e2)
+        return result
@@ -1,124 +1,188 @@
 # tasks/india_localization_tasks.py
 from celery import Celery, chain
+from celery.signals import worker_process_init
 import os, json, shlex, subprocess, uuid
 from pathlib import Path
 
 BROKER = os.getenv("CELERY_BROKER","redis://redis:6379/0")
 app = Celery('india_localize', broker=BROKER, backend=BROKER)
+ASR_MODEL = os.getenv("LOCALIZE_ASR_MODEL", "small")
+
+@worker_process_init.connect
+def _warm_asr(**_):
+    # load whisper once per worker process instead of on the first job
+    if os.getenv("ASR_WARM", "0") == "1":
+        try:
+            from services.asr_resident import warm
+            warm(ASR_MODEL)
+        except Exception as e:
+            print("ASR warm-up failed:", e)
+
+# per-stage pools for the segment pipeline: translation of segment k overlaps TTS of k-1
+TRANSLATE_WORKERS = int(os.getenv("LOCALIZE_TRANSLATE_WORKERS", "4"))
+TTS_WORKERS = int(os.getenv("LOCALIZE_TTS_WORKERS", "4"))
 
 @app.task(bind=True)
 def step_asr(self, jobfile):
-    from services.india_localize_service import update_job
+    from services.india_localize_service import read_job, append_progress
     from services.asr_service import transcribe_with_whisper, transcribe_with_vosk
-    job = json.loads(Path(jobfile).read_text())
+    job = read_job(jobfile)
     src = job['source_media']
     # try whisper first (auto language detect)
-    res = transcribe_with_whisper(src, lang=None, model="small")
+    res = transcribe_with_whisper(src, lang=None, model=ASR_MODEL)
     if not res.get("ok"):
         # fallback to vosk (requires model install) or fail
         res = transcribe_with_vosk(src)
-    job['asr'] = res
-    job['steps'].append("asr_done")
-    Path(jobfile).write_text(json.dumps(job, indent=2))
+    append_progress(jobfile, {"set": {"asr": res}, "step": "asr_done"})
     return jobfile
 
-@app.task(bind=True)
-def step_translate(self, jobfile):
-    from services.india_localize_service import update_job
-    job = json.loads(Path(jobfile).read_text())
+def _source_segments(job):
     segments = job.get('asr', {}).get('segments', [])
     # if segments empty, use whole text as one segment
     if not segments and job.get('asr', {}).get('text'):
         segments = [{"start":0.0, "end":0.0, "text": job['asr']['text']}]
-    translations = {}
+    return segments
+
+def _translator():
     # try argos-translate if available, else fallback to cloud placeholder
     try:
         import argostranslate.package, argostranslate.translate
         # ensure target languages installed externally; here we try dynamic translate
-        for tl in job['target_langs']:
-            translated_segments = []
-            for seg in segments:
-                translated = argostranslate.translate.translate(seg['text'], job.get('asr',{}).get('lang','auto'), tl)
-                translated_segments.append({"start": seg.get('start'), "end": seg.get('end'), "text": translated})
-            translations[tl] = translated_segments
+        return argostranslate.translate.translate
     except Exception:
-        # fallback: keep original text (user can plug cloud translate)
+        return None
+
+def _translate_segment(translate, seg, src_lang, tl, i):
+    text = seg.get('text')
+    if translate is not None:
+        try:
+            text = translate(seg['text'], src_lang, tl)
+        except Exception:
+            pass  # keep original text (user can plug cloud translate)
+    return {"idx": i, "start": seg.get('start'), "end": seg.get('end'), "text": text}
+
+def _tts_segment(seg, tl):
+    from services.tts_service import tts_coqui, tts_pyttsx3
+    text = seg['text']
+    # resolve language model hint (coqui preferred)
+    res = tts_coqui(text, lang=tl)
+    if not res.get("ok"):
+        res = tts_pyttsx3(text, lang=tl)
+    return {"idx": seg["idx"], "start": seg.get('start'), "end": seg.get('end'), "text": text, "tts_path": res.get("path")}
+
+def run_segments(jobfile, translate=True, tts=True):
+    """
+    Segment-level pipeline: every (language, segment) is translated on one bounded pool and handed
+    to the TTS pool as soon as it is done. Each finished segment is one appended journal line, and
+    segments already in the journal (a retried job) are not redone.
+    """
+    from services.india_localize_service import read_job, append_progress
+    from services.task_graph import TaskGraph
+    job = read_job(jobfile)
+    segments = _source_segments(job)
+    src_lang = job.get('asr', {}).get('lang', 'auto')
+    translate_fn = _translator() if translate else None
+    done_tr = {tl: {s.get("idx", k): s for k, s in enumerate(v)} for tl, v in (job.get('translations') or {}).items()}
+    done_tts = {tl: {s.get("idx", k) for k, s in enumerate(v)} for tl, v in (job.get('tts_map') or {}).items()}
+    graph = TaskGraph({"translate": TRANSLATE_WORKERS, "tts": TTS_WORKERS})
+
+    def tr_node(tl, i, seg):
+        def run():
+            prev = done_tr.get(tl, {}).get(i)
+            if prev is not None or not translate:
+                return prev or {"idx": i, "start": seg.get('start'), "end": seg.get('end'), "text": seg.get('text')}
+            out = _translate_segment(translate_fn, seg, src_lang, tl, i)
+            append_progress(jobfile, {"seg": "translations", "lang": tl, "i": i, "data": out})
+            return out
+        return run
+
+    def tts_node(tl, i):
+        def run(tr):
+            out = _tts_segment(tr, tl)
+            append_progress(jobfile, {"seg": "tts_map", "lang": tl, "i": i, "data": out})
+            return out
+        return run
+
+    # segment-major order, so the first lines of every language reach TTS early
+    for i, seg in enumerate(segments):
         for tl in job['target_langs']:
-            translations[tl] = [{"start":s.get('start'), "end": s.get('end'), "text": s.get('text')} for s in segments]
-    job['translations'] = translations
-    job['steps'].append("translate_done")
-    Path(jobfile).write_text(json.dumps(job, indent=2))
+            tr = graph.add(f"tr:{tl}:{i}", tr_node(tl, i, seg), resource="translate")
+            if tts and i not in done_tts.get(tl, set()):
+                graph.add(f"tts:{tl}:{i}", tts_node(tl, i), deps=[tr], resource="tts")
+    graph.run()
+    # failed (or skipped) segments go to the journal, so status readers and retries can see them
+    failed = []
+    for n, r in graph.results.items():
+        stage, tl, i = n.split(":")
+        if not r["ok"]:
+            failed.append({"stage": "translate" if stage == "tr" else "tts", "lang": tl, "i": int(i), "error": r.get("error")})
+        elif stage == "tts" and not (r["result"] or {}).get("tts_path"):
+            failed.append({"stage": "tts", "lang": tl, "i": int(i), "error": "no audio from any TTS engine"})
+    failed.sort(key=lambda f: (f["lang"], f["i"], f["stage"]))
+    if failed:
+        print(f"localize {job['job_id']}: {len(failed)} segment tasks failed, e.g. {failed[0]}")
+    bad = {f["stage"] for f in failed}
+    steps = (["translate"] if translate else []) + (["tts"] if tts else [])
+    append_progress(jobfile, {"set": {"failed_segments": failed}})
+    for st in steps:
+        append_progress(jobfile, {"step": f"{st}_partial" if st in bad else f"{st}_done"})
     return jobfile
 
+@app.task(bind=True)
+def step_translate(self, jobfile):
+    return run_segments(jobfile, translate=True, tts=False)
+
 @app.task(bind=True)
 def step_tts_all(self, jobfile):
-    from services.tts_service import tts_coqui, tts_pyttsx3
-    job = json.loads(Path(jobfile).read_text())
-    translations = job.get('translations', {})
-    tts_map = {}
-    for tl, segs in translations.items():
-        tts_map[tl] = []
-        for seg in segs:
-            text = seg['text']
-            # resolve language model hint (coqui preferred)
-            res = tts_coqui(text, lang=tl)
-            if not res.get("ok"):
-                res = tts_pyttsx3(text, lang=tl)
-            tts_map[tl].append({"start": seg.get('start'), "end": seg.get('end'), "text": text, "tts_path": res.get("path")})
-    job['tts_map'] = tts_map
-    job['steps'].append("tts_done")
-    Path(jobfile).write_text(json.dumps(job, indent=2))
-    return jobfile
+    return run_segments(jobfile, translate=False, tts=True)
+
+@app.task(bind=True)
+def step_translate_tts(self, jobfile):
+    return run_segments(jobfile, translate=True, tts=True)
 
 @app.task(bind=True)
 def step_subtitles(self, jobfile):
     from services.subtitle_service import segments_to_srt
-    job = json.loads(Path(jobfile).read_text())
+    from services.india_localize_service import read_job, append_progress
+    job = read_job(jobfile)
     out_dir = Path(job['output_dir'])
     srt_files = {}
     for tl, segs in job.get('translations', {}).items():
         srt_path = out_dir / f"{job['job_id']}_{tl}.srt"
         segments_to_srt(segs, str(srt_path))
         srt_files[tl] = str(srt_path)
-    job['srt_files'] = srt_files
-    job['steps'].append("srt_done")
-    Path(jobfile).write_text(json.dumps(job, indent=2))
+    append_progress(jobfile, {"set": {"srt_files": srt_files}, "step": "srt_done"})
     return jobfile
 
 @app.task(bind=True)
 def step_dub_bake(self, jobfile, do_bake: bool = True):
-    # if do_bake True, create dubbed video for each target (moviepy used)
-    job = json.loads(Path(jobfile).read_text())
+    # if do_bake True, create dubbed video for each target: one ffmpeg pass, video stream copied
+    from services.india_localize_service import read_job, append_progress
+    from services.dub_bake import bake_dub, bake_dub_split
+    job = read_job(jobfile)
     out_dir = Path(job['output_dir'])
-    results = {}
     if not do_bake:
-        job['steps'].append("dub_skipped")
-        job['dub_results'] = {}
-        Path(jobfile).write_text(json.dumps(job, indent=2))
+        append_progress(jobfile, {"set": {"dub_results": {}}, "step": "dub_skipped"})
         return jobfile
-    try:
-        from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip
-    except Exception as e:
-        job['steps'].append("dub_failed_no_moviepy")
-        Path(jobfile).write_text(json.dumps(job, indent=2))
+    opts = job.get('options') or {}
+    tracks = {tl: segs for tl, segs in job.get('tts_map', {}).items() if any(s.get('tts_path') for s in segs)}
+    if not tracks:
+        append_progress(jobfile, {"set": {"dub_results": {}}, "step": "dub_done"})
+        return jobfile
+    # options.duck_original keeps the source audio under the dub; default replaces it (as before)
+    kw = {"duck": True, "original_gain": None if opts.get('duck_original') else 0.0}
+    if opts.get('dub_multitrack'):
+        outp = out_dir / f"{job['job_id']}_dub.mp4"
+        res = bake_dub(job['source_media'], tracks, str(outp), **kw)
+        results = {tl: str(outp) for tl in tracks} if res.get("ok") else {}
+    else:
+        res = bake_dub_split(job['source_media'], tracks,
+                             {tl: str(out_dir / f"{job['job_id']}_dub_{tl}.mp4") for tl in tracks}, **kw)
+        results = res.get("results", {})
+    if not res.get("ok"):
+        append_progress(jobfile, {"set": {"dub_results": {}, "dub_error": res.get("error")}, "step": "dub_failed"})
         return jobfile
-    src_video = job['source_media']
-    v = VideoFileClip(src_video)
-    for tl, segs in job.get('tts_map', {}).items():
-        audio_clips = []
-        for s in segs:
-            if s.get('tts_path'):
-                a = AudioFileClip(s['tts_path']).set_start(float(s.get('start') or 0.0))
-                audio_clips.append(a)
-        if audio_clips:
-            comp = CompositeAudioClip(audio_clips)
-            v2 = v.set_audio(comp)
-            outp = out_dir / f"{job['job_id']}_dub_{tl}.mp4"
-            v2.write_videofile(str(outp), codec="libx264", audio_codec="aac", logger=None)
-            results[tl] = str(outp)
-    job['dub_results'] = results
-    job['steps'].append("dub_done")
-    Path(jobfile).write_text(json.dumps(job, indent=2))
+    append_progress(jobfile, {"set": {"dub_results": results}, "step": "dub_done"})
     return jobfile
 
 @app.task(bind=True)
@@ -129,9 +193,10 @@ def full_localization_pipeline(self, job_id_or_file):
     else:
         jobfile = str(Path("jobs/india_localize") / (job_id_or_file + ".json"))
     # run chain
+    from services.india_localize_service import compact_job
     res1 = step_asr.run(jobfile)
-    res2 = step_translate.run(res1)
-    res3 = step_tts_all.run(res2)
+    res3 = step_translate_tts.run(res1)
     res4 = step_subtitles.run(res3)
     res5 = step_dub_bake.run(res4, True)
+    compact_job(jobfile)
     return {"ok": True, "jobfile": jobfile}
@@ -10,16 +10,12 @@ app = Celery('music', broker=BROKER, backend=BROKER)
 
 @app.task
 def run_music_pipeline(audio_path, anim_bank_dir, dancers=["DancerA","DancerB"]):
-    # 1) analyze beats
-    from services.beat_analyzer import analyze_beats
-    ba = analyze_beats(audio_path, use_librosa=True)
-    if not ba.get("ok"):
-        return {"ok": False, "error": "beat_analysis_failed", "detail": ba}
-    beats = ba["beats"]
-    bpm = ba["bpm"]
-    # 2) build choreography
-    from services.dance_planner import build_choreography_from_beats
-    job = build_choreography_from_beats(beats, bpm, dancers=dancers)
+    # 1+2) analyze beats (cached per track) and build choreography
+    from services.dance_planner import build_choreography_for_track
+    res = build_choreography_for_track(audio_path, dancers=dancers)
+    if not res.get("ok"):
+        return res
+    job = res["job"]
     jobfile = Path("jobs/music") / (job["job_id"] + ".json")
     jobfile.write_text(json.dumps(job, indent=2))
     # 3) create stage lighting in Blender (stage_lighting)
@@ -0,0 +1,63 @@
+# tests/test_advanced_bvh.py
+"""write_bvh -> read_bvh round trips (hierarchy, offsets, motion) for services/advanced_bvh."""
+import pytest
+
+np = pytest.importorskip("numpy")
+from services import advanced_bvh
+
+NAMES = ["Hips", "Spine", "Neck", "Head", "LeftArm", "LeftHand", "RightLeg"]
+PARENTS = {"Hips": None, "Spine": "Hips", "Neck": "Spine", "Head": "Neck",
+           "LeftArm": "Spine", "LeftHand": "LeftArm", "RightLeg": "Hips"}
+
+
+@pytest.fixture
+def pos():
+    return np.random.default_rng(7).normal(0, 10, (50, len(NAMES), 3))
+
+
+def test_round_trip_array_and_dicts(tmp_path, pos):
+    advanced_bvh.write_bvh(pos, NAMES, PARENTS, str(tmp_path / "a.bvh"), frame_time=1 / 24)
+    advanced_bvh.write_bvh([{"joints": dict(zip(NAMES, f))} for f in pos.tolist()], NAMES, PARENTS, str(tmp_path / "d.bvh"),
+                           frame_time=1 / 24)
+    assert (tmp_path / "a.bvh").read_bytes() == (tmp_path / "d.bvh").read_bytes()
+
+    bvh = advanced_bvh.read_bvh(tmp_path / "a.bvh")
+    assert sorted(bvh["joints"]) == sorted(NAMES)
+    assert bvh["parents"] == PARENTS
+    assert bvh["frame_time"] == pytest.approx(1 / 24, abs=1e-6)
+    for n in NAMES:
+        ref = pos[0, NAMES.index(n)] - (pos[0, NAMES.index(PARENTS[n])] if PARENTS[n] else 0)
+        assert np.allclose(bvh["offsets"][n], ref, atol=1e-6)
+    assert bvh["channels"]["Hips"][:3] == ["Xposition", "Yposition", "Zposition"]
+    assert bvh["motion"].shape == (50, 6 + 3 * (len(NAMES) - 1))
+    # root translation is the only varying channel block; every rotation is written as 0.0
+    assert np.abs(bvh["motion"][:, :3] - pos[:, 0]).max() <= 1e-6
+    assert not bvh["motion"][:, 3:].any()
+
+
+def test_motion_headers_by_key(tmp_path, pos):
+    path = tmp_path / "a.bvh"
+    advanced_bvh.write_bvh(pos[:3], NAMES, PARENTS, str(path))
+    head, _, motion = path.read_text().partition("MOTION\n")
+    frames, frame_time, rows = motion.split("\n", 2)
+    # other exporters: swapped header order, extra spacing / tabs, blank lines, trailing newline
+    path.write_text(head + "MOTION\n\n" + frame_time.replace(" ", "\t") + "\n" + frames.replace(":", " :  ") + "\n" + rows + "\n")
+    bvh = advanced_bvh.read_bvh(path)
+    assert bvh["frame_time"] == pytest.approx(1 / 30, abs=1e-6)
+    assert bvh["motion"].shape[0] == 3
+
+    path.write_text(head + "MOTION\n" + frame_time + "\n" + rows)
+    with pytest.raises(ValueError):
+        advanced_bvh.read_bvh(path)
+
+
+def test_write_bvh_file_row_format_literals(tmp_path):
+    motion = np.arange(12, dtype=np.float64).reshape(4, 3)
+    lines = ["HIERARCHY", "ROOT Hips", "{", "\tOFFSET 0.0 0.0 0.0",
+             "\tCHANNELS 6 Xposition Yposition Zposition Zrotation Yrotation Xrotation",
+             "\tEnd Site", "\t{", "\t\tOFFSET 0.0 1.0 0.0", "\t}", "}"]
+    advanced_bvh.write_bvh_file(tmp_path / "r.bvh", lines, motion, 0.04, row_format="%.6f %.6f %.6f 0.0 0.0 0.0",
+                                chunk_frames=3)
+    bvh = advanced_bvh.read_bvh(tmp_path / "r.bvh")
+    assert bvh["joints"] == ["Hips"] and bvh["offsets"] == {"Hips": (0.0, 0.0, 0.0)}
+    assert np.array_equal(bvh["motion"], np.hstack([motion, np.zeros((4, 3))]))
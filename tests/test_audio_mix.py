@@ -0,0 +1,62 @@
+# tests/test_audio_mix.py
+"""Golden check: SoundFXEngine.mix_tracks (numpy, services/audio_mix) against the pydub reference mixer."""
+import os, random, shutil, subprocess
+from pathlib import Path
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pydub")
+if not (shutil.which("ffmpeg") and shutil.which("ffprobe")):
+    pytest.skip("ffmpeg / ffprobe not installed", allow_module_level=True)
+
+from services import soundfx_engine, audio_mix, asset_index
+
+MAX_RESIDUAL_DB = -30.0  # numpy mix vs pydub reference, relative to the reference level
+SCRIPT = "A tiger roars, the door slams, wind and rain, the crowd cheers, the car engine."
+
+
+def tone(path, freq, secs, rate=44100, channels=1, vol=0.3):
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"sine=f={freq}:d={secs}:sample_rate={rate}",
+                    "-af", f"volume={vol}", "-ac", str(channels), str(path)], check=True)
+
+
+@pytest.fixture
+def scene(tmp_path, monkeypatch):
+    for d in ("sfx", "ambience", "music", "lines", "out", "index"):
+        (tmp_path / d).mkdir()
+    for i, name in enumerate(["tiger_roar", "door", "wind", "rain", "crowd", "engine"]):
+        tone(tmp_path / "sfx" / f"{name}.wav", 300 + 40 * i, 0.8)
+    tone(tmp_path / "ambience" / "rain_loop.wav", 90, 2.0, channels=2, vol=0.2)
+    tone(tmp_path / "music" / "calm_theme.mp3", 440, 3.0, channels=2, vol=0.5)
+    tracks, t = [], 0.5
+    for i in range(6):
+        p = tmp_path / "lines" / f"l{i}.wav"
+        tone(p, 180 + i * 30, 1.5, rate=22050)
+        tracks.append({"audio": str(p), "start": t, "end": t + 1.5})
+        t += 1.8
+    monkeypatch.setattr(soundfx_engine, "OUT_DIR", tmp_path / "out")
+    monkeypatch.setattr(asset_index, "INDEX_DIR", tmp_path / "index")
+    eng = soundfx_engine.SoundFXEngine(str(tmp_path / "sfx"), str(tmp_path / "ambience"), str(tmp_path / "music"))
+    return eng, tracks, tmp_path
+
+
+def test_mix_matches_pydub_reference(scene):
+    eng, tracks, tmp = scene
+    runs = {}
+    for name, fn in (("pydub", eng.mix_tracks_reference), ("numpy", eng.mix_tracks)):
+        random.seed(7)
+        res = fn(tracks, SCRIPT, mood="rain", music_intensity="calm")
+        # same seed -> same output name; keep each mixer's file
+        kept = tmp / f"{name}_{Path(res['final_audio']).name}"
+        os.replace(res["final_audio"], kept)
+        runs[name] = dict(res, final_audio=str(kept))
+
+    ref, new = runs["pydub"], runs["numpy"]
+    assert new["details"] == ref["details"]
+    assert new["details"]["sfx"], "scene should place some SFX"
+    a = audio_mix.decode(ref["final_audio"], 44100, 2)
+    b = audio_mix.decode(new["final_audio"], 44100, 2)
+    assert abs(len(a) - len(b)) <= 44100 // 100
+    n = min(len(a), len(b))
+    resid = 10 * np.log10(np.mean((a[:n] - b[:n]) ** 2) / max(np.mean(a[:n] ** 2), 1e-12) + 1e-12)
+    assert resid <= MAX_RESIDUAL_DB, f"residual {resid:.1f} dB"
@@ -0,0 +1,63 @@
+# tests/test_queue_db.py
+"""Lease lifecycle of services/queue_db on a throwaway SQLite file."""
+import os, tempfile
+import pytest
+
+# services.db builds its engine at import; never let the tests reach for the default Postgres URL
+os.environ.setdefault("FARM_DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "farm_test.db"))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from services import queue_db
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    eng = create_engine(f"sqlite:///{tmp_path / 'farm.db'}", future=True)
+    monkeypatch.setattr(queue_db, "engine", eng)
+    monkeypatch.setattr(queue_db, "SessionLocal", sessionmaker(bind=eng, autocommit=False, autoflush=False))
+    queue_db.init_db()
+    return eng
+
+
+def _status(eng, task_id):
+    with eng.connect() as c:
+        return c.execute(select(queue_db.tasks.c.status).where(queue_db.tasks.c.task_id == task_id)).scalar_one()
+
+
+def test_enqueue_and_claim_in_priority_order(db):
+    ids = queue_db.enqueue_frames("job1", 1, 3, {"type": "render"})
+    hi = queue_db.enqueue_task("job1", 99, {"type": "render"}, priority=9)
+    rows = queue_db.claim_tasks(2, lease_secs=60)
+    assert [r["task_id"] for r in rows] == [hi, ids[0]]
+    assert all(r["status"] == "running" and r["attempts"] == 1 for r in rows)
+    assert len({r["lease_token"] for r in rows}) == 1 and rows[0]["lease_token"]
+    # claimed rows are not handed out again while the lease holds
+    assert [r["task_id"] for r in queue_db.claim_tasks(5, lease_secs=60)] == ids[1:]
+    assert queue_db.claim_tasks(1) == []
+
+
+def test_expired_lease_is_reclaimed_and_old_holder_locked_out(db):
+    tid = queue_db.enqueue_task("job1", 1, {})
+    first = queue_db.claim_next_task(lock_secs=-1)  # lease already expired
+    second = queue_db.claim_next_task(lock_secs=60)
+    assert second["task_id"] == tid and second["attempts"] == 2
+    assert second["lease_token"] != first["lease_token"]
+    # the worker that lost the lease can no longer renew, finish or requeue the task
+    assert queue_db.renew_lease([tid], first["lease_token"]) == 0
+    assert queue_db.complete_tasks([tid], first["lease_token"]) == 0
+    assert queue_db.release_tasks([tid], first["lease_token"]) == 0
+    assert _status(db, tid) == "running"
+    assert queue_db.renew_lease([tid], second["lease_token"], lease_secs=60) == 1
+
+
+def test_complete_and_release(db):
+    a, b = queue_db.enqueue_frames("job1", 1, 2, {})
+    rows = queue_db.claim_tasks(2, lease_secs=60)
+    token = rows[0]["lease_token"]
+    assert queue_db.complete_tasks([a], token) == 1
+    assert queue_db.release_tasks([b], token) == 1
+    assert (_status(db, a), _status(db, b)) == ("done", "queued")
+    # finished tasks stay finished; the released one is claimable again
+    assert queue_db.complete_tasks([a], token, status="failed") == 0
+    assert [r["task_id"] for r in queue_db.claim_tasks(5)] == [b]